@@ -0,0 +1,37 @@
+import re
+import unicodedata
+
+
+TOKEN_SPLIT = re.compile(r"[\W_]+")
+
+
+def normalize_tokens(name: str) -> list[str]:
+    """Split an artist name into accent-free, lowercase word tokens.
+
+    Mirrors ``normalizeTokens`` in the generated pages so a typed query and the
+    prebuilt index agree on what a token is.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.category(char).startswith("M"))
+    return [token for token in TOKEN_SPLIT.split(stripped.lower()) if token]
+
+
+def build_search_index(artist_order: list[str]) -> dict:
+    """Build a prefix-searchable token index over artists ranked by revenue.
+
+    ``tokens`` is sorted in JavaScript string order so the page can binary
+    search it for a prefix, and ``postings[i]`` lists the revenue ranks
+    (positions in ``artist_order``) of the artists containing ``tokens[i]``,
+    in ascending order.
+    """
+    token_postings: dict[str, list[int]] = {}
+    for rank, artist in enumerate(artist_order):
+        for token in dict.fromkeys(normalize_tokens(str(artist))):
+            token_postings.setdefault(token, []).append(rank)
+
+    # JavaScript compares strings by UTF-16 code unit rather than code point
+    tokens = sorted(token_postings, key=lambda token: token.encode("utf-16-be"))
+    return {
+        "tokens": tokens,
+        "postings": [token_postings[token] for token in tokens],
+    }
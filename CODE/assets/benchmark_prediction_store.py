@@ -0,0 +1,135 @@
+"""Benchmark the SQLite prediction store against the CSV path on synthetic predictions.
+
+Writes a predictions CSV with the real column layout, then times:
+
+* CSV: reading the file and building a ``CollabIndex`` (what the map server
+  and the page builders pay at startup), and filtering the full frame for
+  one artist, as the pages did before the index
+* SQLite: the bulk load from the CSV, opening the store, and per-artist
+  queries that read only that artist's rows
+
+Run for example::
+
+    python benchmark_prediction_store.py --pairs 1000000 --artists 50000
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from load_test_choropleth import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from collab_query import MARKET_CODES, CollabIndex, revenue_column  # noqa: E402
+from collab_store import SqliteCollabStore, bulk_load  # noqa: E402
+
+
+def synthetic_predictions(n_pairs: int, n_artists: int, seed: int) -> pd.DataFrame:
+    """Pairs drawn with a heavy-tailed artist popularity, in the predictions CSV layout."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Artist {i:06d}" for i in range(n_artists)], dtype=object)
+    popularity = 1.0 / np.arange(1, n_artists + 1)
+    popularity /= popularity.sum()
+    artist_1 = rng.choice(n_artists, size=n_pairs, p=popularity)
+    artist_2 = (artist_1 + 1 + rng.integers(0, n_artists - 1, size=n_pairs)) % n_artists
+
+    streams = rng.lognormal(12, 1.5, size=(n_pairs, len(MARKET_CODES)))
+    revenue = streams * 0.004
+    df = pd.DataFrame({
+        "artist_1_name": names[artist_1],
+        "artist_2_name": names[artist_2],
+        "predicted_streams": streams.sum(axis=1),
+        revenue_column("overall"): revenue.sum(axis=1),
+    })
+    for market in sorted(MARKET_CODES):
+        df[revenue_column(market)] = revenue[:, MARKET_CODES.index(market)]
+    return df
+
+
+def timed(action) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = action()
+    return result, time.perf_counter() - started
+
+
+def query_latencies(query, artists: list[str]) -> list[float]:
+    latencies = []
+    for artist in artists:
+        started = time.perf_counter()
+        query(artist)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies)
+
+
+def print_latencies(label: str, latencies: list[float]) -> None:
+    print(
+        f"  {label:<28} p50 {percentile(latencies, 0.50):8.3f} ms"
+        f"  p95 {percentile(latencies, 0.95):8.3f} ms"
+        f"  mean {statistics.mean(latencies):8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite prediction store against the CSV path.")
+    parser.add_argument("--pairs", type=int, default=1_000_000)
+    parser.add_argument("--artists", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200, help="Artists queried per path")
+    parser.add_argument("--scan-queries", type=int, default=20, help="Artists queried by full-frame filtering")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=Path, help="Keep the CSV and store here (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        csv_path = workdir / "predictions.csv"
+        db_path = workdir / "predictions.sqlite"
+
+        df, seconds = timed(lambda: synthetic_predictions(args.pairs, args.artists, args.seed))
+        df.to_csv(csv_path, index=False)
+        print(f"Synthetic predictions: {len(df):,} pairs, {args.artists:,} artists ({seconds:.1f}s)")
+        del df
+
+        # CSV path
+        frame, read_seconds = timed(lambda: pd.read_csv(csv_path))
+        index, index_seconds = timed(lambda: CollabIndex(frame))
+        rng = np.random.default_rng(args.seed + 1)
+        artists = rng.choice(np.array(index.artists, dtype=object), size=args.queries).tolist()
+        market_cols = [revenue_column(market) for market in MARKET_CODES]
+
+        def scan(artist: str) -> None:
+            rows = frame[(frame["artist_1_name"] == artist) | (frame["artist_2_name"] == artist)]
+            rows[market_cols].sum()
+
+        print("CSV")
+        print(f"  read CSV                     {read_seconds:8.2f} s")
+        print(f"  build CollabIndex            {index_seconds:8.2f} s")
+        print_latencies("full-frame filter", query_latencies(scan, artists[: args.scan_queries]))
+        print_latencies("index market breakdown", query_latencies(index.market_breakdown, artists))
+        print_latencies("index top partners", query_latencies(index.top_partners, artists))
+        del frame, index
+
+        # SQLite path
+        _, load_seconds = timed(lambda: bulk_load(pd.read_csv(csv_path), db_path))
+        store, open_seconds = timed(lambda: SqliteCollabStore(db_path))
+        print("SQLite")
+        print(f"  bulk load from CSV           {load_seconds:8.2f} s")
+        print(f"  open store                   {open_seconds:8.2f} s")
+        print(f"  file size                    {db_path.stat().st_size / 1e6:8.1f} MB")
+        print_latencies("store market breakdown", query_latencies(store.market_breakdown, artists))
+        print_latencies("store top partners", query_latencies(store.top_partners, artists))
+        print_latencies("store top partners (us)", query_latencies(lambda a: store.top_partners(a, market="us"), artists))
+        print_latencies("store top pairs (jp)", query_latencies(lambda _: store.top_pairs("jp", 25), artists))
+
+        startup_csv = read_seconds + index_seconds
+        print(f"Time to first query: CSV {startup_csv:.2f}s, SQLite {open_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Benchmark suite for the page builders and the Dash callback.
+
+For each table size, synthetic predictions are written once, then every case
+runs in a fresh process so its peak memory is its own:
+
+* ``index``: read the CSV and build the ``CollabIndex``
+* ``network_graph``: ``generate_network_graph`` on that index
+* ``choropleth``: ``write_map_page`` on that index
+* ``reconstruct``: ``reconstruct_predictions_from_html`` on the graph page
+* ``callback``: ``update_dashboard`` for many artists, first uncached, then again from the view cache
+
+Each run is appended to a JSON history and compared with a baseline run::
+
+    python benchmark_suite.py --sizes 1000 10000 100000 1000000 --label before-change
+    python benchmark_suite.py --baseline before-change --tolerance 0.15 --fail-on-regression
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+from benchmark_prediction_store import synthetic_predictions
+from load_test_choropleth import percentile
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+CODE_DIR = ASSETS_DIR.parent
+DEFAULT_HISTORY_PATH = ASSETS_DIR / "benchmark_history.json"
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+CASES = ["index", "network_graph", "choropleth", "reconstruct", "callback"]
+# Measurements compared against the baseline (lower is better for both), with
+# the absolute change below which a difference is treated as noise
+COMPARED_METRICS = {"seconds": 0.02, "peak_rss_mb": 5.0}
+
+
+def artist_count(n_pairs: int) -> int:
+    """Artists in a synthetic table, growing with it up to 50,000."""
+    return min(50_000, max(100, n_pairs // 20))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def best_time(action, repeat: int) -> tuple[object, float]:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = action()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run_case(case: str, workdir: Path, repeat: int, callback_artists: int) -> dict:
+    """Run one case in the current (fresh) process and return its measurements."""
+    sys.path.insert(0, str(CODE_DIR))
+    from collab_query import CollabIndex
+
+    csv_path = workdir / "predictions.csv"
+    graph_path = workdir / "artist_collaborations.html"
+    extra = {}
+
+    if case == "index":
+        _, seconds = best_time(lambda: CollabIndex.from_csv(csv_path), repeat)
+        output_bytes = None
+
+    elif case == "network_graph":
+        from graph_network_artist_collaboration import generate_network_graph
+
+        index = CollabIndex.from_csv(csv_path)
+        _, seconds = best_time(lambda: generate_network_graph(index, graph_path), repeat)
+        output_bytes = graph_path.stat().st_size
+
+    elif case == "choropleth":
+        from generate_static_choropleth import write_map_page
+
+        index = CollabIndex.from_csv(csv_path)
+        map_path = workdir / "artist_collaboration_map.html"
+        _, seconds = best_time(lambda: write_map_page(index, map_path), repeat)
+        output_bytes = map_path.stat().st_size
+
+    elif case == "reconstruct":
+        from reconstruct_predictions_from_html import write_predictions
+
+        streams_path = workdir / "reconstructed_streams.csv"
+        _, seconds = best_time(lambda: write_predictions(graph_path, streams_path), repeat)
+        output_bytes = streams_path.stat().st_size
+        extra["input_bytes"] = graph_path.stat().st_size
+
+    elif case == "callback":
+        import random
+
+        from plotly.utils import PlotlyJSONEncoder
+
+        from choropleth_map_artist_collaboration import DashboardData, update_dashboard
+
+        data = DashboardData(CollabIndex.from_csv(csv_path), cache_size=callback_artists)
+        artists = random.Random(0).sample(data.sorted_artists, min(callback_artists, len(data.sorted_artists)))
+
+        def timed_calls() -> list[float]:
+            latencies = []
+            for artist in artists:
+                started = time.perf_counter()
+                update_dashboard(data, artist)
+                latencies.append((time.perf_counter() - started) * 1000)
+            return sorted(latencies)
+
+        started = time.perf_counter()
+        cold = timed_calls()
+        warm = timed_calls()
+        seconds = time.perf_counter() - started
+        output_bytes = sum(
+            len(json.dumps(update_dashboard(data, artist), cls=PlotlyJSONEncoder)) for artist in artists
+        ) // len(artists)
+        extra.update({
+            "calls": 2 * len(artists),
+            "cold_p50_ms": percentile(cold, 0.50),
+            "cold_p95_ms": percentile(cold, 0.95),
+            "warm_p50_ms": percentile(warm, 0.50),
+            "warm_p95_ms": percentile(warm, 0.95),
+        })
+
+    else:
+        raise ValueError(f"Unknown case: {case}")
+
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb(), "output_bytes": output_bytes, **extra}
+
+
+def run_in_fresh_process(case: str, workdir: Path, repeat: int, callback_artists: int) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_case, case, workdir, repeat, callback_artists).result()
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=CODE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(history_path: Path) -> list[dict]:
+    if not history_path.exists():
+        return []
+    return json.loads(history_path.read_text(encoding="utf-8"))
+
+
+def find_baseline(history: list[dict], label: str | None) -> dict | None:
+    """The latest run with ``label``, or the latest run of all when no label is given."""
+    for run in reversed(history):
+        if label is None or run.get("label") == label:
+            return run
+    return None
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Print each result against the baseline and return the regressions found."""
+    baseline_results = {(row["case"], row["size"]): row for row in baseline["results"]}
+    regressions = []
+    print(f"\nAgainst baseline {baseline.get('label') or baseline['timestamp']} (tolerance {tolerance:.0%}):")
+    for row in results:
+        before = baseline_results.get((row["case"], row["size"]))
+        if before is None:
+            continue
+        for metric, noise in COMPARED_METRICS.items():
+            if not before.get(metric):
+                continue
+            change = row[metric] / before[metric] - 1
+            flag = "REGRESSION" if change > tolerance and row[metric] - before[metric] > noise else ""
+            print(f"  {row['case']:<14} {row['size']:>9,} {metric:<12} {before[metric]:10.3f} -> {row[metric]:10.3f}  {change:+7.1%} {flag}")
+            if flag:
+                regressions.append(f"{row['case']} at {row['size']:,} pairs: {metric} {change:+.1%}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the page builders and the Dash callback.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Prediction table sizes in pairs")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept")
+    parser.add_argument("--callback-artists", type=int, default=500, help="Artists sent through update_dashboard")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY_PATH)
+    parser.add_argument("--label", help="Name for this run, usable later as --baseline")
+    parser.add_argument("--baseline", help="Compare with the latest run with this label (default: the latest run)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative increase before a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero when a regression is found")
+    args = parser.parse_args()
+
+    # The graph page feeds the reconstruct case
+    cases = [case for case in CASES if case in args.cases]
+    if "reconstruct" in cases and "network_graph" not in cases:
+        cases.insert(cases.index("reconstruct"), "network_graph")
+
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            synthetic_predictions(size, artist_count(size), seed=0).to_csv(workdir / "predictions.csv", index=False)
+            print(f"{size:,} pairs, {artist_count(size):,} artists")
+            for case in cases:
+                measured = run_in_fresh_process(case, workdir, args.repeat, args.callback_artists)
+                results.append({"case": case, "size": size, **measured})
+                output = f"{measured['output_bytes'] / 1e6:8.2f} MB out" if measured["output_bytes"] is not None else ""
+                print(f"  {case:<14} {measured['seconds']:9.3f} s  {measured['peak_rss_mb']:8.1f} MB peak  {output}")
+
+    history = load_history(args.history)
+    baseline = find_baseline(history, args.baseline)
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    history.append(run)
+    args.history.write_text(json.dumps(history, indent=2), encoding="utf-8")
+    print(f"\nAppended run to {args.history}")
+
+    if baseline is None:
+        if args.baseline:
+            print(f"No run labelled {args.baseline!r} in {args.history}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        if args.fail_on_regression:
+            sys.exit(1)
+    else:
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+
+CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One build step with the files it reads and writes.
+
+    Stages run in-process: ``action`` is called on a worker thread. A stage is
+    skipped when the content hash of its inputs matches the last successful run and all of its outputs still exist.
+    ``bootstrap`` stages only run when an output is missing; they recover
+    files that later stages read but never rebuild them. ``params`` are
+    settings hashed with the inputs, so changing one reruns the stage.
+    """
+
+    name: str
+    label: str
+    action: Callable[[], object]
+    inputs: tuple[Path, ...]
+    outputs: tuple[Path, ...]
+    deps: tuple[str, ...] = ()
+    bootstrap: bool = False
+    params: tuple[object, ...] = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str
+    seconds: float
+
+
+def hash_inputs(stage: Stage) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, stage.name, [str(param) for param in stage.params]]).encode("utf-8"))
+    for path in stage.inputs:
+        digest.update(str(path.name).encode("utf-8"))
+        if path.exists():
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        else:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+
+def load_cache(cache_path: Path) -> dict[str, str]:
+    if not cache_path.exists():
+        return {}
+    try:
+        return json.loads(cache_path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def run_stages(
+    stages: list[Stage],
+    cache_path: Path,
+    max_workers: int = 4,
+    force: bool = False,
+) -> list[StageResult]:
+    """Run stages in dependency order, in parallel where possible, skipping cache hits."""
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(missing)}")
+
+    cache = {} if force else load_cache(cache_path)
+    results: dict[str, StageResult] = {}
+    pending = {stage.name for stage in stages}
+    running = {}
+
+    def ready_stages() -> list[Stage]:
+        return [
+            by_name[name]
+            for name in sorted(pending)
+            if all(dep in results for dep in by_name[name].deps)
+        ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Cached stages finish immediately and may unblock others, so keep
+            # scheduling until nothing new becomes ready
+            ready = ready_stages()
+            while ready:
+                for stage in ready:
+                    pending.discard(stage.name)
+                    outputs_exist = all(path.exists() for path in stage.outputs)
+                    if stage.bootstrap and outputs_exist:
+                        results[stage.name] = StageResult(stage.name, "present", 0.0)
+                        continue
+
+                    input_hash = hash_inputs(stage)
+                    if outputs_exist and cache.get(stage.name) == input_hash:
+                        results[stage.name] = StageResult(stage.name, "cached", 0.0)
+                        print(f"{stage.label}... cached")
+                        continue
+
+                    print(f"{stage.label}...")
+                    future = pool.submit(stage.action)
+                    running[future] = (stage, input_hash, time.perf_counter())
+                ready = ready_stages()
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Stages have circular dependencies: {', '.join(sorted(pending))}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, input_hash, started = running.pop(future)
+                future.result()
+                results[stage.name] = StageResult(stage.name, "ran", time.perf_counter() - started)
+                # Hash again after the run: a stage whose inputs changed while it
+                # was running must not be recorded as up to date
+                if hash_inputs(stage) == input_hash:
+                    cache[stage.name] = input_hash
+                    cache_path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+
+    return [results[stage.name] for stage in stages]
+
+
+def print_report(results: list[StageResult]) -> None:
+    print("Stage timings:")
+    for result in results:
+        print(f"  {result.name:<14} {result.status:<8} {result.seconds:6.2f}s")
+    hits = sum(result.status == "cached" for result in results)
+    ran = sum(result.status == "ran" for result in results)
+    print(f"Cache hits: {hits}, stages run: {ran}")
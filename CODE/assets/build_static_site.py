@@ -1,36 +1,228 @@
-import os
-import subprocess
+import argparse
 import sys
+import threading
 from pathlib import Path
 
+from build_pipeline import Stage, print_report, run_stages
 
-def run_step(label: str, command: list[str], cwd: Path) -> None:
-    print(f"{label}...")
-    subprocess.run(command, check=True, cwd=str(cwd))
+ASSETS_DIR = Path(__file__).resolve().parent
+CODE_DIR = ASSETS_DIR.parent
+PUBLISH_DIR = CODE_DIR.parent / "dist"
 
+sys.path.insert(0, str(CODE_DIR))
 
-def main() -> None:
-    assets_dir = Path(__file__).resolve().parent
-    code_dir = assets_dir.parent
 
+class SharedPredictions:
+    """Predictions opened at most once and shared by every stage of a build.
+
+    They are read and indexed from the CSV, or queried from the SQLite store
+    when ``db_path`` is set.
+    """
+
+    def __init__(self, csv_path: Path, db_path: Path | None = None) -> None:
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._index = None
+
+    def get(self):
+        with self._lock:
+            if self._index is None:
+                if self.db_path is not None:
+                    from collab_store import SqliteCollabStore
+
+                    self._index = SqliteCollabStore(self.db_path)
+                else:
+                    from collab_query import CollabIndex
+
+                    self._index = CollabIndex.from_csv(self.csv_path)
+            return self._index
+
+
+# The step modules import pandas, plotly, networkx and pyvis, so they are only
+# loaded once a stage actually has to run.
+def reconstruct_step(graph_html: Path, streams_csv: Path) -> None:
+    from reconstruct_predictions_from_html import write_predictions
+
+    write_predictions(graph_html, streams_csv)
+
+
+def revenue_step(streams_csv: Path, rates_csv: Path, predictions_csv: Path) -> None:
+    from revenue_rates import write_revenue_predictions
+
+    write_revenue_predictions(streams_csv, rates_csv, predictions_csv)
+
+
+def store_step(predictions_csv: Path, db_path: Path) -> None:
+    import pandas as pd
+    from collab_store import bulk_load
+
+    bulk_load(pd.read_csv(predictions_csv), db_path)
+
+
+def network_graph_step(predictions: SharedPredictions, graph_html: Path) -> None:
+    from graph_network_artist_collaboration import generate_network_graph
+
+    generate_network_graph(predictions.get(), graph_html)
+
+
+def choropleth_step(
+    predictions: SharedPredictions, map_html: Path, snapshot_dir: Path, shard_size: int, shard_dir: Path
+) -> None:
+    from generate_static_choropleth import refresh_map_page, write_map_page
+
+    # From the CSV, only the views of artists whose pairs changed are rebuilt
+    if predictions.db_path is None:
+        refresh_map_page(predictions.get(), predictions.csv_path, map_html, snapshot_dir, shard_size, shard_dir)
+    else:
+        write_map_page(predictions.get(), map_html, shard_size, shard_dir)
+
+
+def publish_step(site_dir: Path, publish_dir: Path) -> None:
+    from publish_site import print_manifest, publish_site
+
+    print_manifest(publish_site(publish_dir, site_dir))
+
+
+def site_stages(
+    assets_dir: Path = ASSETS_DIR,
+    predictions: SharedPredictions | None = None,
+    store: str = "csv",
+    publish_dir: Path = PUBLISH_DIR,
+    shard_size: int = 0,
+) -> list[Stage]:
+    """The build stages; with ``store="sqlite"`` the pages are built from the SQLite store.
+
+    ``shard_size`` splits the map's per-artist views into lazily fetched
+    shard files (see generate_static_choropleth.py).
+    """
+    code_dir = assets_dir.parent
+    shard_dir = code_dir / "artist_collaboration_map_data"
+    site_dir = code_dir.parent
+    streams_csv = assets_dir / "artist_collaboration_stream_predictions.csv"
+    rates_csv = assets_dir / "revenue_rates.csv"
     predictions_csv = assets_dir / "artist_collaboration_predictions_by_market.csv"
-    if not predictions_csv.exists():
-        run_step(
-            "Reconstructing predictions CSV from saved graph HTML",
-            [sys.executable, "reconstruct_predictions_from_html.py"],
-            assets_dir,
-        )
-
-    run_step(
-        "Generating network graph HTML",
-        [sys.executable, "graph_network_artist_collaboration.py"],
-        code_dir,
+    graph_html = code_dir / "artist_collaborations.html"
+    map_html = code_dir / "artist_collaboration_map.html"
+    db_path = assets_dir / "artist_collaboration_predictions.sqlite"
+    if predictions is None:
+        predictions = SharedPredictions(predictions_csv, db_path if store == "sqlite" else None)
+
+    # The pages read the store instead of the CSV when there is one
+    if store == "sqlite":
+        page_source, page_deps = (db_path, code_dir / "collab_store.py"), ("store",)
+    else:
+        page_source, page_deps = (predictions_csv,), ("revenue",)
+
+    stages = [
+        Stage(
+            name="predictions",
+            label="Reconstructing stream predictions from saved graph HTML",
+            action=lambda: reconstruct_step(graph_html, streams_csv),
+            inputs=(graph_html, assets_dir / "reconstruct_predictions_from_html.py"),
+            outputs=(streams_csv,),
+            bootstrap=True,
+        ),
+        # Only this stage reads the rate table, so a rate change reruns the
+        # pages only if it actually changes the revenue they show
+        Stage(
+            name="revenue",
+            label="Applying payout rates to stream predictions",
+            action=lambda: revenue_step(streams_csv, rates_csv, predictions_csv),
+            inputs=(streams_csv, rates_csv, assets_dir / "revenue_rates.py"),
+            outputs=(predictions_csv,),
+            deps=("predictions",),
+        ),
+    ]
+    if store == "sqlite":
+        stages.append(Stage(
+            name="store",
+            label="Bulk-loading predictions into the SQLite store",
+            action=lambda: store_step(predictions_csv, db_path),
+            inputs=(predictions_csv, code_dir / "collab_store.py"),
+            outputs=(db_path,),
+            deps=("revenue",),
+        ))
+    stages += [
+        Stage(
+            name="network_graph",
+            label="Generating network graph HTML",
+            action=lambda: network_graph_step(predictions, graph_html),
+            inputs=(
+                *page_source,
+                code_dir / "collab_query.py",
+                code_dir / "collab_adjacency.py",
+                code_dir / "graph_network_artist_collaboration.py",
+                assets_dir / "network_shell_template.html",
+            ),
+            outputs=(graph_html,),
+            deps=page_deps,
+        ),
+        Stage(
+            name="choropleth",
+            label="Generating static choropleth HTML",
+            action=lambda: choropleth_step(predictions, map_html, assets_dir / ".map_snapshot", shard_size, shard_dir),
+            inputs=(
+                *page_source,
+                code_dir / "collab_query.py",
+                assets_dir / "generate_static_choropleth.py",
+                assets_dir / "artist_search_index.py",
+                assets_dir / "prediction_diff.py",
+            ),
+            outputs=(map_html,),
+            deps=page_deps,
+            params=(shard_size, shard_dir),
+        ),
+        # Map data shards are already named after their content, and the map
+        # page lists them, so the page's hash covers them
+        Stage(
+            name="publish",
+            label="Publishing fingerprinted, precompressed site",
+            action=lambda: publish_step(site_dir, publish_dir),
+            inputs=(
+                site_dir / "index.html",
+                graph_html,
+                map_html,
+                assets_dir / "publish_site.py",
+                *sorted(path for path in (code_dir / "lib").rglob("*") if path.is_file()),
+                *sorted(assets_dir.glob("*.png")),
+            ),
+            outputs=(publish_dir / "asset-manifest.json",),
+            deps=("network_graph", "choropleth"),
+        ),
+    ]
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the static network and map pages.")
+    parser.add_argument("--force", action="store_true", help="Ignore the build cache and rerun every stage")
+    parser.add_argument(
+        "--store",
+        choices=("csv", "sqlite"),
+        default="csv",
+        help="Build the pages from the predictions CSV or from a SQLite store loaded from it",
+    )
+    parser.add_argument(
+        "--publish-dir",
+        type=Path,
+        default=PUBLISH_DIR,
+        help="Folder for the fingerprinted, precompressed copy of the site (default: dist/ in the repo root)",
     )
-    run_step(
-        "Generating static choropleth HTML",
-        [sys.executable, "generate_static_choropleth.py"],
-        assets_dir,
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=0,
+        help="Artists per lazily fetched map data shard (default: inline every artist in the map page)",
+    )
+    args = parser.parse_args()
+
+    results = run_stages(
+        site_stages(store=args.store, publish_dir=args.publish_dir, shard_size=args.shard_size),
+        ASSETS_DIR / ".build_cache.json",
+        force=args.force,
     )
+    print_report(results)
     print("Static site build complete.")
 
 
@@ -0,0 +1,239 @@
+"""Local JSON API over the collaboration predictions.
+
+Run from this folder, then query for example::
+
+    python collab_api.py --port 8060
+    curl "http://127.0.0.1:8060/artists?prefix=bad&limit=5"
+    curl "http://127.0.0.1:8060/artist/Farruko"
+    curl "http://127.0.0.1:8060/artist/Farruko/partners?market=us&k=5"
+    curl "http://127.0.0.1:8060/market/jp/top?k=10"
+
+Artist names go in a single path segment, percent-encoded (``AC%2FDC``).
+Every successful response carries an ETag derived from the predictions
+file, so a client that sends it back in ``If-None-Match`` gets ``304 Not
+Modified`` until the data changes. Errors are always sent in full.
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from artist_search_index import build_search_index, normalize_tokens
+
+# collab_query sits next to the map server in CODE/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from collab_query import DEFAULT_CSV_PATH, OVERALL, CollabIndex
+
+# Number of distinct responses kept in memory
+RESPONSE_CACHE_SIZE = 4096
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+# One entity-tag of an If-None-Match list: optional weak prefix, then a quoted tag
+ENTITY_TAG = re.compile(r'\s*(?:W/)?("[^"]*")\s*(?:,|$)')
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def dataset_version(csv_path: Path) -> str:
+    return hashlib.sha256(csv_path.read_bytes()).hexdigest()[:16]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header lists ``etag`` or is ``*``.
+
+    The header is a comma-separated list of entity-tags, compared weakly as
+    RFC 9110 prescribes for this header: ``W/"v1"`` matches ``"v1"``.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(match.group(1) == etag for match in ENTITY_TAG.finditer(if_none_match))
+
+
+def encode_json(payload: object) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def pair_json(pairs) -> list[dict]:
+    return [{"artist_1": pair.artist_1, "artist_2": pair.artist_2, "revenue": round(pair.revenue, 2)} for pair in pairs]
+
+
+class CollabApi:
+    """Routes API paths to CollabIndex queries and caches the encoded responses."""
+
+    def __init__(self, index: CollabIndex, version: str, cache_size: int = RESPONSE_CACHE_SIZE) -> None:
+        self.index = index
+        self.version = version
+        self.etag = f'"{version}"'
+        self.search_index = build_search_index(index.artists)
+        self.search_keys = [token.encode("utf-16-be") for token in self.search_index["tokens"]]
+        self.response = lru_cache(maxsize=cache_size)(self.build_response)
+
+    @classmethod
+    def from_csv(cls, csv_path: Path = DEFAULT_CSV_PATH, cache_size: int = RESPONSE_CACHE_SIZE) -> "CollabApi":
+        return cls(CollabIndex.from_csv(csv_path), dataset_version(csv_path), cache_size=cache_size)
+
+    def build_response(self, path: str, query: str) -> tuple[HTTPStatus, bytes]:
+        """Return the status and JSON body for a raw path and query string."""
+        try:
+            payload = self.route(path, parse_qs(query))
+        except ApiError as error:
+            return error.status, encode_json({"error": str(error)})
+        return HTTPStatus.OK, encode_json(payload)
+
+    def route(self, path: str, params: dict[str, list[str]]) -> object:
+        # Split before unquoting so an encoded "/" stays inside the artist name
+        segments = [unquote(segment) for segment in path.strip("/").split("/")]
+
+        if segments == ["artists"]:
+            return self.search_artists(param(params, "prefix", ""), limit_param(params, "limit"))
+        if len(segments) == 2 and segments[0] == "artist":
+            return self.artist_summary(self.known_artist(segments[1]))
+        if len(segments) == 3 and segments[0] == "artist" and segments[2] == "partners":
+            artist = self.known_artist(segments[1])
+            market = self.known_market(param(params, "market", OVERALL))
+            pairs = self.index.top_partners(artist, limit_param(params, "k"), None if market == OVERALL else market)
+            return {"artist": artist, "market": market, "partners": pair_json(pairs)}
+        if len(segments) == 3 and segments[0] == "market" and segments[2] == "top":
+            market = self.known_market(segments[1])
+            return {
+                "market": market,
+                "total_revenue": round(self.index.market_total(market), 2),
+                "pairs": pair_json(self.index.top_pairs(market, limit_param(params, "k"))),
+            }
+        if segments == ["healthz"]:
+            return {"status": "ok", "version": self.version, "artists": len(self.index)}
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No route for /{'/'.join(segments)}")
+
+    def known_artist(self, artist: str) -> str:
+        if artist not in self.index:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown artist: {artist}")
+        return artist
+
+    def known_market(self, market: str) -> str:
+        if market != OVERALL and market not in self.index.market_ids:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown market: {market}")
+        return market
+
+    def artist_summary(self, artist: str) -> dict:
+        return {
+            "artist": artist,
+            "rank": self.index.artist_id(artist) + 1,
+            "total_revenue": round(float(self.index.total_revenue(artist)), 2),
+            "collaboration_count": self.index.collaboration_count(artist),
+            "markets": [
+                {"market": market.market, "revenue": round(market.revenue, 2), "collaborations": market.collaborations}
+                for market in self.index.market_breakdown(artist)
+            ],
+            "top_partners": pair_json(self.index.top_partners(artist, k=10)),
+        }
+
+    def search_artists(self, prefix: str, limit: int) -> dict:
+        """Artists whose name has a word starting with every word of ``prefix``, by revenue."""
+        tokens = normalize_tokens(prefix)
+        if not tokens:
+            return {"prefix": prefix, "artists": self.index.artists[:limit]}
+
+        matches = None
+        for token in tokens:
+            ranks = self.ranks_for_prefix(token)
+            matches = ranks if matches is None else matches & ranks
+        artists = [self.index.artists[rank] for rank in sorted(matches)[:limit]]
+        return {"prefix": prefix, "artists": artists}
+
+    def ranks_for_prefix(self, prefix: str) -> set[int]:
+        # Tokens are sorted by UTF-16 code units, so every token starting with
+        # the prefix sits in one contiguous run
+        key = prefix.encode("utf-16-be")
+        start = bisect_left(self.search_keys, key)
+        ranks = set()
+        for position in range(start, len(self.search_keys)):
+            if not self.search_keys[position].startswith(key):
+                break
+            ranks.update(self.search_index["postings"][position])
+        return ranks
+
+
+def param(params: dict[str, list[str]], name: str, default: str) -> str:
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def limit_param(params: dict[str, list[str]], name: str) -> int:
+    value = param(params, name, str(DEFAULT_LIMIT))
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer") from None
+    if not 0 < limit <= MAX_LIMIT:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def make_handler(api: CollabApi) -> type[BaseHTTPRequestHandler]:
+    class CollabApiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            status, body = api.response(url.path, url.query)
+
+            # Only a response that would be 200 is answered with 304; errors
+            # carry no ETag and are always sent in full
+            if status == HTTPStatus.OK and etag_matches(self.headers.get("If-None-Match", ""), api.etag):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", api.etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if status == HTTPStatus.OK:
+                self.send_header("ETag", api.etag)
+                self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+    return CollabApiHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve collaboration queries as JSON.")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV_PATH, help="Predictions CSV to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    api = CollabApi.from_csv(args.csv)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.verbose = args.verbose
+    print(f"Serving {len(api.index)} artists (version {api.version}) on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
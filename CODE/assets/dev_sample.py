@@ -0,0 +1,164 @@
+"""Stratified development samples for generate_collab_predictions.py, and their drift from a full run.
+
+``--sample 0.1`` runs the normal pipeline on about a tenth of the input:
+
+* chart files: per market, the weeks are cut into consecutive blocks of
+  about ``1 / fraction`` weeks and one week is drawn from each block, so
+  every market keeps the same share of its history, spread over time
+* artists: drawn separately within each primary genre, so the genre mix
+  (and the share of same-genre candidate pairs) stays as in the full table
+
+Candidate pairs scale with the square of the artist share, so a 10% sample
+scores about 1% of the pairs. ``drift_report`` compares the sample's
+predictions with those of the last full run:
+
+* top-K overlap with the full ranking of the same candidate pairs (model
+  drift), and with the full ranking overall (what the sample can show)
+* relative error and rank correlation of revenue for pairs in both runs
+* per-market revenue totals, scaled up by the pair sampling rate, and
+  per-market revenue shares
+"""
+import math
+import random
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from prediction_diff import NAME_KEY, pair_key
+from revenue_rates import REVENUE_PREFIX
+from stream_window import chart_file_info
+
+
+TOP_K = (10, 50, 100)
+RANKING_COLUMN = f"{REVENUE_PREFIX}overall"
+
+
+def check_fraction(fraction: float) -> float:
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Sample fraction must be in (0, 1], got {fraction}")
+    return fraction
+
+
+def sample_chart_weeks(chart_weeks: dict[pd.Timestamp, list[str]], fraction: float, seed: int) -> dict[pd.Timestamp, list[str]]:
+    """Market- and week-stratified subset of the chart files, grouped by week like ``chart_weeks``."""
+    check_fraction(fraction)
+    rng = random.Random(seed)
+    block = max(1, round(1 / fraction))
+
+    market_files = defaultdict(list)
+    for start_date, files in chart_weeks.items():
+        for file in files:
+            market_files[chart_file_info(file)[0]].append((start_date, file))
+
+    sampled = defaultdict(list)
+    for market in sorted(market_files):
+        weeks = sorted(market_files[market])
+        for start in range(0, len(weeks), block):
+            start_date, file = rng.choice(weeks[start:start + block])
+            sampled[start_date].append(file)
+    return {start_date: sorted(sampled[start_date]) for start_date in sorted(sampled)}
+
+
+def sample_artists(artists_df: pd.DataFrame, fraction: float, seed: int) -> pd.DataFrame:
+    """Genre-stratified subset of the artist table, in its original order.
+
+    Artists are grouped by their first listed genre (no genre is a group of
+    its own) and each group keeps ``fraction`` of its rows, rounded.
+    """
+    check_fraction(fraction)
+    primary_genre = artists_df["genres"].map(lambda genres: genres[0] if len(genres) else "")
+    sampled = artists_df.groupby(primary_genre, group_keys=False).sample(frac=fraction, random_state=seed)
+    return sampled.sort_index().reset_index(drop=True)
+
+
+def check_full_predictions(columns: list[str]) -> None:
+    """Fail before a sample run if the full run's predictions can't be compared with it."""
+    missing = [column for column in NAME_KEY + [RANKING_COLUMN] if column not in columns]
+    if missing:
+        raise ValueError(f"Full predictions lack the columns {', '.join(missing)} needed for the drift report")
+
+
+def top_keys(df: pd.DataFrame, k: int, key: list[str]) -> set[tuple[str, str]]:
+    top = df.sort_values(RANKING_COLUMN, ascending=False, kind="stable").head(k)
+    return set(zip(top[key[0]], top[key[1]]))
+
+
+def drift_report(sample_df: pd.DataFrame, full_df: pd.DataFrame, artist_fraction: float, top_k: tuple[int, ...] = TOP_K) -> dict:
+    """How far a sample run's revenue predictions are from a full run's.
+
+    ``artist_fraction`` is the share of artists the sample kept; pair totals
+    are scaled up by its inverse square. Pairs are matched by Spotify id when
+    both runs have ids, and by name otherwise.
+    """
+    key = pair_key(full_df, sample_df)
+    sample_keys = set(zip(sample_df[key[0]], sample_df[key[1]]))
+    full_keys = list(zip(full_df[key[0]], full_df[key[1]]))
+    full_same_pairs = full_df[[pair in sample_keys for pair in full_keys]]
+
+    rankings = {}
+    for k in top_k:
+        sample_top = top_keys(sample_df, k, key)
+        rankings[k] = {
+            "same_pairs_overlap": len(sample_top & top_keys(full_same_pairs, k, key)) / k,
+            "full_overlap": len(sample_top & top_keys(full_df, k, key)) / k,
+        }
+
+    common = sample_df[key + [RANKING_COLUMN]].merge(
+        full_df[key + [RANKING_COLUMN]], on=key, suffixes=("_sample", "_full")
+    )
+    sample_revenue = common[f"{RANKING_COLUMN}_sample"]
+    full_revenue = common[f"{RANKING_COLUMN}_full"]
+    relative_error = ((sample_revenue - full_revenue).abs() / full_revenue.abs()).replace(np.inf, np.nan).dropna()
+
+    pair_fraction = artist_fraction ** 2
+    markets = []
+    for col in full_df.columns:
+        if not col.startswith(REVENUE_PREFIX) or col not in sample_df.columns:
+            continue
+        full_total = float(full_df[col].sum())
+        estimate = float(sample_df[col].sum()) / pair_fraction
+        markets.append({
+            "market": col[len(REVENUE_PREFIX):],
+            "full_total": full_total,
+            "sample_estimate": estimate,
+            "relative_error": (estimate - full_total) / full_total if full_total else math.nan,
+            "full_share": full_total / float(full_df[RANKING_COLUMN].sum()),
+            "sample_share": float(sample_df[col].sum()) / float(sample_df[RANKING_COLUMN].sum()),
+        })
+
+    return {
+        "artist_fraction": artist_fraction,
+        "sample_pairs": len(sample_df),
+        "full_pairs": len(full_df),
+        "common_pairs": len(common),
+        "top_k": rankings,
+        "common_revenue": {
+            "median_relative_error": float(relative_error.median()) if len(relative_error) else math.nan,
+            "p90_relative_error": float(relative_error.quantile(0.9)) if len(relative_error) else math.nan,
+            "spearman": float(sample_revenue.corr(full_revenue, method="spearman")) if len(common) > 1 else math.nan,
+        },
+        "markets": markets,
+    }
+
+
+def print_drift_report(report: dict) -> None:
+    print(
+        f"Sample drift against the last full run ({report['sample_pairs']:,} of {report['full_pairs']:,} pairs, "
+        f"{report['artist_fraction']:.1%} of artists, {report['common_pairs']:,} pairs in both)"
+    )
+    for k, overlap in report["top_k"].items():
+        print(
+            f"  top {k:<4} overlap: {overlap['same_pairs_overlap']:6.1%} of the full ranking of the same pairs,"
+            f" {overlap['full_overlap']:6.1%} of the full ranking"
+        )
+    common = report["common_revenue"]
+    print(
+        f"  revenue of common pairs: median error {common['median_relative_error']:.2%},"
+        f" p90 {common['p90_relative_error']:.2%}, Spearman {common['spearman']:.3f}"
+    )
+    for market in report["markets"]:
+        print(
+            f"  {market['market']:<8} total {market['full_total']:16,.2f} estimated {market['sample_estimate']:16,.2f}"
+            f" ({market['relative_error']:+7.2%})  share {market['full_share']:6.1%} -> {market['sample_share']:6.1%}"
+        )
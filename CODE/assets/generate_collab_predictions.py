@@ -1,14 +1,72 @@
+import argparse
+import json
 import pandas as pd
 import numpy as np
 from ast import literal_eval
-from itertools import combinations
 import os
 import glob
+from functools import partial
+from pathlib import Path
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
+from dev_sample import check_full_predictions, drift_report, print_drift_report, sample_artists, sample_chart_weeks
+from pair_store import PairStore, candidate_pairs, genre_matrix, pair_average
+from profile_hooks import install as install_profiling
+from revenue_rates import apply_rates, load_rate_table
+from stream_model import DEFAULT_MODEL_PATH, StreamModel, market_weights
+from stream_window import (
+    AUDIO_FEATURES,
+    RollingStreamWindow,
+    file_signature,
+    group_chart_files,
+    load_week,
+    prepare_week,
+    refresh_report,
+)
+
+# --- Command line options ---
+parser = argparse.ArgumentParser(description="Generate artist collaboration predictions.")
+parser.add_argument("--window-weeks", type=int, default=None,
+                    help="Train on the most recent N chart weeks, e.g. 26 or 52 (default: full history)")
+parser.add_argument("--half-life-weeks", type=float, default=None,
+                    help="Weight chart rows by recency with this half-life in weeks")
+parser.add_argument("--week-cache", type=Path, default=Path("data") / "week_cache",
+                    help="Folder for prepared chart weeks reused by later runs")
+parser.add_argument("--refresh-report", action="store_true",
+                    help="Time an incremental one-week refresh against a full rebuild, then exit")
+parser.add_argument("--pair-store", type=Path, default=Path("data") / "pair_store",
+                    help="Folder for the memory-mapped pair arrays (see pair_store.py)")
+parser.add_argument("--model-bundle", type=Path, default=DEFAULT_MODEL_PATH,
+                    help="Where to save the trained model for scoring_service.py")
+parser.add_argument("--sample", type=float, default=None, metavar="FRACTION",
+                    help="Dev run on a stratified sample of chart weeks and artists, e.g. 0.1 (see dev_sample.py)")
+parser.add_argument("--sample-seed", type=int, default=0)
+parser.add_argument("--sample-dir", type=Path, default=Path("data") / "sample",
+                    help="Folder for a sample run's outputs, so the full run's are left alone")
+parser.add_argument("--full-predictions", type=Path, default=Path("artist_collaboration_predictions_by_market.csv"),
+                    help="Revenue predictions of the last full run, to measure a sample's drift against")
+args = parser.parse_args()
+
+# A sample run keeps its outputs (and its partial weeks) under --sample-dir
+output_dir = Path(".")
+if args.sample:
+    output_dir = args.sample_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    args.week_cache = output_dir / "week_cache"
+    args.pair_store = output_dir / "pair_store"
+    args.model_bundle = output_dir / DEFAULT_MODEL_PATH.name
+    # Check the full run can be compared with before spending the run on the sample
+    if args.full_predictions.exists():
+        try:
+            check_full_predictions(pd.read_csv(args.full_predictions, nrows=0).columns.tolist())
+        except ValueError as error:
+            parser.error(f"{args.full_predictions}: {error}")
+
+# Profilers named in COLLAB_PROFILE (see profile_hooks.py); a no-op when unset
+install_profiling("generate_collab_predictions")
+
 # --- File paths ---
 songs_path = "data/hit_songs/Hit Songs/spotify_hits_dataset_complete.csv"
 artists_path = "data/artist_data/Artists/spotify_artists_info_complete.csv"
@@ -19,112 +77,61 @@ songs_df = pd.read_csv(songs_path, delimiter="\t")
 artists_df = pd.read_csv(artists_path, sep="\t")
 chart_files = glob.glob(os.path.join(charts_folder, "*", "*", "*.csv"))
 
-charts_data = []
-
-for file in chart_files:
-    try:
-        filename = os.path.basename(file)
-        country_code = filename.split("-")[0]
-
-        date_part = filename.split("-weekly_with_features-")[1].replace(".csv", "")
-        start_date_str, end_date_str = date_part.split("--")
-
-        start_date = pd.to_datetime(start_date_str)
-        end_date = pd.to_datetime(end_date_str)
-        year = start_date.year
-        month = start_date.month
-        iso_week = start_date.isocalendar()[1]
-
-        df = pd.read_csv(file, sep="\t", quotechar='"')
-
-        df["market"] = country_code
-        df["start_date"] = start_date
-        df["end_date"] = end_date
-        df["year"] = year
-        df["month"] = month
-        df["iso_week"] = iso_week
-
-        charts_data.append(df)
-
-    except Exception as e:
-        print(f"Error loading {file}: {e}")
-
-charts_df = pd.concat(charts_data, ignore_index=True)
-
 # --- Preprocessing: explode artist info ---
 songs_df["artist_id"] = songs_df["artist_id"].apply(literal_eval)
 songs_df = songs_df.explode("artist_id")
+song_artists = songs_df[["song_id", "artist_id"]]
+song_features = songs_df[["song_id"] + AUDIO_FEATURES]
+
+# --- Chart weeks in the training window ---
+# Each week is prepared once (and cached on disk); a new week only adds its
+# own files while the oldest week expires
+chart_weeks = group_chart_files(chart_files)
+window = RollingStreamWindow(args.window_weeks, args.half_life_weeks)
+
+if args.refresh_report:
+    refresh_report(
+        chart_weeks,
+        partial(prepare_week, song_artists=song_artists, song_features=song_features),
+        args.window_weeks,
+        args.half_life_weeks,
+    )
+    raise SystemExit(0)
 
-# Merge charts with song-artist pairs to get artist_id per charted song
-charts_with_artists_df = charts_df.merge(
-    songs_df[["song_id", "artist_id"]],
-    on="song_id",
-    how="left"
-)
-
-# Build artist-market dictionary
-artist_market_dict = charts_with_artists_df.groupby("artist_id")["market"].agg(set).to_dict()
-
-# Generate all unique artist pairs
-artist_ids = artists_df["artist_id"].unique()
-artist_pairs = list(combinations(artist_ids, 2))
-
-# Create DataFrame for artist pairs
-artist_pairs_df = pd.DataFrame(artist_pairs, columns=["artist_1_id", "artist_2_id"])
+songs_signature = file_signature([songs_path])
+window_weeks = window.select(chart_weeks)
+if args.sample:
+    # One week per market in every block of about 1 / FRACTION weeks
+    full_file_count = sum(map(len, window_weeks.values()))
+    window_weeks = sample_chart_weeks(window_weeks, args.sample, args.sample_seed)
+    print(f"Sample: {sum(map(len, window_weeks.values()))} of {full_file_count} chart files")
+for start_date, files in window_weeks.items():
+    window.add_week(load_week(start_date, files, song_artists, song_features, args.week_cache, songs_signature))
+print(f"Training window: {len(window.weeks)} chart weeks")
 
-# Attach artist_1 names
-artist_pairs_df = artist_pairs_df.merge(
-    artists_df[["artist_id", "name"]],
-    left_on="artist_1_id",
-    right_on="artist_id"
-).rename(columns={"name": "artist_1_name"}).drop(columns=["artist_id"])
+# Chart rows with artist_id per charted song, for the weeks in the window
+charts_with_artists_df = window.charts()
 
-# Attach artist_2 names
-artist_pairs_df = artist_pairs_df.merge(
-    artists_df[["artist_id", "name"]],
-    left_on="artist_2_id",
-    right_on="artist_id"
-).rename(columns={"name": "artist_2_name"}).drop(columns=["artist_id"])
+# Artist table: each artist's position in it is its integer id in the pair store
+artists_df = artists_df.drop_duplicates("artist_id").reset_index(drop=True)
 
 # Parse the genres column from string to list
 artists_df["genres"] = artists_df["genres"].apply(literal_eval)
 
-# Create helper dictionaries
-artist_genre_dict = artists_df.set_index("artist_id")["genres"].to_dict()
-artist_popularity_dict = artists_df.set_index("artist_id")["popularity"].to_dict()
-
-# Define filtering function
-def filter_artist_pairs(row):
-    pop_1 = artist_popularity_dict.get(row["artist_1_id"], 0)
-    pop_2 = artist_popularity_dict.get(row["artist_2_id"], 0)
-    if abs(pop_1 - pop_2) > 30:
-        return False
-
-    genres_1 = set(artist_genre_dict.get(row["artist_1_id"], []))
-    genres_2 = set(artist_genre_dict.get(row["artist_2_id"], []))
-    if len(genres_1 & genres_2) == 0:
-        return False
-
-    markets_1 = artist_market_dict.get(row["artist_1_id"], set())
-    markets_2 = artist_market_dict.get(row["artist_2_id"], set())
-    if not markets_1 and not markets_2:
-        return False
-
-    return True
-
-# Apply filter
-filtered_artist_pairs_df = artist_pairs_df[artist_pairs_df.apply(filter_artist_pairs, axis=1)].copy()
-
-# Define function to calculate Jaccard similarity
-def jaccard_similarity(row):
-    genres_1 = set(artist_genre_dict.get(row["artist_1_id"], []))
-    genres_2 = set(artist_genre_dict.get(row["artist_2_id"], []))
-    intersection = len(genres_1 & genres_2)
-    union = len(genres_1 | genres_2)
-    return intersection / union if union != 0 else 0
-
-# Apply to DataFrame
-filtered_artist_pairs_df["genre_similarity"] = filtered_artist_pairs_df.apply(jaccard_similarity, axis=1)
+# Sample runs keep FRACTION of the artists of each primary genre
+if args.sample:
+    full_artist_count = len(artists_df)
+    artists_df = sample_artists(artists_df, args.sample, args.sample_seed)
+    print(f"Sample: {len(artists_df):,} of {full_artist_count:,} artists")
+
+# Filter all unique artist pairs: popularity within 30, a shared genre, and
+# at least one artist in the charts. Pairs are int32 row pairs into
+# artists_df, scored with the Jaccard similarity of their genres.
+artist_1, artist_2, genre_similarity = candidate_pairs(
+    artists_df["popularity"].to_numpy(dtype=np.float64),
+    genre_matrix(artists_df["genres"].tolist()),
+    artists_df["artist_id"].isin(charts_with_artists_df["artist_id"]).to_numpy(),
+)
 
 # Merge audio features into charts_with_artists_df
 audio_features = ["danceability", "energy", "valence", "tempo"]
@@ -139,104 +146,42 @@ charts_with_audio = charts_with_artists_df.merge(
 top_songs_per_artist = charts_with_audio.sort_values(by=["artist_id", "popularity"], ascending=[True, False])
 top_songs_per_artist = top_songs_per_artist.groupby("artist_id").head(3)
 
-# Average audio features per artist
-artist_feature_avgs = top_songs_per_artist.groupby("artist_id")[audio_features].mean(numeric_only=True).reset_index()
-
-# Merge for artist_1
-filtered_artist_pairs_df = filtered_artist_pairs_df.merge(
-    artist_feature_avgs,
-    left_on="artist_1_id",
-    right_on="artist_id",
-    how="left"
-).rename(columns={
-    "danceability": "danceability_1",
-    "energy": "energy_1",
-    "valence": "valence_1",
-    "tempo": "tempo_1"
-}).drop(columns=["artist_id"])
-
-# Merge for artist_2
-filtered_artist_pairs_df = filtered_artist_pairs_df.merge(
-    artist_feature_avgs,
-    left_on="artist_2_id",
-    right_on="artist_id",
-    how="left"
-).rename(columns={
-    "danceability": "danceability_2",
-    "energy": "energy_2",
-    "valence": "valence_2",
-    "tempo": "tempo_2"
-}).drop(columns=["artist_id"])
-
-# Average audio features per pair
-def safe_average(a, b):
-    if pd.isna(a) and pd.isna(b):
-        return np.nan
-    elif pd.isna(a):
-        return b
-    elif pd.isna(b):
-        return a
-    else:
-        return (a + b) / 2
-
-for feature in ["danceability", "energy", "valence", "tempo"]:
-    filtered_artist_pairs_df[f"{feature}_avg"] = filtered_artist_pairs_df.apply(
-        lambda row: safe_average(row[f"{feature}_1"], row[f"{feature}_2"]), axis=1
-    )
-
-# Drop rows with missing averages
-filtered_artist_pairs_df.dropna(
-    subset=["danceability_avg", "energy_avg", "valence_avg", "tempo_avg"],
-    inplace=True
-)
+# Average audio features per artist, aligned with the artist table (NaN when an artist never charted)
+artist_feature_avgs = top_songs_per_artist.groupby("artist_id")[audio_features].mean(numeric_only=True)
+artist_features = artist_feature_avgs.reindex(artists_df["artist_id"]).to_numpy(dtype=np.float64)
 
-# Use charts_with_artists_df which has streams + audio features
-training_df = charts_with_artists_df.merge(
-    songs_df[["song_id", "danceability", "energy", "valence", "tempo"]],
-    on="song_id",
-    how="left"
-)
+# Average audio features per pair, gathered by artist id
+pair_features = pair_average(artist_features, artist_1, artist_2)
 
-# Filter rows with non-null streams and features
-training_df = training_df.dropna(subset=["streams", "danceability", "energy", "valence", "tempo"])
+# Drop pairs with missing averages
+complete = ~np.isnan(pair_features).any(axis=1)
+artist_1, artist_2 = artist_1[complete], artist_2[complete]
+genre_similarity, pair_features = genre_similarity[complete], pair_features[complete]
 
-# Define X and y
-X_train = training_df[["danceability", "energy", "valence", "tempo"]]
-y_train = training_df["streams"]
+# Training rows (streams + audio features) from the weeks in the window,
+# with recency weights when a half-life is set
+X_train, y_train, sample_weight = window.training_set()
 
 # Train the model
 rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-rf_model.fit(X_train, y_train)
+rf_model.fit(X_train, y_train, sample_weight=sample_weight)
 
 # Predict streams for artist collaborations
 
-# Rename columns to match training feature names
-X_predict = filtered_artist_pairs_df[["danceability_avg", "energy_avg", "valence_avg", "tempo_avg"]].copy()
-X_predict.columns = ["danceability", "energy", "valence", "tempo"]
-
-# Predict and assign
-filtered_artist_pairs_df["predicted_streams"] = rf_model.predict(X_predict)
+# Pair feature columns match the training feature names
+X_predict = pd.DataFrame(pair_features, columns=audio_features)
+predicted_streams = rf_model.predict(X_predict)
 
 # Create average audio feature profile for each market
 
-# Merge charts data with songs data to get audio features
-charts_with_audio = charts_with_artists_df.merge(
-    songs_df[["song_id", "danceability", "energy", "valence", "tempo"]],
-    on="song_id",
-    how="left"
-)
-
-# Drop rows with missing audio features
-charts_with_audio = charts_with_audio.dropna(subset=["danceability", "energy", "valence", "tempo"])
-
-# Group by market and compute mean audio features
-market_audio_profiles = charts_with_audio.groupby("market")[["danceability", "energy", "valence", "tempo"]].mean().reset_index()
+# Mean audio features per market, summed from the per-week market totals
+# (recency weighted when a half-life is set)
+market_audio_profiles = window.market_profiles()
 
 # Normalize features and compute cosine similarity (rescaled to avoid negatives)
 
 # Define the features
 feature_cols_market = ["danceability", "energy", "valence", "tempo"]
-feature_cols_pair = ["danceability_avg", "energy_avg", "valence_avg", "tempo_avg"]
 
 # ✅ Drop 'global' market from audio profiles
 market_audio_profiles_filtered = market_audio_profiles[market_audio_profiles["market"] != "global"].copy()
@@ -246,19 +191,9 @@ market_features = market_audio_profiles_filtered[feature_cols_market].copy()
 scaler = StandardScaler()
 market_scaled = scaler.fit_transform(market_features)
 
-# Prepare and scale artist pair features
-pair_features = filtered_artist_pairs_df[feature_cols_pair].copy()
-pair_features.columns = feature_cols_market  # Rename to match scaler training
-pair_scaled = scaler.transform(pair_features)
-
-# Compute raw cosine similarities
-raw_similarity_matrix = cosine_similarity(pair_scaled, market_scaled)
-
-# Rescale cosine similarities to [0, 1]
-rescaled_similarities = (raw_similarity_matrix + 1) / 2
-
-# Normalize so each row sums to 1
-normalized_similarities = rescaled_similarities / rescaled_similarities.sum(axis=1, keepdims=True)
+# Cosine similarity of each pair's scaled features to each market, rescaled
+# to [0, 1] and normalized so each row sums to 1 (shared with the scoring service)
+normalized_similarities = market_weights(X_predict, scaler, market_scaled)
 
 # Save to a DataFrame for inspection
 market_similarity_weights_df = pd.DataFrame(normalized_similarities, columns=market_audio_profiles_filtered["market"].tolist())
@@ -268,32 +203,53 @@ market_similarity_weights_df = pd.DataFrame(normalized_similarities, columns=mar
 # Pull markets in same order as market_audio_profiles
 market_list = market_audio_profiles_filtered["market"].tolist()
 
-rows = []
-
-for i, row in filtered_artist_pairs_df.iterrows():
-    predicted_streams = row["predicted_streams"]
-    similarities = normalized_similarities[i]
-
-    row_dict = row.to_dict()
-    row_dict["predicted_streams_overall"] = predicted_streams
-    row_dict["predicted_revenue_overall"] = predicted_streams * 0.004  # 👈 Insert here
-
-    for j, market in enumerate(market_list):
-        weight = similarities[j]
-        market_streams = predicted_streams * weight
-        market_revenue = market_streams * 0.004
-
-        row_dict[f"predicted_streams_{market}"] = market_streams
-        row_dict[f"predicted_revenue_{market}"] = market_revenue
-
-    rows.append(row_dict)
-
-# Create final output DataFrame
-final_df = pd.DataFrame(rows)
-
-# Optional: drop global streams and revenue if present
-final_df = final_df.drop(columns=[col for col in final_df.columns if col.endswith("_global")], errors="ignore")
-
-# Step: Export final output to CSV
-final_df.to_csv("artist_collaboration_predictions_by_market.csv", index=False)
-print("Final output written to artist_collaboration_predictions_by_market.csv")
\ No newline at end of file
+# Artist table with the averaged audio features, shared by the pair store and the model bundle
+artist_table = artists_df[["artist_id", "name"]].assign(**dict(zip(audio_features, artist_features.T)))
+
+# Save the model with what scoring a new pair needs (see stream_model.py)
+StreamModel(
+    model=rf_model,
+    scaler=scaler,
+    markets=market_list,
+    market_scaled=market_scaled,
+    artists=artist_table,
+).save(args.model_bundle)
+print(f"Model bundle written to {args.model_bundle}")
+
+# Store the pairs as memory-mapped arrays; later steps (and other processes)
+# read them from args.pair_store without copying
+PairStore(
+    artists=artist_table,
+    markets=market_list,
+    artist_1=artist_1,
+    artist_2=artist_2,
+    genre_similarity=genre_similarity,
+    predicted_streams=predicted_streams.astype(np.float32),
+    market_streams=(predicted_streams[:, None] * normalized_similarities).astype(np.float32),
+).save(args.pair_store)
+pair_store = PairStore.open(args.pair_store)
+print(f"Pair store: {len(pair_store):,} pairs in {args.pair_store}")
+
+# Resolve artist ids and names only now, for the export
+final_df = pair_store.to_frame()
+
+# Step: Export stream predictions, the source of truth for revenue
+stream_predictions_path = output_dir / "artist_collaboration_stream_predictions.csv"
+final_df.to_csv(stream_predictions_path, index=False)
+print(f"Stream predictions written to {stream_predictions_path}")
+
+# Step: Apply the per-market payout rates (revenue_rates.csv) and export revenue
+revenue_df = apply_rates(final_df, load_rate_table())
+revenue_path = output_dir / "artist_collaboration_predictions_by_market.csv"
+revenue_df.to_csv(revenue_path, index=False)
+print(f"Final output written to {revenue_path}")
+
+# Step: Compare a sample run with the last full run
+if args.sample:
+    if args.full_predictions.exists():
+        report = drift_report(revenue_df, pd.read_csv(args.full_predictions), len(artists_df) / full_artist_count)
+        print_drift_report(report)
+        (output_dir / "drift_report.json").write_text(json.dumps(report, indent=2))
+        print(f"Drift report written to {output_dir / 'drift_report.json'}")
+    else:
+        print(f"No full run at {args.full_predictions} to compare the sample with")
\ No newline at end of file
@@ -1,8 +1,22 @@
+import argparse
+import hashlib
 import json
+import re
+import shutil
+import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from artist_search_index import build_search_index
+from profile_hooks import install as install_profiling
+
+# collab_query sits next to the map server in CODE/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from collab_query import CollabIndex, descending_order, rank_artists
+
 
 COUNTRY_MAPPING = {
     "predicted_revenue_us": "United States",
@@ -360,7 +374,12 @@ HTML_TEMPLATE = """<!DOCTYPE html>
   <script>
     const dashboardData = {dashboard_data};
     const artistOrder = {artist_order};
-    const selectEl = document.getElementById("artistSelect");
+    const shardIndex = {shard_index};
+    const searchIndex = {search_index};
+    const searchLimit = 50;
+    const shardRequests = {{}};
+    let artistPositions;
+    let currentArtist;
     const totalRevenueEl = document.getElementById("totalRevenue");
     const collabCountEl = document.getElementById("collabCount");
     const collabListEl = document.getElementById("collaborationList");
@@ -375,13 +394,56 @@ HTML_TEMPLATE = """<!DOCTYPE html>
       }}).format(value);
     }}
 
-    function buildOptions() {{
-      artistOrder.forEach((artist) => {{
-        const option = document.createElement("option");
-        option.value = artist;
-        option.textContent = artist;
-        selectEl.appendChild(option);
+    function normalizeTokens(text) {{
+      return text
+        .normalize("NFKD")
+        .replace(/\p{{M}}/gu, "")
+        .toLowerCase()
+        .split(/[^\p{{L}}\p{{N}}]+/u)
+        .filter(Boolean);
+    }}
+
+    function lowerBound(values, target) {{
+      let low = 0;
+      let high = values.length;
+      while (low < high) {{
+        const middle = (low + high) >>> 1;
+        if (values[middle] < target) {{
+          low = middle + 1;
+        }} else {{
+          high = middle;
+        }}
+      }}
+      return low;
+    }}
+
+    function ranksForPrefix(prefix) {{
+      const ranks = new Set();
+      const {{tokens, postings}} = searchIndex;
+      for (let i = lowerBound(tokens, prefix); i < tokens.length && tokens[i].startsWith(prefix); i += 1) {{
+        postings[i].forEach((rank) => ranks.add(rank));
+      }}
+      return ranks;
+    }}
+
+    function searchArtists(query, limit) {{
+      const terms = normalizeTokens(query);
+      if (!terms.length) {{
+        return artistOrder.slice(0, limit).map((_, rank) => rank);
+      }}
+
+      const termRanks = terms.map(ranksForPrefix).sort((a, b) => a.size - b.size);
+      const matches = [];
+      termRanks[0].forEach((rank) => {{
+        if (termRanks.every((ranks) => ranks.has(rank))) {{
+          matches.push(rank);
+        }}
       }});
+      return matches.sort((a, b) => a - b).slice(0, limit);
+    }}
+
+    function pickerOptions(ranks) {{
+      return ranks.map((rank) => ({{value: artistOrder[rank], text: artistOrder[rank], rank}}));
     }}
 
     function renderCollaborations(rows) {{
@@ -414,8 +476,51 @@ HTML_TEMPLATE = """<!DOCTYPE html>
       }});
     }}
 
+    function loadShard(shardId) {{
+      if (!shardRequests[shardId]) {{
+        shardRequests[shardId] = fetch(shardIndex.files[shardId])
+          .then((response) => {{
+            if (!response.ok) {{
+              throw new Error(`Could not load ${{shardIndex.files[shardId]}}`);
+            }}
+            return response.json();
+          }})
+          .then((views) => Object.assign(dashboardData, views))
+          .catch((error) => {{
+            delete shardRequests[shardId];
+            throw error;
+          }});
+      }}
+      return shardRequests[shardId];
+    }}
+
+    function loadView(artist) {{
+      if (dashboardData[artist] || !shardIndex) {{
+        return Promise.resolve(dashboardData[artist]);
+      }}
+      if (!artistPositions) {{
+        artistPositions = new Map(artistOrder.map((name, position) => [name, position]));
+      }}
+      // An empty or unknown artist (e.g. a cleared picker) has no view, as in an unsharded page
+      if (!artist || !artistPositions.has(artist)) {{
+        return Promise.resolve(undefined);
+      }}
+      const shardId = shardIndex.shards[artistPositions.get(artist)];
+      return loadShard(shardId).then(() => dashboardData[artist]);
+    }}
+
     function renderMap(artist) {{
-      const view = dashboardData[artist];
+      currentArtist = artist;
+      loadView(artist)
+        .then((view) => {{
+          if (artist === currentArtist && view) {{
+            renderView(view);
+          }}
+        }})
+        .catch((error) => console.error(error));
+    }}
+
+    function renderView(view) {{
       totalRevenueEl.textContent = currency(view.total_revenue);
       collabCountEl.textContent = String(view.collaboration_count);
       renderCollaborations(view.top_collaborations);
@@ -466,16 +571,28 @@ HTML_TEMPLATE = """<!DOCTYPE html>
       Plotly.react("map", data, layout, {{responsive: true, displayModeBar: false}});
     }}
 
-    buildOptions();
+    // Only the best-ranked matches for the current query are handed to
+    // TomSelect, so the dropdown never holds one node per artist.
+    let visibleRanks = new Set(searchArtists("", searchLimit));
     artistPicker = new TomSelect("#artistSelect", {{
       create: false,
       maxItems: 1,
+      maxOptions: searchLimit,
+      options: pickerOptions([...visibleRanks]),
       sortField: {{
-        field: "text",
+        field: "rank",
         direction: "asc"
       }},
       placeholder: "Search artists...",
-      searchField: ["text"]
+      searchField: [],
+      score: () => (item) => (visibleRanks.has(item.rank) ? 1 : 0)
+    }});
+    artistPicker.on("type", (query) => {{
+      const ranks = searchArtists(query, searchLimit);
+      visibleRanks = new Set(ranks);
+      artistPicker.clearOptions();
+      artistPicker.addOptions(pickerOptions(ranks));
+      artistPicker.refreshOptions(true);
     }});
     artistPicker.setValue(artistOrder[0], true);
     renderMap(artistOrder[0]);
@@ -486,68 +603,276 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 """
 
 
-def main() -> None:
-    assets_dir = Path(__file__).resolve().parent
-    code_dir = assets_dir.parent
-    csv_path = assets_dir / "artist_collaboration_predictions_by_market.csv"
-    output_path = code_dir / "artist_collaboration_map.html"
-
-    df = pd.read_csv(csv_path)
-    market_cols = list(COUNTRY_MAPPING.keys())
-    melted_df = df.melt(
-        id_vars=["artist_1_name", "artist_2_name"],
-        value_vars=market_cols,
-        var_name="market",
-        value_name="revenue",
-    )
-    melted_df["country"] = melted_df["market"].map(COUNTRY_MAPPING)
-
-    total_artist_1 = melted_df.groupby("artist_1_name")["revenue"].sum()
-    total_artist_2 = melted_df.groupby("artist_2_name")["revenue"].sum()
-    total_revenue = total_artist_1.add(total_artist_2, fill_value=0)
-    artist_order = total_revenue.sort_values(ascending=False).index.tolist()
-
+def build_dashboard_data(index: CollabIndex, artists: list[str] | None = None) -> tuple[list[str], dict[str, dict]]:
+    """Per-artist map views, for every artist of the index or only ``artists``."""
+    market_countries = {column.rsplit("_", 1)[1]: country for column, country in COUNTRY_MAPPING.items()}
     dashboard_data = {}
 
-    for artist in artist_order:
-        filtered_df = melted_df[
-            (melted_df["artist_1_name"] == artist) | (melted_df["artist_2_name"] == artist)
-        ].copy()
-
-        collab_count = filtered_df.groupby("country").size().reset_index(name="collaborations")
-        revenue_by_country = filtered_df.groupby("country", as_index=False)["revenue"].sum()
-        merged_df = revenue_by_country.merge(collab_count, on="country", how="left")
-
-        top_collaborations = (
-            filtered_df.groupby(["artist_1_name", "artist_2_name"], as_index=False)["revenue"]
-            .sum()
-            .sort_values(by="revenue", ascending=False)
-            .head(10)
-        )
+    for artist in index.artists if artists is None else artists:
+        # Countries in name order, as the Dash app lists them
+        breakdown = sorted(index.market_breakdown(artist), key=lambda market: market_countries[market.market])
+        countries = [market_countries[market.market] for market in breakdown]
+        revenues = [market.revenue for market in breakdown]
+        top_market_rows = descending_order(np.array(revenues))[:3]
 
         dashboard_data[artist] = {
-            "countries": merged_df["country"].tolist(),
-            "revenues": [round(value, 2) for value in merged_df["revenue"].tolist()],
-            "collaborations": merged_df["collaborations"].astype(int).tolist(),
-            "total_revenue": round(filtered_df["revenue"].sum(), 2),
-            "collaboration_count": int(
-                filtered_df[["artist_1_name", "artist_2_name"]].drop_duplicates().shape[0]
-            ),
+            "countries": countries,
+            "revenues": [round(value, 2) for value in revenues],
+            "collaborations": [market.collaborations for market in breakdown],
+            "total_revenue": round(index.total_revenue(artist), 2),
+            "collaboration_count": index.collaboration_count(artist),
             "top_collaborations": [
                 {
-                    "pair": f"{row.artist_1_name} & {row.artist_2_name}",
-                    "revenue": round(row.revenue, 2),
+                    "pair": f"{pair.artist_1} & {pair.artist_2}",
+                    "revenue": round(pair.revenue, 2),
                 }
-                for row in top_collaborations.itertuples(index=False)
+                for pair in index.top_partners(artist, k=10)
             ],
-            "top_markets": merged_df.sort_values("revenue", ascending=False)["country"].head(3).tolist(),
+            "top_markets": [countries[row] for row in top_market_rows],
         }
 
+    return index.artists, dashboard_data
+
+
+def shard_files(shard_dir: Path) -> list[Path]:
+    """Files in ``shard_dir`` named like the shards ``write_shards`` writes; anything else there is left alone."""
+    return [path for path in shard_dir.glob("*.json") if SHARD_NAME.match(path.name)]
+
+
+def write_shards(
+    dashboard_data: dict[str, dict],
+    artist_order: list[str],
+    shard_dir: Path,
+    shard_size: int,
+) -> dict:
+    """Write per-artist views into content-hashed shard files and return the shard index.
+
+    Shards whose content is unchanged keep their file; stale ones are removed.
+    Only files named like shards are ever removed from ``shard_dir``.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    shards = []
+    for start in range(0, len(artist_order), shard_size):
+        artists = artist_order[start:start + shard_size]
+        payload = json.dumps(
+            {artist: dashboard_data[artist] for artist in artists},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest()[:SHARD_HASH_LENGTH]
+        shard_path = shard_dir / f"{digest}.json"
+        if not shard_path.exists():
+            shard_path.write_bytes(payload)
+        files.append(f"{shard_dir.name}/{digest}.json")
+        shards.extend([len(files) - 1] * len(artists))
+
+    current = {Path(file).name for file in files}
+    for stale_shard in shard_files(shard_dir):
+        if stale_shard.name not in current:
+            stale_shard.unlink()
+    return {"files": files, "shards": shards}
+
+
+def load_map_views(page_path: Path) -> dict[str, dict] | None:
+    """The per-artist views a written map page holds, inline or in its shards; None if they can't be read."""
+    if not page_path.exists():
+        return None
+    html = page_path.read_text(encoding="utf-8")
+    data = re.search(r"^\s*const dashboardData = (.*);$", html, re.MULTILINE)
+    shard_index = re.search(r"^\s*const shardIndex = (.*);$", html, re.MULTILINE)
+    if data is None or shard_index is None:
+        return None
+    try:
+        views = json.loads(data.group(1))
+        shard_index = json.loads(shard_index.group(1))
+        for file in shard_index["files"] if shard_index else []:
+            views.update(json.loads((page_path.parent / file).read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        return None
+    return views
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+DEFAULT_CSV_PATH = ASSETS_DIR / "artist_collaboration_predictions_by_market.csv"
+DEFAULT_OUTPUT_PATH = ASSETS_DIR.parent / "artist_collaboration_map.html"
+DEFAULT_SHARD_DIR = ASSETS_DIR.parent / "artist_collaboration_map_data"
+# Shards are named after the first hex digits of their content hash
+SHARD_HASH_LENGTH = 16
+SHARD_NAME = re.compile(r"^[0-9a-f]{%d}\.json$" % SHARD_HASH_LENGTH)
+# Predictions the page was last built from, for refresh_map_page
+DEFAULT_SNAPSHOT_DIR = ASSETS_DIR / ".map_snapshot"
+MAP_CODE = (
+    Path(__file__).resolve(),
+    ASSETS_DIR.parent / "collab_query.py",
+    ASSETS_DIR / "artist_search_index.py",
+    ASSETS_DIR / "prediction_diff.py",
+)
+
+
+def write_map_page(
+    index: CollabIndex,
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+    shard_size: int = 0,
+    shard_dir: Path = DEFAULT_SHARD_DIR,
+) -> Path:
+    """Write the static map page for already indexed predictions."""
+    artist_order, dashboard_data = build_dashboard_data(index)
+    return render_map_page(artist_order, dashboard_data, output_path, shard_size, shard_dir)
+
+
+def update_map_page(
+    predictions: pd.DataFrame,
+    affected_artists: set[str],
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+    shard_size: int = 0,
+    shard_dir: Path = DEFAULT_SHARD_DIR,
+) -> Path | None:
+    """Rewrite the map page for new predictions, rebuilding only the views of ``affected_artists``.
+
+    Every other view is taken from the page as it is, so it must have been
+    built from predictions that differ from these only in the affected
+    artists' pairs (see prediction_diff.py). The artist order is ranked from
+    all of the predictions. Returns None, writing nothing, when the page
+    lacks a view it would reuse.
+    """
+    artist_order = rank_artists(predictions)
+    rebuilt = [artist for artist in artist_order if artist in affected_artists]
+    views = load_map_views(output_path)
+    if views is None or any(artist not in views for artist in artist_order if artist not in affected_artists):
+        return None
+
+    # A view only depends on the artist's own pairs, in their order
+    touched = predictions["artist_1_name"].isin(rebuilt) | predictions["artist_2_name"].isin(rebuilt)
+    if rebuilt:
+        _, rebuilt_views = build_dashboard_data(CollabIndex(predictions[touched].reset_index(drop=True)), rebuilt)
+        views.update(rebuilt_views)
+    print(f"Rebuilt {len(rebuilt)} of {len(artist_order)} artist views")
+    return render_map_page(artist_order, {artist: views[artist] for artist in artist_order}, output_path, shard_size, shard_dir)
+
+
+def code_digest(paths: tuple[Path, ...] = MAP_CODE) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def refresh_map_page(
+    index: CollabIndex,
+    csv_path: Path,
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+    snapshot_dir: Path = DEFAULT_SNAPSHOT_DIR,
+    shard_size: int = 0,
+    shard_dir: Path = DEFAULT_SHARD_DIR,
+) -> Path:
+    """Write the map page for ``csv_path``, rebuilding only the views its changes touch.
+
+    ``snapshot_dir`` keeps a copy of the predictions the page was built from,
+    with hashes of the page and of the code that wrote it and the shard
+    settings. When all of them still match, the views of artists whose pairs
+    are unchanged are reused; otherwise every view is rebuilt.
+    """
+    from prediction_diff import diff_predictions
+
+    snapshot_csv = snapshot_dir / "predictions.csv"
+    state_path = snapshot_dir / "state.json"
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    shards = {"shard_size": shard_size, "shard_dir": str(shard_dir.resolve())}
+    written = None
+    if (
+        snapshot_csv.exists()
+        and output_path.exists()
+        and state.get("code") == code_digest()
+        and state.get("shards") == shards
+        and state.get("page") == hashlib.sha256(output_path.read_bytes()).hexdigest()
+    ):
+        diff = diff_predictions(pd.read_csv(snapshot_csv), index.predictions)
+        written = update_map_page(index.predictions, diff.affected_artists, output_path, shard_size, shard_dir)
+    if written is None:
+        written = write_map_page(index, output_path, shard_size, shard_dir)
+
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(csv_path, snapshot_csv)
+    state_path.write_text(json.dumps({
+        "code": code_digest(),
+        "shards": shards,
+        "page": hashlib.sha256(written.read_bytes()).hexdigest(),
+    }), encoding="utf-8")
+    return written
+
+
+def render_map_page(
+    artist_order: list[str],
+    dashboard_data: dict[str, dict],
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+    shard_size: int = 0,
+    shard_dir: Path = DEFAULT_SHARD_DIR,
+) -> Path:
+    shard_index = None
+    if shard_size > 0:
+        shard_index = write_shards(dashboard_data, artist_order, shard_dir, shard_size)
+        # Only the first artist is inlined so the first paint needs no request
+        dashboard_data = {artist_order[0]: dashboard_data[artist_order[0]]}
+        print(f"Wrote {len(shard_index['files'])} data shards to {shard_dir}")
+    elif shard_dir.is_dir():
+        # Every view is inline now, so shards of an earlier sharded build are stale
+        for stale_shard in shard_files(shard_dir):
+            stale_shard.unlink()
+
     html = HTML_TEMPLATE.format(
         dashboard_data=json.dumps(dashboard_data, ensure_ascii=False),
         artist_order=json.dumps(artist_order, ensure_ascii=False),
+        shard_index=json.dumps(shard_index),
+        search_index=json.dumps(build_search_index(artist_order), ensure_ascii=False, separators=(",", ":")),
     )
     output_path.write_text(html, encoding="utf-8")
+    return output_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate the static artist collaboration map page.")
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=0,
+        help="Artists per lazily fetched data shard (default: inline every artist in the page)",
+    )
+    parser.add_argument("--db", type=Path, help="Read the predictions from this SQLite store instead of the CSV")
+    parser.add_argument(
+        "--since",
+        type=Path,
+        help="Predictions CSV the current page was built from; only the views of artists whose pairs changed are rebuilt (not with --db)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.0,
+        help="With --since, ignore pairs whose revenue moved by at most this much in every market",
+    )
+    args = parser.parse_args()
+    if args.since and args.db:
+        # The diff reads the CSV, so a page built from the store would be
+        # compared against a different source than the one it came from
+        parser.error("--since compares predictions CSVs and cannot be combined with --db; rebuild from the store without --since")
+    install_profiling("generate_static_choropleth")
+
+    if args.since:
+        from prediction_diff import diff_predictions
+
+        predictions = pd.read_csv(DEFAULT_CSV_PATH)
+        diff = diff_predictions(pd.read_csv(args.since), predictions, args.threshold)
+        print(f"{len(diff.delta):,} pairs changed since {args.since}")
+        output_path = update_map_page(predictions, diff.affected_artists, shard_size=args.shard_size)
+        if output_path is None:
+            print("The current page lacks views to reuse; rebuilding every view")
+            output_path = write_map_page(CollabIndex(predictions), shard_size=args.shard_size)
+    elif args.db:
+        from collab_store import SqliteCollabStore
+
+        output_path = write_map_page(SqliteCollabStore(args.db), shard_size=args.shard_size)
+    else:
+        output_path = write_map_page(CollabIndex.from_csv(DEFAULT_CSV_PATH), shard_size=args.shard_size)
     print(f"Wrote {output_path}")
 
 
@@ -0,0 +1,105 @@
+"""Local load test for the Dash choropleth callback.
+
+Start the app first (dev server or gunicorn), then run for example::
+
+    python load_test_choropleth.py --url http://127.0.0.1:8050 --concurrency 8 --requests 2000
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+
+CALLBACK_OUTPUTS = [
+    {"id": "choropleth-map", "property": "figure"},
+    {"id": "total-revenue-tracker", "property": "children"},
+    {"id": "collaboration-list", "property": "children"},
+]
+
+
+def find_component(node, component_id: str) -> dict | None:
+    if isinstance(node, dict):
+        if node.get("props", {}).get("id") == component_id:
+            return node
+        children = node.get("props", {}).get("children")
+        return find_component(children, component_id)
+    if isinstance(node, list):
+        for child in node:
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def fetch_artists(base_url: str) -> list[str]:
+    with urllib.request.urlopen(f"{base_url}/_dash-layout") as response:
+        layout = json.load(response)
+    dropdown = find_component(layout, "primary-artist-dropdown")
+    if dropdown is None:
+        raise ValueError("Could not find the artist dropdown in the app layout")
+    return [option["value"] for option in dropdown["props"]["options"]]
+
+
+def callback_payload(artist: str) -> bytes:
+    body = {
+        "output": "..choropleth-map.figure...total-revenue-tracker.children...collaboration-list.children..",
+        "outputs": CALLBACK_OUTPUTS,
+        "inputs": [{"id": "primary-artist-dropdown", "property": "value", "value": artist}],
+        "changedPropIds": ["primary-artist-dropdown.value"],
+    }
+    return json.dumps(body).encode("utf-8")
+
+
+def timed_request(base_url: str, payload: bytes) -> tuple[float, int]:
+    request = urllib.request.Request(
+        f"{base_url}/_dash-update-component",
+        data=payload,
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        size = len(response.read())
+    return time.perf_counter() - start, size
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the choropleth callback.")
+    parser.add_argument("--url", default="http://127.0.0.1:8050")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests sent before measuring")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    artists = fetch_artists(base_url)
+    payloads = [callback_payload(artist) for artist in islice(cycle(artists), args.requests)]
+
+    for payload in payloads[: args.warmup]:
+        timed_request(base_url, payload)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda payload: timed_request(base_url, payload), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    mean_size = statistics.mean(size for _, size in results)
+    print(f"Artists cycled: {len(artists)}")
+    print(f"Requests: {len(results)} at concurrency {args.concurrency}")
+    print(f"Throughput: {len(results) / elapsed:,.1f} req/s")
+    print(f"Latency p50: {percentile(latencies, 0.50):.2f} ms")
+    print(f"Latency p95: {percentile(latencies, 0.95):.2f} ms")
+    print(f"Latency p99: {percentile(latencies, 0.99):.2f} ms")
+    print(f"Mean response size: {mean_size:,.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Local load test for the collaboration JSON API.
+
+Start the API first (``python collab_api.py``), then run for example::
+
+    python load_test_collab_api.py --concurrency 16 --requests 5000 --revalidate 0.5
+
+Requests cycle through artist summaries, partner lists, market rankings and
+prefix searches. ``--revalidate`` is the share of requests sent with the
+ETag from a previous response, which the server should answer with 304.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from load_test_choropleth import percentile
+
+
+MARKETS = ["overall", "us", "jp", "fr", "gb", "ca", "br", "de", "au"]
+
+
+def fetch_json(base_url: str, path: str) -> tuple[dict, str]:
+    with urllib.request.urlopen(f"{base_url}{path}") as response:
+        return json.load(response), response.headers.get("ETag", "")
+
+
+def request_paths(artists: list[str], count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        artist = quote(rng.choice(artists), safe="")
+        market = rng.choice(MARKETS)
+        paths.append(rng.choice([
+            f"/artist/{artist}",
+            f"/artist/{artist}/partners?market={market}&k=10",
+            f"/market/{market}/top?k=25",
+            f"/artists?prefix={quote(rng.choice(artists)[:2])}&limit=10",
+        ]))
+    return paths
+
+
+def timed_request(base_url: str, path: str, etag: str) -> tuple[float, int, int]:
+    headers = {"If-None-Match": etag} if etag else {}
+    request = urllib.request.Request(f"{base_url}{path}", headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            status, size = response.status, len(response.read())
+    except urllib.error.HTTPError as error:
+        # urllib treats 304 as an error; it is the expected revalidation answer
+        status, size = error.code, len(error.read())
+    return time.perf_counter() - start, status, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the collaboration JSON API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8060")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests sent before measuring")
+    parser.add_argument("--revalidate", type=float, default=0.0, help="Share of requests sent with If-None-Match")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    listing, etag = fetch_json(base_url, "/artists?limit=200")
+    artists = listing["artists"]
+    paths = request_paths(artists, args.requests, args.seed)
+    rng = random.Random(args.seed + 1)
+    etags = [etag if rng.random() < args.revalidate else "" for _ in paths]
+
+    for path in paths[: args.warmup]:
+        timed_request(base_url, path, "")
+
+    lock = threading.Lock()
+    statuses = {}
+
+    def run(item: tuple[str, str]) -> tuple[float, int]:
+        latency, status, size = timed_request(base_url, *item)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+        return latency, size
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run, zip(paths, etags)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    mean_size = statistics.mean(size for _, size in results)
+    print(f"Artists sampled: {len(artists)}")
+    print(f"Requests: {len(results)} at concurrency {args.concurrency}")
+    print(f"Status counts: {', '.join(f'{status}={count}' for status, count in sorted(statuses.items()))}")
+    print(f"Throughput: {len(results) / elapsed:,.1f} req/s")
+    print(f"Latency p50: {percentile(latencies, 0.50):.2f} ms")
+    print(f"Latency p95: {percentile(latencies, 0.95):.2f} ms")
+    print(f"Latency p99: {percentile(latencies, 0.99):.2f} ms")
+    print(f"Mean response size: {mean_size:,.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Load test for the scoring service: micro-batched against one pair at a time.
+
+Starts ``scoring_service.py`` once per ``--batch-sizes`` entry and sends the
+same single-pair requests from ``--concurrency`` keep-alive connections. A
+batch size of 1 is one ``predict`` per request. Run for example::
+
+    python load_test_scoring_service.py --model data/stream_model.joblib --batch-sizes 1 16 64
+    python load_test_scoring_service.py --synthetic-artists 5000 --concurrency 64 --requests 5000
+
+``--synthetic-artists`` trains a stand-in model on random features, so the
+test runs without the batch job's data.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from load_test_choropleth import percentile
+from stream_model import DEFAULT_MODEL_PATH, StreamModel
+from stream_window import AUDIO_FEATURES
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from collab_query import MARKET_CODES  # noqa: E402
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+
+
+def synthetic_model(n_artists: int, seed: int) -> StreamModel:
+    """A random forest trained on random audio features, with random market profiles."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(seed)
+
+    def random_features(n: int) -> pd.DataFrame:
+        features = rng.uniform(0, 1, size=(n, len(AUDIO_FEATURES)))
+        features[:, AUDIO_FEATURES.index("tempo")] = rng.uniform(60, 180, size=n)
+        return pd.DataFrame(features, columns=AUDIO_FEATURES)
+
+    X_train = random_features(5_000)
+    y_train = 1e5 * (X_train["danceability"] + X_train["energy"]) + rng.lognormal(10, 1, size=len(X_train))
+    model = RandomForestRegressor(n_estimators=100, random_state=42).fit(X_train, y_train)
+
+    market_profiles = random_features(len(MARKET_CODES))
+    scaler = StandardScaler().fit(market_profiles)
+    artists = pd.DataFrame({
+        "artist_id": [f"synthetic{i}" for i in range(n_artists)],
+        "name": [f"Artist {i:06d}" for i in range(n_artists)],
+    }).join(random_features(n_artists))
+    return StreamModel(model, scaler, list(MARKET_CODES), scaler.transform(market_profiles), artists)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def get(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str) -> tuple[int, bytes]:
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def fetch_json(port: int, path: str) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, body = await get(reader, writer, path)
+        return json.loads(body)
+    finally:
+        writer.close()
+
+
+async def wait_until_ready(port: int, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Scoring service exited during startup")
+        try:
+            await fetch_json(port, "/healthz")
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Scoring service did not start in time")
+
+
+async def run_load(port: int, paths: list[str], concurrency: int) -> tuple[list[float], dict[int, int], float]:
+    """Send every path over ``concurrency`` connections; return sorted latencies (ms), status counts and seconds."""
+    pending = iter(paths)
+    latencies = []
+    statuses = {}
+
+    async def worker() -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for path in pending:
+                started = time.perf_counter()
+                status, _ = await get(reader, writer, path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(latencies), statuses, time.perf_counter() - started
+
+
+async def measure(model_path: Path, batch_size: int, args: argparse.Namespace, paths: list[str]) -> dict:
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "scoring_service.py",
+            "--model", str(model_path),
+            "--port", str(port),
+            "--max-batch-size", str(batch_size),
+            "--max-wait-ms", str(args.max_wait_ms),
+        ],
+        cwd=ASSETS_DIR,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        await wait_until_ready(port, process)
+        await run_load(port, paths[: args.warmup], args.concurrency)
+        before = await fetch_json(port, "/healthz")
+        latencies, statuses, seconds = await run_load(port, paths, args.concurrency)
+        after = await fetch_json(port, "/healthz")
+    finally:
+        process.terminate()
+        process.wait()
+
+    batches = after["batches"] - before["batches"]
+    return {
+        "batch_size": batch_size,
+        "throughput": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "mean_batch": (after["pairs"] - before["pairs"]) / batches if batches else 0.0,
+        "statuses": statuses,
+    }
+
+
+def request_paths(model: StreamModel, count: int, seed: int) -> list[str]:
+    """Random pairs of artists that have audio features, by Spotify id."""
+    scorable = model.artists.loc[~np.isnan(model.features).any(axis=1), "artist_id"].tolist()
+    rng = random.Random(seed)
+    return [
+        f"/score?artist_1={quote(rng.choice(scorable), safe='')}&artist_2={quote(rng.choice(scorable), safe='')}"
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the scoring service with and without micro-batching.")
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL_PATH, help="Bundle saved by generate_collab_predictions.py")
+    parser.add_argument("--synthetic-artists", type=int, help="Train a stand-in model with this many random artists")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64], help="--max-batch-size of each run")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200, help="Untimed requests sent before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_artists:
+            model = synthetic_model(args.synthetic_artists, args.seed)
+            model_path = model.save(Path(tmp) / "stream_model.joblib")
+        else:
+            model_path = args.model.resolve()
+            model = StreamModel.load(model_path)
+        paths = request_paths(model, args.requests, args.seed)
+        print(f"{len(model.artists):,} artists, {len(paths):,} requests at concurrency {args.concurrency}")
+
+        results = [asyncio.run(measure(model_path, batch_size, args, paths)) for batch_size in args.batch_sizes]
+
+    baseline = results[0]["throughput"]
+    for result in results:
+        statuses = ", ".join(f"{status}={count}" for status, count in sorted(result["statuses"].items()))
+        print(
+            f"  max batch {result['batch_size']:>4}: {result['throughput']:9,.1f} req/s ({result['throughput'] / baseline:5.1f}x)"
+            f"  p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+            f"  mean batch {result['mean_batch']:5.1f}  [{statuses}]"
+        )
+
+
+if __name__ == "__main__":
+    main()
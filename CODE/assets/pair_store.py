@@ -0,0 +1,194 @@
+"""Compact artist-pair store for generate_collab_predictions.py.
+
+Candidate pairs are never held as rows of id and name strings. A pair is a
+position in a few flat arrays:
+
+* ``artist_1`` / ``artist_2``: int32 rows into the artist table
+* ``genre_similarity``, ``predicted_streams``: float32, one value per pair
+* ``market_streams``: float32, one row per pair and one column per market
+
+The artist table (Spotify id, name, averaged audio features) is stored once
+next to them. ``PairStore.save`` writes each array as a ``.npy`` file and
+``PairStore.open`` memory-maps them read-only, so several processes or later
+steps share the same pages instead of each loading a copy. Names are only
+looked up in ``to_frame`` when the predictions are exported::
+
+    python pair_store.py data/pair_store --output artist_collaboration_stream_predictions.csv
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from stream_window import AUDIO_FEATURES
+
+
+ARRAY_NAMES = ("artist_1", "artist_2", "genre_similarity", "predicted_streams", "market_streams")
+# Working memory for one block of the pair matrix when filtering candidates.
+# A block peaks at about 24 bytes per cell: the int32 shared-genre counts, the
+# float64 popularity gaps and the boolean masks.
+BLOCK_MEMORY = 256 * 2**20
+PAIR_CELL_BYTES = 24
+
+
+def genre_matrix(genres: list[list[str]]) -> sparse.csr_matrix:
+    """Artists x genres indicator matrix; a genre listed twice for an artist counts once."""
+    vocabulary = {}
+    rows, cols = [], []
+    for row, artist_genres in enumerate(genres):
+        for genre in set(artist_genres):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(genre, len(vocabulary)))
+    data = np.ones(len(rows), dtype=np.int32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(genres), max(len(vocabulary), 1)))
+
+
+def rows_per_block(n_artists: int, memory_budget: int = BLOCK_MEMORY) -> int:
+    """Rows of the pair matrix per block that fit in ``memory_budget`` bytes."""
+    return max(1, memory_budget // (PAIR_CELL_BYTES * max(n_artists, 1)))
+
+
+def candidate_pairs(
+    popularity: np.ndarray,
+    genres: sparse.csr_matrix,
+    has_market: np.ndarray,
+    max_popularity_gap: float = 30,
+    memory_budget: int = BLOCK_MEMORY,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Filter every unordered artist pair and score the ones that pass.
+
+    A pair is kept when the popularity gap is at most ``max_popularity_gap``,
+    the artists share a genre and at least one of them charted. Pairs come
+    out in ``itertools.combinations`` order with their genre Jaccard
+    similarity. The pair matrix is only ever materialised a block of rows at
+    a time, sized so a block's dense arrays stay within ``memory_budget``
+    bytes however many artists there are.
+    """
+    n_artists = len(popularity)
+    block_size = rows_per_block(n_artists, memory_budget)
+    genre_counts = np.asarray(genres.sum(axis=1)).ravel()
+    columns = np.arange(n_artists)
+    artist_1_blocks, artist_2_blocks, similarity_blocks = [], [], []
+
+    for start in range(0, n_artists, block_size):
+        stop = min(start + block_size, n_artists)
+        shared = (genres[start:stop] @ genres.T).toarray()
+        rows = np.arange(start, stop)[:, None]
+
+        # NaN popularity compares False, so it never rules a pair out
+        keep = (
+            (columns > rows)
+            & ~(np.abs(popularity[rows] - popularity) > max_popularity_gap)
+            & (shared > 0)
+            & (has_market[rows] | has_market)
+        )
+        block_rows, artist_2 = np.nonzero(keep)
+        intersection = shared[block_rows, artist_2]
+        union = genre_counts[block_rows + start] + genre_counts[artist_2] - intersection
+
+        artist_1_blocks.append((block_rows + start).astype(np.int32))
+        artist_2_blocks.append(artist_2.astype(np.int32))
+        similarity_blocks.append((intersection / union).astype(np.float32))
+
+    return (
+        np.concatenate(artist_1_blocks) if artist_1_blocks else np.empty(0, dtype=np.int32),
+        np.concatenate(artist_2_blocks) if artist_2_blocks else np.empty(0, dtype=np.int32),
+        np.concatenate(similarity_blocks) if similarity_blocks else np.empty(0, dtype=np.float32),
+    )
+
+
+def pair_average(features: np.ndarray, artist_1: np.ndarray, artist_2: np.ndarray) -> np.ndarray:
+    """Mean of both artists' features, or the one that is present when the other is missing."""
+    features_1, features_2 = features[artist_1], features[artist_2]
+    return np.where(
+        np.isnan(features_1),
+        features_2,
+        np.where(np.isnan(features_2), features_1, (features_1 + features_2) / 2),
+    )
+
+
+@dataclass
+class PairStore:
+    artists: pd.DataFrame
+    markets: list[str]
+    artist_1: np.ndarray
+    artist_2: np.ndarray
+    genre_similarity: np.ndarray
+    predicted_streams: np.ndarray
+    market_streams: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.artist_1)
+
+    def save(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.artists.to_csv(directory / "artists.csv", index=False)
+        (directory / "markets.json").write_text(json.dumps(self.markets), encoding="utf-8")
+        for name in ARRAY_NAMES:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        return directory
+
+    @classmethod
+    def open(cls, directory: Path, mmap_mode: str | None = "r") -> "PairStore":
+        """Load a saved store, memory-mapping the pair arrays unless ``mmap_mode`` is None."""
+        # Only missing audio features are read as NaN, never an artist name
+        artists = pd.read_csv(
+            directory / "artists.csv",
+            dtype={"artist_id": str, "name": str},
+            keep_default_na=False,
+            na_values={feature: [""] for feature in AUDIO_FEATURES},
+        )
+        return cls(
+            artists=artists,
+            markets=json.loads((directory / "markets.json").read_text(encoding="utf-8")),
+            **{name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAY_NAMES},
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Resolve artist ids and names and lay the pairs out as the stream predictions CSV."""
+        artist_ids = self.artists["artist_id"].to_numpy(dtype=object)
+        names = self.artists["name"].to_numpy(dtype=object)
+        features = self.artists[AUDIO_FEATURES].to_numpy(dtype=np.float64)
+        artist_1 = np.asarray(self.artist_1)
+        artist_2 = np.asarray(self.artist_2)
+
+        columns = {
+            "artist_1_id": artist_ids[artist_1],
+            "artist_2_id": artist_ids[artist_2],
+            "artist_1_name": names[artist_1],
+            "artist_2_name": names[artist_2],
+            "genre_similarity": np.asarray(self.genre_similarity, dtype=np.float64),
+        }
+        for suffix, artist in (("1", artist_1), ("2", artist_2)):
+            for i, feature in enumerate(AUDIO_FEATURES):
+                columns[f"{feature}_{suffix}"] = features[artist, i]
+        averages = pair_average(features, artist_1, artist_2)
+        for i, feature in enumerate(AUDIO_FEATURES):
+            columns[f"{feature}_avg"] = averages[:, i]
+
+        predicted_streams = np.asarray(self.predicted_streams, dtype=np.float64)
+        columns["predicted_streams"] = predicted_streams
+        columns["predicted_streams_overall"] = predicted_streams
+        market_streams = np.asarray(self.market_streams, dtype=np.float64)
+        for j, market in enumerate(self.markets):
+            columns[f"predicted_streams_{market}"] = market_streams[:, j]
+        return pd.DataFrame(columns)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a saved pair store as the stream predictions CSV.")
+    parser.add_argument("store", type=Path, help="Folder written by PairStore.save")
+    parser.add_argument("--output", type=Path, default=Path("artist_collaboration_stream_predictions.csv"))
+    args = parser.parse_args()
+
+    store = PairStore.open(args.store)
+    store.to_frame().to_csv(args.output, index=False)
+    print(f"Wrote {len(store):,} pairs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Differences between two prediction runs, and the artists whose pages they touch.
+
+Both outputs are hash-joined on their (artist_1, artist_2) pairs, by Spotify
+id when both have id columns and by name otherwise. Each pair is then
+
+* ``added`` or ``removed`` when it is in only one run
+* ``changed`` when any revenue column both runs share moved by more than
+  ``threshold``
+
+with ``delta_<column>`` holding new minus old revenue (a missing side counts
+as 0). A pair with its artists swapped is a different pair, since the pages
+show it as written.
+
+``affected_artists`` is every artist of such a pair. Per-artist views also
+depend on the order of an artist's pairs, so artists whose pairs appear in a
+different relative order are added too. So are artists of pairs listed more
+than once. Every other artist's map view is unchanged, and
+generate_static_choropleth.py rebuilds only the affected ones::
+
+    python prediction_diff.py old_predictions.csv artist_collaboration_predictions_by_market.csv \\
+        --threshold 1 --output prediction_delta.csv --artists affected_artists.json
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+REVENUE_PREFIX = "predicted_revenue_"
+NAME_KEY = ["artist_1_name", "artist_2_name"]
+ID_KEY = ["artist_1_id", "artist_2_id"]
+
+
+@dataclass
+class PredictionDiff:
+    # Key columns, artist names, ``change`` and one ``delta_<revenue column>`` per shared revenue column
+    delta: pd.DataFrame
+    affected_artists: set[str]
+
+    def count(self, change: str) -> int:
+        return int((self.delta["change"] == change).sum())
+
+    def summary(self) -> dict:
+        return {
+            "added": self.count("added"),
+            "removed": self.count("removed"),
+            "changed": self.count("changed"),
+            "affected_artists": len(self.affected_artists),
+        }
+
+
+def pair_key(old_df: pd.DataFrame, new_df: pd.DataFrame) -> list[str]:
+    if all(column in df.columns for df in (old_df, new_df) for column in ID_KEY):
+        return ID_KEY
+    return NAME_KEY
+
+
+def pair_names(df: pd.DataFrame) -> set[str]:
+    return set(df["artist_1_name"]).union(df["artist_2_name"])
+
+
+def shared_codes(old_df: pd.DataFrame, new_df: pd.DataFrame, columns: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Integer codes of both frames' two ``columns``, shared across the frames, as (rows, 2) arrays, plus the values."""
+    codes, values = pd.factorize(pd.concat([df[column] for df in (old_df, new_df) for column in columns], ignore_index=True))
+    codes = codes.astype(np.int64)
+    old_codes = codes[: 2 * len(old_df)].reshape(2, -1).T
+    new_codes = codes[2 * len(old_df):].reshape(2, -1).T
+    return old_codes, new_codes, np.asarray(values, dtype=object)
+
+
+def reordered(artists: np.ndarray, old_rows: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+    """Artist codes whose pairs (one entry per artist and pair) are not in the same relative order in both runs."""
+    order = np.lexsort((new_rows, artists))
+    artists, old_rows = artists[order], old_rows[order]
+    out_of_order = (artists[1:] == artists[:-1]) & (np.diff(old_rows) < 0)
+    return np.unique(artists[1:][out_of_order])
+
+
+def diff_predictions(old_df: pd.DataFrame, new_df: pd.DataFrame, threshold: float = 0.0) -> PredictionDiff:
+    """Added, removed and changed pairs from ``old_df`` to ``new_df``, and the artists they affect."""
+    key = pair_key(old_df, new_df)
+    revenue_cols = [column for column in new_df.columns if column.startswith(REVENUE_PREFIX) and column in old_df.columns]
+
+    # Both pair keys as one int64 per row, so the join hashes integers, not strings
+    old_codes, new_codes, key_values = shared_codes(old_df, new_df, key)
+    old_keys = old_codes[:, 0] * len(key_values) + old_codes[:, 1]
+    new_keys = new_codes[:, 0] * len(key_values) + new_codes[:, 1]
+
+    # Pairs listed more than once can't be matched one to one; their artists are rebuilt
+    old_duplicated = pd.Series(old_keys).duplicated(keep=False).to_numpy()
+    new_duplicated = pd.Series(new_keys).duplicated(keep=False).to_numpy()
+    affected = pair_names(old_df[old_duplicated]) | pair_names(new_df[new_duplicated])
+    old_rows = np.flatnonzero(~pd.Series(old_keys).duplicated().to_numpy())
+    new_rows = np.flatnonzero(~pd.Series(new_keys).duplicated().to_numpy())
+
+    # Hash join: each new pair's row among the old pairs, -1 when it is new
+    match = pd.Index(old_keys[old_rows]).get_indexer(new_keys[new_rows])
+    matched = match >= 0
+    added_rows = new_rows[~matched]
+    matched_new, matched_old = new_rows[matched], old_rows[match[matched]]
+    kept = np.zeros(len(old_rows), dtype=bool)
+    kept[match[matched]] = True
+    removed_rows = old_rows[~kept]
+
+    # Missing revenue counts as 0
+    old_revenue = np.nan_to_num(old_df[revenue_cols].to_numpy(dtype=np.float64))
+    new_revenue = np.nan_to_num(new_df[revenue_cols].to_numpy(dtype=np.float64))
+    matched_delta = new_revenue[matched_new] - old_revenue[matched_old]
+    changed = (np.abs(matched_delta) > threshold).any(axis=1)
+
+    columns = key + [column for column in NAME_KEY if column not in key]
+    delta_cols = [f"delta_{column}" for column in revenue_cols]
+    parts = [
+        ("added", new_df, added_rows, new_revenue[added_rows]),
+        ("removed", old_df, removed_rows, -old_revenue[removed_rows]),
+        ("changed", new_df, matched_new[changed], matched_delta[changed]),
+    ]
+    delta = pd.concat(
+        [
+            pd.concat([df[columns].iloc[rows].reset_index(drop=True), pd.DataFrame(values, columns=delta_cols)], axis=1)
+            .assign(change=label)
+            for label, df, rows, values in parts
+        ],
+        ignore_index=True,
+    )[columns + ["change"] + delta_cols]
+    affected |= pair_names(delta)
+
+    if key == NAME_KEY:
+        old_names, new_names, names = old_codes, new_codes, key_values
+    else:
+        old_names, new_names, names = shared_codes(old_df, new_df, NAME_KEY)
+        # A renamed artist is shown under its new name and no longer under the old one
+        renamed = old_names[matched_old] != new_names[matched_new]
+        affected |= set(names[old_names[matched_old][renamed]]) | set(names[new_names[matched_new][renamed]])
+
+    # Views list an artist's pairs in row order
+    artists = np.concatenate([new_names[matched_new, 0], new_names[matched_new, 1]])
+    affected |= set(names[reordered(artists, np.tile(matched_old, 2), np.tile(matched_new, 2))])
+    return PredictionDiff(delta, affected)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Diff two prediction outputs pair by pair.")
+    parser.add_argument("old", type=Path, help="Predictions CSV of the earlier run")
+    parser.add_argument("new", type=Path, help="Predictions CSV of the later run")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Ignore pairs whose revenue moved by at most this much in every column")
+    parser.add_argument("--output", type=Path, help="Write the added, removed and changed pairs to this CSV")
+    parser.add_argument("--artists", type=Path, help="Write the affected artists to this JSON file")
+    parser.add_argument("--top", type=int, default=10, help="Largest overall changes to print")
+    args = parser.parse_args()
+
+    diff = diff_predictions(pd.read_csv(args.old), pd.read_csv(args.new), args.threshold)
+    summary = diff.summary()
+    print(
+        f"{summary['added']:,} added, {summary['removed']:,} removed, {summary['changed']:,} changed pairs; "
+        f"{summary['affected_artists']:,} affected artists"
+    )
+    overall = f"delta_{REVENUE_PREFIX}overall"
+    if overall in diff.delta.columns and len(diff.delta):
+        largest = diff.delta.reindex(diff.delta[overall].abs().sort_values(ascending=False, kind="stable").index)
+        for row in largest.head(args.top).to_dict("records"):
+            print(f"  {row['change']:<8} {row['artist_1_name']} & {row['artist_2_name']}: {row[overall]:+,.2f}")
+
+    if args.output:
+        diff.delta.to_csv(args.output, index=False)
+        print(f"Delta written to {args.output}")
+    if args.artists:
+        args.artists.write_text(json.dumps({**summary, "artists": sorted(diff.affected_artists)}, ensure_ascii=False, indent=2))
+        print(f"Affected artists written to {args.artists}")
+
+
+if __name__ == "__main__":
+    main()
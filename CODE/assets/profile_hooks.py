@@ -0,0 +1,249 @@
+"""Opt-in profiling for the scripts and the Dash callback, switched on from the environment.
+
+Nothing is imported, wrapped or sampled unless ``COLLAB_PROFILE`` is set, so
+the hooks cost nothing in normal runs. Set it to a comma-separated list of
+modes (or ``all``)::
+
+    COLLAB_PROFILE=cprofile,stacks python graph_network_artist_collaboration.py
+    COLLAB_PROFILE=callbacks COLLAB_PROFILE_SAMPLE=0.05 gunicorn --preload ... "choropleth_map_artist_collaboration:create_server()"
+
+Modes:
+
+* ``cprofile``: cProfile for the whole script, or for the sampled callback
+  calls; writes ``<name>-<pid>.prof`` and a pstats summary ``.pstats.txt``
+* ``stacks``: samples every thread's stack every ``COLLAB_PROFILE_INTERVAL``
+  seconds; writes ``.collapsed`` in the folded format flamegraph.pl and
+  speedscope read
+* ``tracemalloc``: writes the top allocation sites to ``.tracemalloc.txt``
+* ``callbacks``: times a ``COLLAB_PROFILE_SAMPLE`` share of calls to each
+  wrapped callback; writes count, mean and percentiles to ``.callbacks.json``
+
+Reports go to ``COLLAB_PROFILE_DIR`` (default ``profiles``) when the process
+exits.
+"""
+import os
+
+
+MODES = ("cprofile", "stacks", "tracemalloc", "callbacks")
+ENV_MODES = "COLLAB_PROFILE"
+ENV_DIR = "COLLAB_PROFILE_DIR"
+ENV_SAMPLE = "COLLAB_PROFILE_SAMPLE"
+ENV_INTERVAL = "COLLAB_PROFILE_INTERVAL"
+# Rows kept in the pstats and tracemalloc summaries
+TOP_N = 40
+
+
+def enabled_modes() -> frozenset[str]:
+    value = os.environ.get(ENV_MODES, "").strip().lower()
+    if not value:
+        return frozenset()
+    modes = set(MODES) if value == "all" else {mode.strip() for mode in value.split(",") if mode.strip()}
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown {ENV_MODES} modes: {', '.join(sorted(unknown))} (expected {', '.join(MODES)} or all)")
+    return frozenset(modes)
+
+
+class Session:
+    """The profilers of one process, reported once at exit."""
+
+    def __init__(self, name: str, modes: frozenset[str], whole_run: bool) -> None:
+        import atexit
+        import threading
+        from pathlib import Path
+
+        self.name = name
+        self.modes = modes
+        self.whole_run = whole_run
+        self.output_dir = Path(os.environ.get(ENV_DIR, "profiles"))
+        self.sample_rate = float(os.environ.get(ENV_SAMPLE, "0.1"))
+        self.interval = float(os.environ.get(ENV_INTERVAL, "0.005"))
+        self.profiler = None
+        self.profiler_lock = threading.Lock()
+        self.callback_lock = threading.Lock()
+        self.callback_timings: dict[str, list[float]] = {}
+        self.callback_calls: dict[str, int] = {}
+        self.stack_counts: dict[str, int] = {}
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+        self._reported = False
+
+        if "cprofile" in modes:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        if "tracemalloc" in modes:
+            import tracemalloc
+
+            tracemalloc.start(25)
+        if "stacks" in modes:
+            self.start_sampler()
+            # Threads do not survive a fork, so each pre-forked worker samples itself
+            os.register_at_fork(after_in_child=self.start_sampler)
+        if self.profiler is not None and whole_run:
+            self.profiler.enable()
+        atexit.register(self.report)
+
+    def start_sampler(self) -> None:
+        import threading
+
+        self.stack_counts = {}
+        self._stop_sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_stacks, name="collab-profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample_stacks(self) -> None:
+        import sys
+
+        own_id = self._sampler.ident
+        while not self._stop_sampling.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stack_counts[key] = self.stack_counts.get(key, 0) + 1
+
+    def path(self, suffix: str):
+        return self.output_dir / f"{self.name}-{os.getpid()}{suffix}"
+
+    def report(self) -> None:
+        if self._reported:
+            return
+        self._reported = True
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+
+        # Stop the sampler first so the reporting itself is not in the stacks
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+            lines = [f"{stack} {count}" for stack, count in sorted(self.stack_counts.items())]
+            self.path(".collapsed").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            written.append(self.path(".collapsed"))
+
+        if "tracemalloc" in self.modes:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"Current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB", ""]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:TOP_N]]
+            self.path(".tracemalloc.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            written.append(self.path(".tracemalloc.txt"))
+
+        if self.profiler is not None:
+            import io
+            import pstats
+
+            with self.profiler_lock:
+                self.profiler.disable()
+            self.profiler.dump_stats(self.path(".prof"))
+            summary = io.StringIO()
+            pstats.Stats(self.profiler, stream=summary).sort_stats("cumulative").print_stats(TOP_N)
+            self.path(".pstats.txt").write_text(summary.getvalue(), encoding="utf-8")
+            written += [self.path(".prof"), self.path(".pstats.txt")]
+
+        if self.callback_timings:
+            import json
+
+            with self.callback_lock:
+                summaries = {
+                    name: callback_summary(self.callback_calls[name], timings)
+                    for name, timings in self.callback_timings.items()
+                }
+            self.path(".callbacks.json").write_text(json.dumps(summaries, indent=2), encoding="utf-8")
+            written.append(self.path(".callbacks.json"))
+
+        for path in written:
+            print(f"Profile written to {path}")
+
+
+def callback_summary(calls: int, timings: list[float]) -> dict:
+    ordered = sorted(timings)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+    return {
+        "calls": calls,
+        "sampled": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] if ordered else 0.0,
+    }
+
+
+_session = None
+
+
+def install(name: str, whole_run: bool = True) -> Session | None:
+    """Start the profilers requested by ``COLLAB_PROFILE`` for this process.
+
+    Call it once at the start of a script's main. A server passes
+    ``whole_run=False`` so cProfile only runs inside sampled callbacks.
+    Returns None (and does nothing) when the variable is unset.
+    """
+    global _session
+    modes = enabled_modes()
+    if not modes:
+        return None
+    if _session is None:
+        _session = Session(name, modes, whole_run)
+    return _session
+
+
+def profile_callback(name: str):
+    """Decorator timing a sample of calls to a callback.
+
+    Returns the function unchanged unless ``install`` started a session with
+    ``callbacks`` or ``cprofile``. With ``cprofile`` in a server session,
+    sampled calls also run under the shared profiler (one at a time;
+    overlapping calls are only timed).
+    """
+    session = _session
+    if session is None or not session.modes & {"callbacks", "cprofile"}:
+        return lambda func: func
+
+    import functools
+    import random
+    import time
+
+    def decorate(func):
+        timings = session.callback_timings.setdefault(name, [])
+        session.callback_calls.setdefault(name, 0)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with session.callback_lock:
+                session.callback_calls[name] += 1
+            if random.random() >= session.sample_rate:
+                return func(*args, **kwargs)
+
+            profiler = None if session.whole_run else session.profiler
+            profiling = profiler is not None and session.profiler_lock.acquire(blocking=False)
+            started = time.perf_counter()
+            try:
+                if profiling:
+                    return profiler.runcall(func, *args, **kwargs)
+                return func(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if profiling:
+                    session.profiler_lock.release()
+                with session.callback_lock:
+                    timings.append(elapsed_ms)
+
+        return wrapper
+
+    return decorate
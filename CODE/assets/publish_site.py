@@ -0,0 +1,208 @@
+"""Publish the static site with fingerprinted, precompressed assets.
+
+The pages (``index.html`` and the two pages under ``CODE/``) are copied to the
+publish folder with every local asset they reference renamed after its
+content hash, e.g. ``lib/tom-select/tom-select.css`` becomes
+``lib/tom-select/tom-select.3f9a1c0e5b7d2a64.css``. References are rewritten
+in the HTML (and in CSS, whose own references are fingerprinted first). An
+unchanged asset keeps its name from build to build, so a host can serve it
+with a year-long immutable cache while the pages themselves are revalidated.
+
+Text files are also written as ``.gz`` and, when the ``brotli`` module is
+installed, ``.br``, whenever that saves space. ``asset-manifest.json`` maps
+every source path to its published file and sizes, and ``_headers`` holds the
+matching Cache-Control rules for hosts that read it (Netlify, Cloudflare
+Pages). Run from this folder::
+
+    python publish_site.py --output ../../dist
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import posixpath
+import re
+from pathlib import Path
+
+ASSETS_DIR = Path(__file__).resolve().parent
+SITE_DIR = ASSETS_DIR.parent.parent
+PAGES = ("index.html", "CODE/artist_collaborations.html", "CODE/artist_collaboration_map.html")
+DEFAULT_OUTPUT_DIR = SITE_DIR / "dist"
+MANIFEST_NAME = "asset-manifest.json"
+
+HASH_LENGTH = 16
+ASSET_EXTENSIONS = ("css", "js", "json", "png", "jpg", "jpeg", "gif", "svg", "ico", "woff", "woff2")
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt"}
+# Quoted references (src, href, url('...') and strings in scripts) and unquoted url(...)
+REFERENCE = re.compile(
+    r"""(?P<quote>["'])(?P<quoted>[^"'\s<>()]+\.(?:%s))(?P=quote)|url\((?P<bare>[^"')\s]+)\)""" % "|".join(ASSET_EXTENSIONS)
+)
+HASHED_NAME = re.compile(r"(^|\.)[0-9a-f]{%d}$" % HASH_LENGTH)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def brotli_module():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compressed_variants(data: bytes, suffix: str) -> dict[str, bytes]:
+    """``.gz`` (and ``.br`` with brotli installed) versions of a text file that are smaller than it."""
+    if suffix not in COMPRESSIBLE:
+        return {}
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = brotli_module()
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {extension: body for extension, body in variants.items() if len(body) < len(data)}
+
+
+class SitePublisher:
+    """Fingerprints the assets the pages reference, following references in CSS."""
+
+    def __init__(self, site_dir: Path = SITE_DIR) -> None:
+        self.site_dir = site_dir.resolve()
+        # Published path and bytes per file, both relative to the site root
+        self.files: dict[str, bytes] = {}
+        self.assets: dict[str, str] = {}
+        self.pages: list[str] = []
+        self.variants: dict[str, dict[str, bytes]] = {}
+
+    def local_path(self, reference: str, referrer: Path) -> Path | None:
+        """The site file a reference points to, or None for remote, absolute or missing targets."""
+        if re.match(r"^([a-z]+:|//|/|#)", reference):
+            return None
+        target = (referrer.parent / reference.split("#")[0].split("?")[0]).resolve()
+        if not target.is_file() or self.site_dir not in target.parents:
+            return None
+        return target
+
+    def rewrite(self, text: str, referrer: Path) -> str:
+        def replace(match: re.Match) -> str:
+            reference = match.group("quoted") or match.group("bare")
+            target = self.local_path(reference, referrer)
+            if target is None:
+                return match.group(0)
+            published = self.publish_asset(target)
+            referrer_dir = referrer.parent.relative_to(self.site_dir).as_posix()
+            return match.group(0).replace(reference, posixpath.relpath(published, referrer_dir))
+
+        return REFERENCE.sub(replace, text)
+
+    def publish_asset(self, path: Path) -> str:
+        source = path.relative_to(self.site_dir).as_posix()
+        if source in self.assets:
+            return self.assets[source]
+        data = path.read_bytes()
+        if path.suffix == ".css":
+            data = self.rewrite(data.decode("utf-8"), path).encode("utf-8")
+        if HASHED_NAME.search(path.stem):
+            # Already named after its content (e.g. the map's data shards)
+            published = source
+        else:
+            published = path.with_name(f"{path.stem}.{content_hash(data)}{path.suffix}").relative_to(self.site_dir).as_posix()
+        self.assets[source] = published
+        self.files[published] = data
+        return published
+
+    def publish_page(self, page: str) -> None:
+        path = self.site_dir / page
+        self.files[page] = self.rewrite(path.read_text(encoding="utf-8"), path).encode("utf-8")
+        self.pages.append(page)
+
+    def compressed(self, published: str) -> dict[str, bytes]:
+        if published not in self.variants:
+            self.variants[published] = compressed_variants(self.files[published], Path(published).suffix)
+        return self.variants[published]
+
+    def manifest(self) -> dict:
+        def entry(published: str) -> dict:
+            sizes = {"file": published, "bytes": len(self.files[published])}
+            for extension, body in self.compressed(published).items():
+                sizes[extension.lstrip(".")] = len(body)
+            return sizes
+
+        return {
+            "pages": {page: entry(page) for page in self.pages},
+            "assets": {source: entry(published) for source, published in sorted(self.assets.items())},
+        }
+
+
+def headers_file(manifest: dict) -> str:
+    lines = []
+    for page in manifest["pages"]:
+        lines += [f"/{page}", f"  Cache-Control: {REVALIDATE}"]
+    for asset in manifest["assets"].values():
+        lines += [f"/{asset['file']}", f"  Cache-Control: {IMMUTABLE}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_if_changed(path: Path, data: bytes) -> None:
+    if path.exists() and path.read_bytes() == data:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def publish_site(output_dir: Path = DEFAULT_OUTPUT_DIR, site_dir: Path = SITE_DIR, pages: tuple[str, ...] = PAGES) -> dict:
+    """Write the pages and their fingerprinted assets to ``output_dir`` and return the manifest.
+
+    Files are only rewritten when their bytes change, and files left over
+    from earlier builds are removed. A non-empty folder is only published to
+    if it holds a manifest from an earlier build.
+    """
+    if output_dir.is_dir() and any(output_dir.iterdir()) and not (output_dir / MANIFEST_NAME).exists():
+        raise ValueError(f"{output_dir} is not empty and has no {MANIFEST_NAME}; refusing to publish over it")
+    publisher = SitePublisher(site_dir)
+    for page in pages:
+        publisher.publish_page(page)
+    manifest = publisher.manifest()
+
+    written = {}
+    for published, data in publisher.files.items():
+        written[published] = data
+        for extension, body in publisher.compressed(published).items():
+            written[published + extension] = body
+    written[MANIFEST_NAME] = (json.dumps(manifest, indent=2) + "\n").encode("utf-8")
+    written["_headers"] = headers_file(manifest).encode("utf-8")
+
+    for published, data in written.items():
+        write_if_changed(output_dir / published, data)
+    for stale in [path for path in output_dir.rglob("*") if path.is_file()]:
+        if stale.relative_to(output_dir).as_posix() not in written:
+            stale.unlink()
+    return manifest
+
+
+def print_manifest(manifest: dict) -> None:
+    entries = list(manifest["pages"].values()) + list(manifest["assets"].values())
+    for entry in entries:
+        compressed = "  ".join(f"{kind} {entry[kind]:>9,}" for kind in ("gz", "br") if kind in entry)
+        print(f"  {entry['file']:<72} {entry['bytes']:>10,}  {compressed}")
+    total = sum(entry["bytes"] for entry in entries)
+    served = sum(min(entry["bytes"], entry.get("gz", entry["bytes"]), entry.get("br", entry["bytes"])) for entry in entries)
+    print(f"{len(manifest['pages'])} pages, {len(manifest['assets'])} assets: {total:,} bytes, {served:,} bytes served compressed")
+    if brotli_module() is None:
+        print("brotli is not installed; only .gz files were written")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish the static site with fingerprinted, precompressed assets.")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_DIR, help="Publish folder (default: dist/ in the repo root)")
+    args = parser.parse_args()
+
+    print_manifest(publish_site(args.output))
+    print(f"Published to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
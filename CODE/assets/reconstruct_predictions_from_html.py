@@ -1,19 +1,129 @@
 import json
-import re
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
 import pandas as pd
 
+from profile_hooks import install as install_profiling
+from revenue_rates import load_rate_table, streams_from_revenue
+
 
 MARKET_CODES = ["au", "br", "ca", "de", "fr", "gb", "jp", "us"]
 
+DATASET_MARKER = "new vis.DataSet("
+CHUNK_SIZE = 1 << 16
+# Characters kept ahead of a marker so the assigned variable name can be read
+NAME_LOOKBACK = 64
+JSON_WHITESPACE = " \t\r\n"
+
+_decoder = json.JSONDecoder()
+
+
+def iter_file_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    with path.open(encoding="utf-8") as handle:
+        yield from iter(lambda: handle.read(chunk_size), "")
+
+
+def declared_name(prefix: str) -> str:
+    """Return the variable in a ``<name> = new vis.DataSet(`` assignment, or ``""``."""
+    before = prefix.rstrip()
+    if not before.endswith("="):
+        return ""
+    before = before[:-1].rstrip()
+    start = len(before)
+    while start > 0 and (before[start - 1].isalnum() or before[start - 1] in "_$"):
+        start -= 1
+    return before[start:]
+
+
+def iter_dataset_records(chunks: Iterable[str], dataset_names: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """Yield ``(dataset_name, record)`` for each item of the named vis DataSets.
+
+    The text is consumed chunk by chunk, so the page never has to be held in
+    memory at once. Each array element is parsed by the JSON decoder, which
+    keeps track of brackets and string literals, so a ``]);`` inside a tooltip
+    cannot end a dataset early.
+    """
+    wanted = list(dict.fromkeys(dataset_names))
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    exhausted = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, exhausted
+        chunk = next(chunks, "")
+        if not chunk:
+            exhausted = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def next_token(context: str) -> str:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                raise ValueError(f"Unexpected end of HTML inside {context} dataset")
+
+    while wanted:
+        # Find the next DataSet constructor, keeping enough text behind the
+        # buffer tail to match a marker split across chunks
+        marker_at = buffer.find(DATASET_MARKER, position)
+        if marker_at < 0:
+            position = max(position, len(buffer) - len(DATASET_MARKER) - NAME_LOOKBACK)
+            if not fill():
+                break
+            continue
+
+        name = declared_name(buffer[max(0, marker_at - NAME_LOOKBACK):marker_at])
+        position = marker_at + len(DATASET_MARKER)
+        if name not in wanted:
+            continue
+
+        if next_token(name) != "[":
+            raise ValueError(f"Expected an array literal for {name} dataset")
+        position += 1
+        if next_token(name) == "]":
+            position += 1
+            wanted.remove(name)
+            continue
+
+        while True:
+            next_token(name)
+            try:
+                record, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                record, end = None, len(buffer)
+            # An element that runs up to the end of the buffer may be cut off
+            if end >= len(buffer) and not exhausted:
+                if not fill():
+                    raise ValueError(f"Unexpected end of HTML inside {name} dataset")
+                continue
+            if record is None:
+                raise ValueError(f"Malformed record in {name} dataset")
+
+            position = end
+            yield name, record
+
+            separator = next_token(name)
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError(f"Unexpected {separator!r} in {name} dataset")
+        wanted.remove(name)
+
+    if wanted:
+        raise ValueError(f"Could not find {wanted[0]} dataset in HTML")
+
 
 def extract_dataset_block(html_text: str, dataset_name: str) -> list[dict]:
-    pattern = rf"{dataset_name}\s*=\s*new vis\.DataSet\((\[.*?\])\);"
-    match = re.search(pattern, html_text, re.DOTALL)
-    if not match:
-        raise ValueError(f"Could not find {dataset_name} dataset in HTML")
-    return json.loads(match.group(1))
+    return [record for _, record in iter_dataset_records([html_text], [dataset_name])]
 
 
 def choose_edge_markets(node_lookup: dict[str, dict], artist_1: str, artist_2: str) -> list[str]:
@@ -45,53 +155,72 @@ def allocate_market_revenue(total_revenue: float, markets: list[str]) -> dict[st
     return allocations
 
 
-def main() -> None:
-    assets_dir = Path(__file__).resolve().parent
-    code_dir = assets_dir.parent
-    html_path = code_dir / "artist_collaborations.html"
-    output_path = assets_dir / "artist_collaboration_predictions_by_market.csv"
+ASSETS_DIR = Path(__file__).resolve().parent
+DEFAULT_HTML_PATH = ASSETS_DIR.parent / "artist_collaborations.html"
+DEFAULT_OUTPUT_PATH = ASSETS_DIR / "artist_collaboration_stream_predictions.csv"
 
-    html_text = html_path.read_text(encoding="utf-8")
-    nodes = extract_dataset_block(html_text, "nodes")
-    edges = extract_dataset_block(html_text, "edges")
 
-    node_lookup = {node["id"]: node for node in nodes}
-    reconstructed_rows = []
+def reconstruct_predictions(html_path: Path = DEFAULT_HTML_PATH, rates: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Rebuild the stream predictions from the nodes and edges saved in the graph page.
 
-    for edge in edges:
-        artist_1 = edge["from"]
-        artist_2 = edge["to"]
-        predicted_streams = float(edge.get("value", 0.0))
-        predicted_revenue_overall = float(edge.get("edge_revenue", 0.0))
+    Edge revenue is split over the pair's markets and turned back into streams
+    with the payout rate table; revenue itself is derived again by revenue_rates.
+    """
+    if rates is None:
+        rates = load_rate_table()
 
-        markets = choose_edge_markets(node_lookup, artist_1, artist_2)
-        row = {
-            "artist_1_name": artist_1,
-            "artist_2_name": artist_2,
+    node_lookup = {}
+    reconstructed_rows = []
+    edge_revenues = []
+
+    # Edge rows are filled in as they stream past; market allocations wait
+    # for the node markets, which are complete once the scan has finished
+    for dataset_name, record in iter_dataset_records(iter_file_chunks(html_path), ["nodes", "edges"]):
+        if dataset_name == "nodes":
+            node_lookup[record["id"]] = record
+            continue
+
+        predicted_streams = float(record.get("value", 0.0))
+        reconstructed_rows.append({
+            "artist_1_name": record["from"],
+            "artist_2_name": record["to"],
             "predicted_streams": predicted_streams,
             "predicted_streams_overall": predicted_streams,
-            "predicted_revenue_overall": predicted_revenue_overall,
-        }
-
-        revenue_allocations = allocate_market_revenue(predicted_revenue_overall, markets)
-        stream_allocations = {
-            key.replace("predicted_revenue_", "predicted_streams_"): value / 0.004
-            for key, value in revenue_allocations.items()
-        }
+        })
+        edge_revenues.append(float(record.get("edge_revenue", 0.0)))
 
-        row.update(revenue_allocations)
-        row.update(stream_allocations)
-        reconstructed_rows.append(row)
+    revenue_allocations = [
+        allocate_market_revenue(
+            revenue,
+            choose_edge_markets(node_lookup, row["artist_1_name"], row["artist_2_name"]),
+        )
+        for row, revenue in zip(reconstructed_rows, edge_revenues)
+    ]
 
     df = pd.DataFrame(reconstructed_rows)
-    df = df.sort_values("predicted_streams", ascending=False).reset_index(drop=True)
+    df = df.join(streams_from_revenue(pd.DataFrame(revenue_allocations), rates))
+    return df.sort_values("predicted_streams", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def write_predictions(
+    html_path: Path = DEFAULT_HTML_PATH,
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+) -> pd.DataFrame:
+    df = reconstruct_predictions(html_path)
     df.to_csv(output_path, index=False)
+    return df
+
+
+def main() -> None:
+    install_profiling("reconstruct_predictions_from_html")
+    output_path = DEFAULT_OUTPUT_PATH
+    df = write_predictions(output_path=output_path)
 
     total_edges = len(df)
-    total_revenue = df["predicted_revenue_overall"].sum()
+    total_streams = df["predicted_streams_overall"].sum()
     print(f"Reconstructed {total_edges} collaboration rows")
     print(f"Wrote {output_path}")
-    print(f"Total overall revenue: ${total_revenue:,.2f}")
+    print(f"Total predicted streams: {total_streams:,.0f}")
 
 
 if __name__ == "__main__":
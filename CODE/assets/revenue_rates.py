@@ -0,0 +1,133 @@
+"""Per-market payout rates and the revenue columns derived from them.
+
+Stream predictions are the source of truth. The rate table turns them into
+revenue, so a new payout rate needs this step and the pages that read the
+predictions, not a model run::
+
+    python revenue_rates.py
+    python revenue_rates.py --as-of 2024-01-01
+
+``revenue_rates.csv`` has one row per rate::
+
+    market,effective_from,rate
+    *,,0.004
+    jp,2024-07-01,0.0035
+
+``*`` matches every market without its own row. This is an as-of lookup:
+for each market, the row with the latest ``effective_from`` on or before the
+as-of date applies, and that one rate prices all of the market's predicted
+streams. The predictions carry no dates, so rates are not split over the
+periods they cover. An empty ``effective_from`` is always in effect. The
+default as-of date is the latest ``effective_from`` in the table, so the same
+table always gives the same revenue.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+DEFAULT_RATES_PATH = ASSETS_DIR / "revenue_rates.csv"
+DEFAULT_STREAMS_PATH = ASSETS_DIR / "artist_collaboration_stream_predictions.csv"
+DEFAULT_OUTPUT_PATH = ASSETS_DIR / "artist_collaboration_predictions_by_market.csv"
+
+ANY_MARKET = "*"
+STREAM_PREFIX = "predicted_streams_"
+REVENUE_PREFIX = "predicted_revenue_"
+
+
+def load_rate_table(rates_path: Path = DEFAULT_RATES_PATH) -> pd.DataFrame:
+    rates = pd.read_csv(rates_path, dtype={"market": str}, keep_default_na=False)
+    missing = {"market", "effective_from", "rate"} - set(rates.columns)
+    if missing:
+        raise ValueError(f"Rate table {rates_path} is missing columns: {', '.join(sorted(missing))}")
+    rates["effective_from"] = pd.to_datetime(rates["effective_from"].replace("", None))
+    rates["rate"] = rates["rate"].astype(float)
+    return rates
+
+
+def rates_as_of(rates: pd.DataFrame, markets: list[str], as_of: str | None = None) -> np.ndarray:
+    """Return the rate in effect on ``as_of`` for each market, in ``markets`` order."""
+    as_of_date = pd.Timestamp(as_of) if as_of else rates["effective_from"].max()
+    in_effect = rates[rates["effective_from"].isna() | (rates["effective_from"] <= as_of_date)]
+    # Undated rows sort first, so the last row per market is the latest rate
+    latest = in_effect.sort_values("effective_from", na_position="first", kind="stable").groupby("market")["rate"].last()
+
+    values = []
+    for market in markets:
+        if market in latest.index:
+            values.append(latest[market])
+        elif ANY_MARKET in latest.index:
+            values.append(latest[ANY_MARKET])
+        else:
+            raise ValueError(f"No rate in effect for market {market!r}")
+    return np.array(values, dtype=np.float64)
+
+
+def stream_markets(df: pd.DataFrame) -> list[str]:
+    return [
+        col[len(STREAM_PREFIX):]
+        for col in df.columns
+        if col.startswith(STREAM_PREFIX) and col != f"{STREAM_PREFIX}overall"
+    ]
+
+
+def apply_rates(streams_df: pd.DataFrame, rates: pd.DataFrame, as_of: str | None = None) -> pd.DataFrame:
+    """Derive every revenue column from the per-market stream predictions.
+
+    Market revenue is streams times that market's rate, computed for all
+    pairs in one matrix product. Overall revenue is the sum over markets.
+    Revenue columns go right after ``predicted_streams_overall``, overall first.
+    """
+    markets = stream_markets(streams_df)
+    streams = streams_df[[f"{STREAM_PREFIX}{market}" for market in markets]].to_numpy(dtype=np.float64)
+    revenue = streams * rates_as_of(rates, markets, as_of)
+
+    revenue_df = pd.DataFrame(revenue, columns=[f"{REVENUE_PREFIX}{market}" for market in markets], index=streams_df.index)
+    revenue_df.insert(0, f"{REVENUE_PREFIX}overall", revenue.sum(axis=1))
+
+    base_df = streams_df.drop(columns=[col for col in streams_df.columns if col.startswith(REVENUE_PREFIX)])
+    position = base_df.columns.get_loc(f"{STREAM_PREFIX}overall") + 1
+    return pd.concat([base_df.iloc[:, :position], revenue_df, base_df.iloc[:, position:]], axis=1)
+
+
+def streams_from_revenue(revenue_df: pd.DataFrame, rates: pd.DataFrame, as_of: str | None = None) -> pd.DataFrame:
+    """Invert ``apply_rates`` for market revenue recovered from a rendered page."""
+    markets = [
+        col[len(REVENUE_PREFIX):]
+        for col in revenue_df.columns
+        if col.startswith(REVENUE_PREFIX) and col != f"{REVENUE_PREFIX}overall"
+    ]
+    revenue = revenue_df[[f"{REVENUE_PREFIX}{market}" for market in markets]].to_numpy(dtype=np.float64)
+    streams = revenue / rates_as_of(rates, markets, as_of)
+    return pd.DataFrame(streams, columns=[f"{STREAM_PREFIX}{market}" for market in markets], index=revenue_df.index)
+
+
+def write_revenue_predictions(
+    streams_path: Path = DEFAULT_STREAMS_PATH,
+    rates_path: Path = DEFAULT_RATES_PATH,
+    output_path: Path = DEFAULT_OUTPUT_PATH,
+    as_of: str | None = None,
+) -> pd.DataFrame:
+    df = apply_rates(pd.read_csv(streams_path), load_rate_table(rates_path), as_of)
+    df.to_csv(output_path, index=False)
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute predicted revenue from stream predictions and payout rates.")
+    parser.add_argument("--streams", type=Path, default=DEFAULT_STREAMS_PATH)
+    parser.add_argument("--rates", type=Path, default=DEFAULT_RATES_PATH)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_PATH)
+    parser.add_argument("--as-of", help="Apply the rates in effect on this date (default: the latest in the table)")
+    args = parser.parse_args()
+
+    df = write_revenue_predictions(args.streams, args.rates, args.output, args.as_of)
+    print(f"Wrote {len(df)} rows to {args.output}")
+    print(f"Total overall revenue: ${df['predicted_revenue_overall'].sum():,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Asyncio service scoring "what if X and Y collaborated" with the saved stream model.
+
+generate_collab_predictions.py saves the model bundle (see stream_model.py).
+Run from this folder, then ask for any pair, by Spotify id or name::
+
+    python scoring_service.py --model data/stream_model.joblib --port 8070
+    curl "http://127.0.0.1:8070/score?artist_1=Farruko&artist_2=Rauw%20Alejandro"
+
+Requests that arrive together are scored together. The first waiting request
+opens a batch, which is scored once it holds ``--max-batch-size`` pairs or
+``--max-wait-ms`` after it opened, with one ``predict`` and one market
+allocation for the whole batch. Scoring runs in a worker thread, so the next
+batch fills up meanwhile. ``--max-batch-size 1`` scores one pair at a time.
+
+``/healthz`` reports how many batches and pairs have been scored.
+"""
+import argparse
+import asyncio
+import json
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from revenue_rates import DEFAULT_RATES_PATH, load_rate_table, rates_as_of
+from stream_model import DEFAULT_MODEL_PATH, StreamModel, UnknownArtist
+
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def encode_json(payload: object) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class MicroBatcher:
+    """Coalesces concurrent ``submit`` calls into batches for ``score_batch``.
+
+    ``score_batch`` takes a list of items and returns one result per item. It
+    runs in the default executor, one batch at a time.
+    """
+
+    def __init__(self, score_batch, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS) -> None:
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(None, self.score_batch, [item for item, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+
+
+class ScoringService:
+    """Validates pair requests and scores them in micro-batches."""
+
+    def __init__(
+        self,
+        model: StreamModel,
+        rates: np.ndarray,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+    ) -> None:
+        self.model = model
+        self.rates = rates
+        self.batcher = MicroBatcher(self.score_pairs, max_batch_size, max_wait_ms)
+
+    @classmethod
+    def load(
+        cls,
+        model_path: Path = DEFAULT_MODEL_PATH,
+        rates_path: Path = DEFAULT_RATES_PATH,
+        as_of: str | None = None,
+        **batching,
+    ) -> "ScoringService":
+        model = StreamModel.load(model_path)
+        return cls(model, rates_as_of(load_rate_table(rates_path), model.markets, as_of), **batching)
+
+    def score_pairs(self, pairs: list[tuple[int, int]]) -> list[dict]:
+        """Score a batch of artist-row pairs with one predict call."""
+        artist_1 = np.array([pair[0] for pair in pairs], dtype=np.int32)
+        artist_2 = np.array([pair[1] for pair in pairs], dtype=np.int32)
+        predicted_streams, market_streams = self.model.score(artist_1, artist_2)
+        market_revenue = market_streams * self.rates
+        return [
+            {
+                "artist_1": self.artist_json(artist_1[i]),
+                "artist_2": self.artist_json(artist_2[i]),
+                "predicted_streams": round(float(predicted_streams[i]), 1),
+                "predicted_revenue": round(float(market_revenue[i].sum()), 2),
+                "markets": {
+                    market: {"streams": round(streams, 1), "revenue": round(revenue, 2)}
+                    for market, streams, revenue in zip(
+                        self.model.markets, market_streams[i].tolist(), market_revenue[i].tolist()
+                    )
+                },
+            }
+            for i in range(len(pairs))
+        ]
+
+    def artist_json(self, row: int) -> dict:
+        return {"id": self.model.artists["artist_id"].iat[row], "name": self.model.artists["name"].iat[row]}
+
+    async def respond(self, method: str, target: str) -> tuple[HTTPStatus, bytes]:
+        try:
+            if method != "GET":
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported")
+            payload = await self.route(target)
+        except ApiError as error:
+            return error.status, encode_json({"error": str(error)})
+        except Exception as error:
+            # A failed batch fails each of its requests, not the connection
+            return HTTPStatus.INTERNAL_SERVER_ERROR, encode_json({"error": f"Scoring failed: {error}"})
+        return HTTPStatus.OK, encode_json(payload)
+
+    async def route(self, target: str) -> object:
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == "/score":
+            return await self.batcher.submit(self.pair_rows(params))
+        if url.path == "/healthz":
+            return {
+                "status": "ok",
+                "artists": len(self.model.artists),
+                "markets": self.model.markets,
+                "max_batch_size": self.batcher.max_batch_size,
+                "batches": self.batcher.batches,
+                "pairs": self.batcher.items,
+            }
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {url.path}")
+
+    def pair_rows(self, params: dict[str, list[str]]) -> tuple[int, int]:
+        rows = []
+        for name in ("artist_1", "artist_2"):
+            values = params.get(name)
+            if not values:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} is required")
+            try:
+                rows.append(self.model.artist_row(values[0]))
+            except UnknownArtist:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown artist: {values[0]}") from None
+        if not self.model.can_score(*rows):
+            raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, "Neither artist has audio features to score")
+        return rows[0], rows[1]
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Minimal HTTP/1.1 handling: GET requests, kept alive unless the client closes."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, body = HTTPStatus.BAD_REQUEST, encode_json({"error": "Malformed request line"})
+                else:
+                    status, body = await self.respond(parts[0], parts[1])
+                keep_alive = len(parts) == 3 and parts[2] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(
+            f"Scoring {len(self.model.artists)} artists on http://{host}:{port} "
+            f"(batches of up to {self.batcher.max_batch_size}, {self.batcher.max_wait * 1000:g} ms wait)",
+            flush=True,
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score artist pairs with the saved stream model.")
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL_PATH, help="Bundle saved by generate_collab_predictions.py")
+    parser.add_argument("--rates", type=Path, default=DEFAULT_RATES_PATH)
+    parser.add_argument("--as-of", help="Apply the payout rates in effect on this date")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8070)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="How long an open batch waits for more requests")
+    args = parser.parse_args()
+
+    service = ScoringService.load(
+        args.model, args.rates, args.as_of, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
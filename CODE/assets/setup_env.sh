@@ -8,7 +8,7 @@ source venv/bin/activate
 
 echo "Installing required packages"
 pip install --upgrade pip
-pip install pandas plotly dash networkx pyvis numpy scikit-learn
+pip install pandas plotly dash networkx pyvis numpy scipy scikit-learn gunicorn
 
 echo "Installing done! Your environment is ready and activated."
 echo "To activate again later, run: source venv/bin/activate"
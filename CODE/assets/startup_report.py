@@ -0,0 +1,132 @@
+"""Cold-start timing report for the map server and the page builders.
+
+Each target runs in a fresh interpreter under ``-X importtime``. The report
+shows the wall-clock start time next to a per-package breakdown of import
+time, and exits non-zero when a target is over its budget::
+
+    python startup_report.py
+    python startup_report.py --repeat 5 --budget map_server_ready=1500
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+CODE_DIR = ASSETS_DIR.parent
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass(frozen=True)
+class StartupTarget:
+    name: str
+    cwd: Path
+    code: str
+    budget_ms: float
+
+
+# Budgets leave roughly 2x headroom over a warm-disk run on a laptop-class machine
+TARGETS = [
+    StartupTarget("map_server_import", CODE_DIR, "import choropleth_map_artist_collaboration", 150),
+    StartupTarget(
+        "map_server_ready",
+        CODE_DIR,
+        "import choropleth_map_artist_collaboration as app_module; app_module.create_app()",
+        2500,
+    ),
+    StartupTarget("graph_builder_import", CODE_DIR, "import graph_network_artist_collaboration", 150),
+    StartupTarget("map_builder_import", ASSETS_DIR, "import generate_static_choropleth", 800),
+    StartupTarget("site_build_import", ASSETS_DIR, "import build_static_site", 150),
+]
+
+
+@dataclass
+class StartupMeasurement:
+    target: StartupTarget
+    wall_ms: float
+    import_ms: float
+    packages_ms: dict[str, float]
+
+
+def measure(target: StartupTarget) -> StartupMeasurement:
+    wrapper = (
+        "import time; _start = time.perf_counter()\n"
+        f"{target.code}\n"
+        "print(f'__wall_ms__={(time.perf_counter() - _start) * 1000:.3f}')"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", wrapper],
+        cwd=str(target.cwd),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_ms = float(completed.stdout.rsplit("__wall_ms__=", 1)[1])
+
+    packages_ms = defaultdict(float)
+    import_ms = 0.0
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        packages_ms[module.split(".")[0]] += int(self_us) / 1000
+        # Top-level entries carry a single space of indentation
+        if len(indent) == 1:
+            import_ms += int(cumulative_us) / 1000
+    return StartupMeasurement(target, wall_ms, import_ms, dict(packages_ms))
+
+
+def best_of(target: StartupTarget, repeat: int) -> StartupMeasurement:
+    return min((measure(target) for _ in range(repeat)), key=lambda measurement: measurement.wall_ms)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report and enforce cold-start budgets.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the fastest is reported")
+    parser.add_argument("--top", type=int, default=6, help="Packages listed per target")
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="TARGET=MS",
+        help="Override a target's budget in milliseconds",
+    )
+    parser.add_argument("--only", action="append", default=[], metavar="TARGET", help="Measure only these targets")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.budget:
+        name, _, value = item.partition("=")
+        overrides[name] = float(value)
+
+    over_budget = []
+    for target in TARGETS:
+        if args.only and target.name not in args.only:
+            continue
+        budget_ms = overrides.get(target.name, target.budget_ms)
+        measurement = best_of(target, args.repeat)
+        status = "ok" if measurement.wall_ms <= budget_ms else "OVER"
+        if status == "OVER":
+            over_budget.append(target.name)
+
+        print(
+            f"{target.name}: {measurement.wall_ms:,.0f} ms "
+            f"(imports {measurement.import_ms:,.0f} ms, budget {budget_ms:,.0f} ms) {status}"
+        )
+        heaviest = sorted(measurement.packages_ms.items(), key=lambda item: item[1], reverse=True)
+        for package, package_ms in heaviest[: args.top]:
+            print(f"    {package:<24} {package_ms:8.1f} ms")
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""The trained stream model and everything needed to score new pairs with it.
+
+generate_collab_predictions.py saves a ``StreamModel`` bundle next to the
+pair store. It holds the random forest, the scaler fitted on the market audio
+profiles, the scaled profiles and the artist feature table. A pair can then
+be scored without rerunning the batch job::
+
+    model = StreamModel.load(Path("data") / "stream_model.joblib")
+    predicted_streams, market_streams = model.score(
+        model.artist_rows(["Farruko"]), model.artist_rows(["Rauw Alejandro"])
+    )
+
+Scoring follows the batch job step by step: the pair's audio features are
+the mean of both artists' features, and streams are split across markets by
+the features' cosine similarity to each market profile.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from pair_store import pair_average
+from stream_window import AUDIO_FEATURES
+
+
+DEFAULT_MODEL_PATH = Path("data") / "stream_model.joblib"
+
+
+def market_weights(pair_features: pd.DataFrame, scaler, market_scaled: np.ndarray) -> np.ndarray:
+    """Share of each pair's streams per market.
+
+    Cosine similarity between the pair's scaled features and each scaled
+    market profile, rescaled to [0, 1] so none is negative, then normalised
+    so each row sums to 1.
+    """
+    raw_similarity_matrix = cosine_similarity(scaler.transform(pair_features), market_scaled)
+    rescaled_similarities = (raw_similarity_matrix + 1) / 2
+    return rescaled_similarities / rescaled_similarities.sum(axis=1, keepdims=True)
+
+
+class UnknownArtist(KeyError):
+    pass
+
+
+@dataclass
+class StreamModel:
+    model: object
+    scaler: object
+    markets: list[str]
+    market_scaled: np.ndarray
+    # artist_id, name and the averaged audio features (NaN when the artist never charted)
+    artists: pd.DataFrame
+
+    def __post_init__(self) -> None:
+        self.features = self.artists[AUDIO_FEATURES].to_numpy(dtype=np.float64)
+        self.rows_by_id = {artist_id: row for row, artist_id in enumerate(self.artists["artist_id"])}
+        # A name shared by several artists resolves to the first one; ids are unambiguous
+        self.rows_by_name = {}
+        for row, name in enumerate(self.artists["name"]):
+            self.rows_by_name.setdefault(name, row)
+
+    def save(self, path: Path) -> Path:
+        import joblib
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {
+                "model": self.model,
+                "scaler": self.scaler,
+                "markets": self.markets,
+                "market_scaled": self.market_scaled,
+                "artists": self.artists,
+            },
+            path,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_MODEL_PATH) -> "StreamModel":
+        import joblib
+
+        return cls(**joblib.load(path))
+
+    def artist_row(self, artist: str) -> int:
+        """Row of an artist given by Spotify id or by name."""
+        row = self.rows_by_id.get(artist, self.rows_by_name.get(artist))
+        if row is None:
+            raise UnknownArtist(artist)
+        return row
+
+    def artist_rows(self, artists: list[str]) -> np.ndarray:
+        return np.array([self.artist_row(artist) for artist in artists], dtype=np.int32)
+
+    def can_score(self, artist_1: int, artist_2: int) -> bool:
+        """The batch job drops pairs where neither artist has audio features; so does scoring."""
+        return not np.isnan(pair_average(self.features, np.array([artist_1]), np.array([artist_2]))).any()
+
+    def score(self, artist_1: np.ndarray, artist_2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Predicted streams per pair and their split across ``markets``, for pairs of artist rows."""
+        pair_features = pd.DataFrame(pair_average(self.features, artist_1, artist_2), columns=AUDIO_FEATURES)
+        predicted_streams = self.model.predict(pair_features)
+        market_streams = predicted_streams[:, None] * market_weights(pair_features, self.scaler, self.market_scaled)
+        return predicted_streams, market_streams
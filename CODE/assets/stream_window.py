@@ -0,0 +1,259 @@
+"""Rolling chart-week window for the stream model in generate_collab_predictions.py.
+
+Chart files are grouped by week. Each week is prepared once into a
+``WeekSlice``:
+
+* its chart rows joined to artists
+* its training rows
+* per-market audio feature sums
+
+``RollingStreamWindow`` keeps the slices of the weeks in the window. When a
+new week lands, only that week is read and prepared, and the oldest one
+expires. The training set and the market profiles are then assembled from
+the slices instead of from the whole chart history. Prepared slices are also
+pickled per week, so a later run only reads the chart files that are new.
+"""
+import hashlib
+import os
+import pickle
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+AUDIO_FEATURES = ["danceability", "energy", "valence", "tempo"]
+# Chart rows are kept in this order so a window gives the same training set
+# however its weeks were added
+ORDER_COLUMNS = ["market", "start_date", "chart_position"]
+# Part of every week-cache key; bump it when prepare_week or WeekSlice changes
+# so weeks pickled by the old code are prepared again
+WEEK_CACHE_VERSION = 1
+
+
+def chart_file_info(file: str) -> tuple[str, pd.Timestamp, pd.Timestamp]:
+    filename = os.path.basename(file)
+    country_code = filename.split("-")[0]
+
+    date_part = filename.split("-weekly_with_features-")[1].replace(".csv", "")
+    start_date_str, end_date_str = date_part.split("--")
+    return country_code, pd.to_datetime(start_date_str), pd.to_datetime(end_date_str)
+
+
+def group_chart_files(chart_files: list[str]) -> dict[pd.Timestamp, list[str]]:
+    """Group chart files by week start date, oldest week first."""
+    weeks = {}
+    for file in sorted(chart_files):
+        try:
+            _, start_date, _ = chart_file_info(file)
+        except (IndexError, ValueError) as e:
+            print(f"Error loading {file}: {e}")
+            continue
+        weeks.setdefault(start_date, []).append(file)
+    return dict(sorted(weeks.items()))
+
+
+def read_chart_file(file: str) -> pd.DataFrame:
+    country_code, start_date, end_date = chart_file_info(file)
+
+    df = pd.read_csv(file, sep="\t", quotechar='"')
+
+    df["market"] = country_code
+    df["start_date"] = start_date
+    df["end_date"] = end_date
+    df["year"] = start_date.year
+    df["month"] = start_date.month
+    df["iso_week"] = start_date.isocalendar()[1]
+    df["chart_position"] = np.arange(len(df))
+    return df
+
+
+@dataclass
+class WeekSlice:
+    start_date: pd.Timestamp
+    charts: pd.DataFrame
+    training: pd.DataFrame
+    market_sums: pd.DataFrame
+
+
+def prepare_week(
+    start_date: pd.Timestamp,
+    files: list[str],
+    song_artists: pd.DataFrame,
+    song_features: pd.DataFrame,
+) -> WeekSlice:
+    """Read one week of chart files and reduce it to what the model needs."""
+    charts_data = []
+    for file in files:
+        try:
+            charts_data.append(read_chart_file(file))
+        except Exception as e:
+            print(f"Error loading {file}: {e}")
+    charts_df = pd.concat(charts_data, ignore_index=True)
+
+    # Merge charts with song-artist pairs to get artist_id per charted song
+    charts_with_artists = charts_df.merge(song_artists, on="song_id", how="left")
+    charts_with_audio = charts_with_artists.merge(song_features, on="song_id", how="left")
+
+    # Rows with streams and audio features train the model
+    training = charts_with_audio.dropna(subset=["streams"] + AUDIO_FEATURES)[AUDIO_FEATURES + ["streams"] + ORDER_COLUMNS]
+
+    # Rows with audio features make up the market profiles
+    profiled = charts_with_audio.dropna(subset=AUDIO_FEATURES)
+    market_sums = profiled.groupby("market")[AUDIO_FEATURES].sum()
+    market_sums["rows"] = profiled.groupby("market").size()
+
+    return WeekSlice(start_date, charts_with_artists, training.reset_index(drop=True), market_sums)
+
+
+def file_signature(files: list[str]) -> str:
+    digest = hashlib.sha256()
+    for file in sorted(files):
+        stat = os.stat(file)
+        digest.update(f"{file}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_week(
+    start_date: pd.Timestamp,
+    files: list[str],
+    song_artists: pd.DataFrame,
+    song_features: pd.DataFrame,
+    cache_dir: Path,
+    songs_signature: str,
+) -> WeekSlice:
+    """Return a prepared week, from the pickle cache when its chart files and the preparing code are unchanged.
+
+    The cache key covers the chart files, the song tables, ``WEEK_CACHE_VERSION``
+    and the column lists ``prepare_week`` selects.
+    """
+    transform = f"{WEEK_CACHE_VERSION}|{','.join(AUDIO_FEATURES)}|{','.join(ORDER_COLUMNS)}"
+    key = hashlib.sha256(f"{file_signature(files)}|{songs_signature}|{transform}".encode("utf-8")).hexdigest()[:16]
+    cache_path = cache_dir / f"{start_date:%Y-%m-%d}-{key}.pkl"
+    if cache_path.exists():
+        with cache_path.open("rb") as handle:
+            return pickle.load(handle)
+
+    week = prepare_week(start_date, files, song_artists, song_features)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale_path in cache_dir.glob(f"{start_date:%Y-%m-%d}-*.pkl"):
+        stale_path.unlink()
+    with cache_path.open("wb") as handle:
+        pickle.dump(week, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    return week
+
+
+class RollingStreamWindow:
+    """The most recent ``window_weeks`` chart weeks (all of them when None).
+
+    With ``half_life_weeks`` set, rows are weighted by ``0.5 ** (age / half_life)``,
+    where age is counted in weeks back from the newest week in the window.
+    """
+
+    def __init__(self, window_weeks: int | None = None, half_life_weeks: float | None = None) -> None:
+        if window_weeks is not None and window_weeks < 1:
+            raise ValueError("window_weeks must be at least 1")
+        self.window_weeks = window_weeks
+        self.half_life_weeks = half_life_weeks
+        self.weeks: dict[pd.Timestamp, WeekSlice] = {}
+
+    def select(self, chart_weeks: dict[pd.Timestamp, list[str]]) -> dict[pd.Timestamp, list[str]]:
+        """The chart weeks that fall in the window, oldest first."""
+        starts = sorted(chart_weeks)
+        if self.window_weeks is not None:
+            starts = starts[-self.window_weeks:]
+        return {start: chart_weeks[start] for start in starts}
+
+    def add_week(self, week: WeekSlice) -> list[pd.Timestamp]:
+        """Add a prepared week and return the start dates of the weeks it expired."""
+        self.weeks[week.start_date] = week
+        self.weeks = dict(sorted(self.weeks.items()))
+
+        expired = []
+        if self.window_weeks is not None:
+            while len(self.weeks) > self.window_weeks:
+                oldest = next(iter(self.weeks))
+                del self.weeks[oldest]
+                expired.append(oldest)
+        return expired
+
+    def week_weights(self) -> dict[pd.Timestamp, float]:
+        if self.half_life_weeks is None:
+            return {start: 1.0 for start in self.weeks}
+        newest = max(self.weeks)
+        return {
+            start: 0.5 ** (((newest - start).days / 7) / self.half_life_weeks)
+            for start in self.weeks
+        }
+
+    def charts(self) -> pd.DataFrame:
+        """Chart rows joined to artists for every week in the window."""
+        charts_df = pd.concat([week.charts for week in self.weeks.values()], ignore_index=True)
+        return charts_df.sort_values(ORDER_COLUMNS, kind="stable").reset_index(drop=True)
+
+    def training_set(self) -> tuple[pd.DataFrame, pd.Series, np.ndarray | None]:
+        """Return features, streams and per-row recency weights (None when unweighted)."""
+        weights = self.week_weights()
+        training = pd.concat(
+            [week.training.assign(weight=weights[start]) for start, week in self.weeks.items()],
+            ignore_index=True,
+        )
+        training = training.sort_values(ORDER_COLUMNS, kind="stable")
+        sample_weight = training["weight"].to_numpy() if self.half_life_weeks is not None else None
+        return training[AUDIO_FEATURES], training["streams"], sample_weight
+
+    def market_profiles(self) -> pd.DataFrame:
+        """Mean (or recency-weighted mean) audio features per market."""
+        weights = self.week_weights()
+        weighted_sums = pd.concat(
+            [week.market_sums * weights[start] for start, week in self.weeks.items()]
+        ).groupby(level=0).sum()
+        profiles = weighted_sums[AUDIO_FEATURES].div(weighted_sums["rows"], axis=0)
+        return profiles.rename_axis("market").reset_index()
+
+
+def refresh_report(
+    chart_weeks: dict[pd.Timestamp, list[str]],
+    prepare: Callable[[pd.Timestamp, list[str]], WeekSlice],
+    window_weeks: int | None,
+    half_life_weeks: float | None,
+) -> dict[str, float]:
+    """Time adding the newest week to a loaded window against rebuilding from all chart history.
+
+    ``prepare`` should read chart files without the pickle cache so both paths
+    pay for the reads they would really make.
+    """
+    starts = sorted(chart_weeks)
+    if len(starts) < 2:
+        raise ValueError("The refresh report needs at least two chart weeks")
+
+    def assemble(window: RollingStreamWindow) -> None:
+        window.training_set()
+        window.market_profiles()
+
+    # Full rebuild: every week of history is read, then the window is cut
+    started = time.perf_counter()
+    window = RollingStreamWindow(window_weeks, half_life_weeks)
+    for start in starts:
+        window.add_week(prepare(start, chart_weeks[start]))
+    assemble(window)
+    full_seconds = time.perf_counter() - started
+
+    # Incremental: the window up to last week is already in memory
+    window = RollingStreamWindow(window_weeks, half_life_weeks)
+    previous = starts[:-1] if window_weeks is None else starts[-window_weeks - 1:-1]
+    for start in previous:
+        window.add_week(prepare(start, chart_weeks[start]))
+    started = time.perf_counter()
+    expired = window.add_week(prepare(starts[-1], chart_weeks[starts[-1]]))
+    assemble(window)
+    refresh_seconds = time.perf_counter() - started
+
+    print(f"Chart weeks in history: {len(starts)}, in window: {len(window.weeks)}")
+    print(f"Full rebuild from history: {full_seconds:.2f}s")
+    print(f"Incremental refresh (+1 week, -{len(expired)} expired): {refresh_seconds:.2f}s")
+    print(f"Speedup: {full_seconds / refresh_seconds:,.1f}x")
+    return {"full_seconds": full_seconds, "refresh_seconds": refresh_seconds}
@@ -1,11 +1,35 @@
-import pandas as pd
-import plotly.express as px
-import dash
-from dash import dcc, html, Input, Output
+"""Dash app showing predicted collaboration revenue by market for one artist.
 
-# Load the dataset
-file_path = "assets/artist_collaboration_predictions_by_market.csv"
-df = pd.read_csv(file_path)
+Development server (single process, debug off unless requested)::
+
+    python choropleth_map_artist_collaboration.py [--debug]
+
+Serving from the SQLite store (``python collab_store.py``) instead of the CSV
+reads each artist's rows on demand rather than indexing everything at startup::
+
+    python choropleth_map_artist_collaboration.py --db assets/artist_collaboration_predictions.sqlite
+
+Production, multi-worker. ``--preload`` makes the master load and index the
+predictions once before forking, so workers share those pages copy-on-write::
+
+    gunicorn --preload -w 4 -b 0.0.0.0:8050 "choropleth_map_artist_collaboration:create_server()"
+"""
+import argparse
+import gc
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# pandas, numpy, plotly, dash and collab_query are imported inside the
+# functions that use them so importing this module (for DashboardData, tests
+# or benchmarks) stays cheap; see assets/startup_report.py for the measured
+# budgets.
+
+# Number of rendered artist views kept in memory
+VIEW_CACHE_SIZE = 256
+
+ASSETS_DIR = Path(__file__).resolve().parent / "assets"
+DEFAULT_CSV_PATH = ASSETS_DIR / "artist_collaboration_predictions_by_market.csv"
 
 # Map country codes to full names
 country_mapping = {
@@ -18,184 +42,296 @@ country_mapping = {
     'predicted_revenue_de': 'Denmark',
     'predicted_revenue_au': 'Australia'
 }
+market_countries = {column.rsplit('_', 1)[1]: country for column, country in country_mapping.items()}
+
+
+def build_base_figure(trace_data):
+    """Build the choropleth figure that is sent to the browser once."""
+    # graph_objects rather than plotly.express, which is much slower to import
+    import plotly.graph_objects as go
+
+    # Custom navy color scale
+    custom_colorscale = [
+        [0, "#F0F4F8"],
+        [1, "#003057"]
+    ]
+
+    fig = go.Figure(go.Choropleth(
+        locationmode='country names',
+        **trace_data,
+        hovertemplate=('<b>%{hovertext}</b><br><br>revenue=%{z:$,.2f}<br>'
+                       'collaborations=%{customdata}<extra></extra>'),
+        colorscale=custom_colorscale,
+        colorbar={'title': {'text': 'revenue'}},
+    ))
+
+    fig.update_layout(margin={"r": 0, "t": 40, "l": 0, "b": 0})
+    return fig
+
+
+class DashboardData:
+    """Indexed predictions and a cache of rendered artist views."""
+
+    def __init__(self, index, cache_size=VIEW_CACHE_SIZE):
+        self.index = index
+
+        # Artists sorted by total revenue
+        self.sorted_artists = index.artists
+
+        # Create dropdown options with artist names only
+        self.artist_options = [{'label': artist, 'value': artist} for artist in self.sorted_artists]
+
+        self.artist_view = lru_cache(maxsize=cache_size)(self.build_artist_view)
+
+        # Build the full figure once; artist changes only patch its trace data
+        self.base_figure = build_base_figure(self.country_trace(self.sorted_artists[0]))
+
+    @classmethod
+    def from_csv(cls, file_path=DEFAULT_CSV_PATH, cache_size=VIEW_CACHE_SIZE):
+        from collab_query import CollabIndex
+
+        return cls(CollabIndex.from_csv(file_path), cache_size=cache_size)
+
+    @classmethod
+    def from_sqlite(cls, db_path, cache_size=VIEW_CACHE_SIZE):
+        from collab_store import SqliteCollabStore
+
+        return cls(SqliteCollabStore(db_path), cache_size=cache_size)
+
+    def country_trace(self, primary_artist):
+        """Return the per-country revenue and collaboration arrays of the map trace."""
+        breakdown = self.index.market_breakdown(primary_artist) if primary_artist in self.index else []
+        breakdown = sorted(breakdown, key=lambda market: market_countries[market.market])
+
+        countries = [market_countries[market.market] for market in breakdown]
+        return {
+            'locations': countries,
+            'hovertext': countries,
+            'z': [market.revenue for market in breakdown],
+            'customdata': [market.collaborations for market in breakdown],
+        }
+
+    def build_artist_view(self, primary_artist):
+        """Build the map trace data, revenue tracker and top collaborations for one artist.
+
+        Use ``artist_view`` to go through the LRU cache.
+        """
+        from dash import html
+
+        # Only the per-country arrays of the base trace change between artists
+        trace_data = self.country_trace(primary_artist)
 
+        # Calculate total revenue for the selected artist
+        total_revenue = 0.0
+        top_collaborations = []
+        if primary_artist in self.index:
+            total_revenue = self.index.total_revenue(primary_artist)
+            top_collaborations = self.index.top_partners(primary_artist, k=10)
+        total_revenue_display = f"Total Estimated Revenue: ${total_revenue:,.2f}"
 
-# Melt the data for visualization
-market_cols = list(country_mapping.keys())
-melted_df = df.melt(id_vars=['artist_1_name', 'artist_2_name'], value_vars=market_cols, 
-                     var_name='market', value_name='revenue')
-melted_df['country'] = melted_df['market'].map(country_mapping)
+        # Generate HTML list items
+        collaboration_items = [
+            html.Div(
+                children=[
+                    html.P(f"{pair.artist_1} & {pair.artist_2}",
+                           style={'fontSize': '18px', 'fontWeight': 'bold', 'color': '#003057'}),
+                    html.P(f"Revenue: ${pair.revenue:,.2f}",
+                           style={'fontSize': '16px', 'color': '#204060'})
+                ],
+                style={
+                    'padding': '15px',
+                    'borderBottom': '1px solid #ccc',
+                    'backgroundColor': '#F9F9F9' if i % 2 == 0 else '#FFFFFF'
+                }
+            )
+            for i, pair in enumerate(top_collaborations)
+        ]
 
-# Calculate total revenue for each artist
-total_revenue_artist_1 = melted_df.groupby('artist_1_name')['revenue'].sum()
-total_revenue_artist_2 = melted_df.groupby('artist_2_name')['revenue'].sum()
-total_revenue = total_revenue_artist_1.add(total_revenue_artist_2, fill_value=0)
+        return trace_data, total_revenue_display, collaboration_items
 
-# Sort artists by total revenue
-sorted_artists = total_revenue.sort_values(ascending=False).index
+    def cache_stats(self):
+        """Return hit/miss counters for the per-artist view cache."""
+        info = self.artist_view.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+        }
 
-# Create dropdown options with artist names only
-artist_options = [{'label': artist, 'value': artist} for artist in sorted_artists]
 
-# Initialize Dash app
-app = dash.Dash(__name__)
+def update_dashboard(data, primary_artist):
+    from dash import Patch
 
-# Layout with the map, total revenue tracker, sidebar, and filter
-app.layout = html.Div(style={
-    'fontFamily': 'Arial, sans-serif',
-    'backgroundColor': '#F5F5F5',
-    'padding': '40px'
-}, children=[
+    trace_data, total_revenue_display, collaboration_items = data.artist_view(primary_artist)
 
-    # Title with music icon
-    html.Div(style={
-        'display': 'flex',
-        'alignItems': 'center',
-        'justifyContent': 'center',
-        'marginBottom': '20px'
+    # Send only the changed trace arrays instead of a whole new figure
+    patched_figure = Patch()
+    for key, value in trace_data.items():
+        patched_figure['data'][0][key] = value
+
+    return patched_figure, total_revenue_display, collaboration_items
+
+
+def build_layout(data):
+    from dash import dcc, html
+
+    # Layout with the map, total revenue tracker, sidebar, and filter
+    return html.Div(style={
+        'fontFamily': 'Arial, sans-serif',
+        'backgroundColor': '#F5F5F5',
+        'padding': '40px'
     }, children=[
-        html.Img(src='/assets/music_icon.png', 
-                 style={'width': '60px', 'height': '60px', 'marginRight': '15px'}),
-        html.H1("Artist Collaboration Earnings by Market",
-                style={'color': '#003057', 'fontSize': '36px', 'fontWeight': 'bold',
-                       'textShadow': '1px 1px 3px #ccc'})
-    ]),
-
-    # Total Revenue Tracker
-    html.Div(id='total-revenue-tracker', 
-             style={
-                 'textAlign': 'center',
-                 'fontSize': '28px',
-                 'color': '#204060',
-                 'backgroundColor': '#FFFFFF',
-                 'border': '1px solid #ccc',
-                 'borderRadius': '8px',
-                 'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)',
-                 'padding': '20px',
-                 'marginBottom': '40px'
-             }),
-
-    # Container for map and sidebar
-    html.Div(style={'display': 'flex', 'justifyContent': 'space-between'}, children=[
-
-        # Map and Filter (left side)
-        html.Div(style={'flex': '2', 'marginRight': '20px'}, children=[
-
-            # Choropleth Map
-            dcc.Graph(id='choropleth-map', 
-                      style={'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)'}),
-
-            # Filter below the map and aligned to the left
-            html.Div([
-                html.Label("Select Artist:", style={'fontSize': '20px', 'color': '#333'}),
-                dcc.Dropdown(
-                    id='primary-artist-dropdown',
-                    options=artist_options,
-                    value=sorted_artists[0],  # Default to the top artist
-                    multi=False,
-                    style={'width': '90%', 'fontSize': '18px', 'marginTop': '20px'}
-                ),
-            ], style={'width': '80%', 'margin': '30px auto'})
-        ]),
 
-        # Sidebar (right side)
+        # Title with music icon
         html.Div(style={
-            'flex': '1',
-            'backgroundColor': '#FFFFFF',
-            'border': '1px solid #ccc',
-            'borderRadius': '8px',
-            'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)',
-            'padding': '20px',
-            'overflowY': 'auto',
-            'height': '700px'
+            'display': 'flex',
+            'alignItems': 'center',
+            'justifyContent': 'center',
+            'marginBottom': '20px'
         }, children=[
-            
-            # Title above the list
-            html.H3("Top 10 Potential Artist Collaborations", 
-                    style={
-                        'textAlign': 'center',
-                        'color': '#003057',
-                        'marginBottom': '15px',
-                        'fontSize': '22px',
-                        'fontWeight': 'bold'
-                    }),
-            
-            # Collaboration list container
-            html.Div(id='collaboration-list')
+            html.Img(src='/assets/music_icon.png',
+                     style={'width': '60px', 'height': '60px', 'marginRight': '15px'}),
+            html.H1("Artist Collaboration Earnings by Market",
+                    style={'color': '#003057', 'fontSize': '36px', 'fontWeight': 'bold',
+                           'textShadow': '1px 1px 3px #ccc'})
+        ]),
+
+        # Total Revenue Tracker
+        html.Div(id='total-revenue-tracker',
+                 style={
+                     'textAlign': 'center',
+                     'fontSize': '28px',
+                     'color': '#204060',
+                     'backgroundColor': '#FFFFFF',
+                     'border': '1px solid #ccc',
+                     'borderRadius': '8px',
+                     'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)',
+                     'padding': '20px',
+                     'marginBottom': '40px'
+                 }),
+
+        # Container for map and sidebar
+        html.Div(style={'display': 'flex', 'justifyContent': 'space-between'}, children=[
+
+            # Map and Filter (left side)
+            html.Div(style={'flex': '2', 'marginRight': '20px'}, children=[
+
+                # Choropleth Map
+                dcc.Graph(id='choropleth-map', figure=data.base_figure,
+                          style={'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)'}),
+
+                # Filter below the map and aligned to the left
+                html.Div([
+                    html.Label("Select Artist:", style={'fontSize': '20px', 'color': '#333'}),
+                    dcc.Dropdown(
+                        id='primary-artist-dropdown',
+                        options=data.artist_options,
+                        value=data.sorted_artists[0],  # Default to the top artist
+                        multi=False,
+                        style={'width': '90%', 'fontSize': '18px', 'marginTop': '20px'}
+                    ),
+                ], style={'width': '80%', 'margin': '30px auto'})
+            ]),
+
+            # Sidebar (right side)
+            html.Div(style={
+                'flex': '1',
+                'backgroundColor': '#FFFFFF',
+                'border': '1px solid #ccc',
+                'borderRadius': '8px',
+                'boxShadow': '0 4px 12px rgba(0, 0, 0, 0.1)',
+                'padding': '20px',
+                'overflowY': 'auto',
+                'height': '700px'
+            }, children=[
+
+                # Title above the list
+                html.H3("Top 10 Potential Artist Collaborations",
+                        style={
+                            'textAlign': 'center',
+                            'color': '#003057',
+                            'marginBottom': '15px',
+                            'fontSize': '22px',
+                            'fontWeight': 'bold'
+                        }),
+
+                # Collaboration list container
+                html.Div(id='collaboration-list')
+            ])
         ])
     ])
-])
-
-# Callback to update the map, revenue tracker, and collaborations list
-@app.callback(
-    [Output('choropleth-map', 'figure'),
-     Output('total-revenue-tracker', 'children'),
-     Output('collaboration-list', 'children')],
-    [Input('primary-artist-dropdown', 'value')]
-)
-def update_dashboard(primary_artist):
-    # Filter data for the selected artist
-    filtered_df = melted_df[
-        (melted_df['artist_1_name'] == primary_artist) | 
-        (melted_df['artist_2_name'] == primary_artist)
-    ]
 
-    # Count collaborations and revenue by country
-    collab_count = filtered_df.groupby('country').size().reset_index(name='collaborations')
-    revenue_by_country = filtered_df.groupby('country', as_index=False).sum()
-    merged_df = revenue_by_country.merge(collab_count, on='country', how='left')
-
-    # Calculate total revenue for the selected artist
-    total_revenue = filtered_df['revenue'].sum()
-    total_revenue_display = f"Total Estimated Revenue: ${total_revenue:,.2f}"
-
-    # Generate the top collaborations list
-    top_collaborations = (
-        filtered_df.groupby(['artist_1_name', 'artist_2_name'])
-        .agg({'revenue': 'sum'})
-        .reset_index()
-        .sort_values(by='revenue', ascending=False)
-        .head(10)
-    )
 
-    # Generate HTML list items
-    collaboration_items = [
-        html.Div(
-            children=[
-                html.P(f"{row['artist_1_name']} & {row['artist_2_name']}",
-                       style={'fontSize': '18px', 'fontWeight': 'bold', 'color': '#003057'}),
-                html.P(f"Revenue: ${row['revenue']:,.2f}",
-                       style={'fontSize': '16px', 'color': '#204060'})
-            ],
-            style={
-                'padding': '15px',
-                'borderBottom': '1px solid #ccc',
-                'backgroundColor': '#F9F9F9' if i % 2 == 0 else '#FFFFFF'
-            }
-        )
-        for i, row in top_collaborations.iterrows()
-    ]
+def add_assets_path():
+    # profile_hooks lives with the build scripts in assets/; only the app
+    # needs it, so importing this module leaves sys.path alone
+    if str(ASSETS_DIR) not in sys.path:
+        sys.path.append(str(ASSETS_DIR))
 
-    # Custom navy color scale
-    custom_colorscale = [
-        [0, "#F0F4F8"],
-        [1, "#003057"]
-    ]
 
-    fig = px.choropleth(
-        merged_df,
-        locations='country',
-        locationmode='country names',
-        color='revenue',
-        hover_name='country',
-        hover_data={'revenue': ':$,.2f', 'collaborations': True},
-        color_continuous_scale=custom_colorscale
+def create_app(file_path=DEFAULT_CSV_PATH, data=None, db_path=None):
+    """Build the Dash app; pass ``data`` to reuse an already loaded DashboardData.
+
+    With ``db_path`` the predictions are queried from that SQLite store instead
+    of ``file_path``.
+    """
+    import dash
+    from dash import Input, Output
+
+    add_assets_path()
+    from profile_hooks import install as install_profiling, profile_callback
+
+    # With COLLAB_PROFILE set, sampled callback calls are timed (and profiled);
+    # otherwise update_dashboard is used as is
+    install_profiling("choropleth_server", whole_run=False)
+    timed_update = profile_callback("update_dashboard")(update_dashboard)
+
+    if data is None:
+        data = DashboardData.from_sqlite(db_path) if db_path else DashboardData.from_csv(file_path)
+
+    app = dash.Dash(__name__)
+    app.layout = build_layout(data)
+
+    # Callback to update the map, revenue tracker, and collaborations list
+    @app.callback(
+        [Output('choropleth-map', 'figure'),
+         Output('total-revenue-tracker', 'children'),
+         Output('collaboration-list', 'children')],
+        [Input('primary-artist-dropdown', 'value')]
     )
+    def update_dashboard_callback(primary_artist):
+        return timed_update(data, primary_artist)
 
-    fig.update_layout(margin={"r": 0, "t": 40, "l": 0, "b": 0})
+    @app.server.route('/healthz')
+    def healthz():
+        return {'status': 'ok', 'artists': len(data.sorted_artists), 'view_cache': data.cache_stats()}
+
+    return app
+
+
+def create_server(file_path=DEFAULT_CSV_PATH, db_path=None):
+    """WSGI entry point for a pre-forking server such as gunicorn --preload."""
+    app = create_app(file_path, db_path=db_path)
+    # Move the loaded data out of the collector's generations so workers
+    # do not dirty the shared pages when the GC runs
+    gc.freeze()
+    return app.server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV_PATH, help="Predictions CSV to serve")
+    parser.add_argument("--db", type=Path, help="SQLite prediction store to serve instead of the CSV")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--debug", action="store_true", help="Enable the Dash debugger and reloader")
+    args = parser.parse_args()
+
+    app = create_app(args.csv, db_path=args.db)
+    app.run(host=args.host, port=args.port, debug=args.debug)
 
-    return fig, total_revenue_display, collaboration_items
 
 # Run the app
 if __name__ == '__main__':
-    app.run(debug=True)
+    main()
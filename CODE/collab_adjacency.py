@@ -0,0 +1,172 @@
+"""Adjacency of the collaboration network graph in compressed sparse row form.
+
+``CollabAdjacency`` numbers the graph's artists in node order and its edges
+in edge order (the order the network page lists them), then stores every
+artist's neighbours as one slice of flat int32 arrays:
+
+* ``offsets``: artist ``i``'s entries are ``offsets[i]:offsets[i + 1]``
+* ``neighbors``: the artist at the other end of each entry, in edge order
+* ``edge_ids``: the edge each entry comes from
+
+Neighbour lookups are slices; k-hop and connected-component queries run on
+the same arrays, optionally over a subset of the edges::
+
+    adjacency = CollabAdjacency.from_graph(G)
+    adjacency.neighbors("Farruko")
+    adjacency.k_hop("Farruko", 2)
+    adjacency.component("Farruko")
+
+``page_data`` is the form the network page reads: the arrays plus a
+component label per artist for each filter view, so focusing a cluster is a
+lookup rather than a search. A view's clusters are the components of the
+artists it shows, joined by any edge between two of them, hidden or not.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+class CollabAdjacency:
+    """Artists and collaborations of the network graph, indexed by position."""
+
+    def __init__(self, artists: list[str], edge_source: np.ndarray, edge_target: np.ndarray) -> None:
+        self.artists = list(artists)
+        self.artist_ids = {artist: i for i, artist in enumerate(self.artists)}
+        self.edge_source = np.asarray(edge_source, dtype=np.int32)
+        self.edge_target = np.asarray(edge_target, dtype=np.int32)
+        n_artists = len(self.artists)
+
+        # Both directions of each edge; a self-loop is listed once
+        edges = np.arange(len(self.edge_source), dtype=np.int32)
+        distinct = self.edge_source != self.edge_target
+        entry_artists = np.concatenate([self.edge_source, self.edge_target[distinct]])
+        entry_neighbors = np.concatenate([self.edge_target, self.edge_source[distinct]])
+        entry_edges = np.concatenate([edges, edges[distinct]])
+        order = np.lexsort((entry_edges, entry_artists))
+
+        counts = np.bincount(entry_artists, minlength=n_artists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+        self.neighbor_ids = entry_neighbors[order]
+        self.edge_ids = entry_edges[order]
+
+    @classmethod
+    def from_graph(cls, G) -> "CollabAdjacency":
+        """Number a networkx graph's nodes and edges in its own iteration order."""
+        artists = list(G.nodes)
+        artist_ids = {artist: i for i, artist in enumerate(artists)}
+        edges = [(artist_ids[source], artist_ids[target]) for source, target in G.edges()]
+        edge_source = np.array([source for source, _ in edges], dtype=np.int32)
+        edge_target = np.array([target for _, target in edges], dtype=np.int32)
+        return cls(artists, edge_source, edge_target)
+
+    def __contains__(self, artist: object) -> bool:
+        return artist in self.artist_ids
+
+    def __len__(self) -> int:
+        return len(self.artists)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_source)
+
+    def artist_id(self, artist: str) -> int:
+        try:
+            return self.artist_ids[artist]
+        except KeyError:
+            raise KeyError(f"Unknown artist: {artist!r}") from None
+
+    def neighbor_rows(self, artist: str) -> np.ndarray:
+        """Ids of the artist's neighbours, in edge order."""
+        artist_id = self.artist_id(artist)
+        return self.neighbor_ids[self.offsets[artist_id]:self.offsets[artist_id + 1]]
+
+    def neighbors(self, artist: str) -> list[str]:
+        return [self.artists[i] for i in self.neighbor_rows(artist).tolist()]
+
+    def degree(self, artist: str) -> int:
+        artist_id = self.artist_id(artist)
+        return int(self.offsets[artist_id + 1] - self.offsets[artist_id])
+
+    def incident_edges(self, artist: str) -> np.ndarray:
+        """Edge ids touching the artist, ascending."""
+        artist_id = self.artist_id(artist)
+        return self.edge_ids[self.offsets[artist_id]:self.offsets[artist_id + 1]]
+
+    def matrix(self, edge_mask: np.ndarray | None = None) -> sparse.csr_matrix:
+        """Symmetric artist x artist matrix of the edges (those in ``edge_mask`` only, if given)."""
+        data = np.ones(len(self.neighbor_ids), dtype=np.int8)
+        if edge_mask is not None:
+            data = np.asarray(edge_mask, dtype=np.int8)[self.edge_ids]
+        # Copied, since dropping the masked-out entries edits the index arrays in place
+        matrix = sparse.csr_matrix((data, self.neighbor_ids, self.offsets), shape=(len(self), len(self)), copy=True)
+        matrix.eliminate_zeros()
+        return matrix
+
+    def hop_distances(self, artist: str, max_hops: int | None = None, edge_mask: np.ndarray | None = None) -> np.ndarray:
+        """Hops from the artist to every artist, -1 where it is unreachable (or further than ``max_hops``)."""
+        distances = csgraph.dijkstra(
+            self.matrix(edge_mask),
+            directed=False,
+            indices=self.artist_id(artist),
+            unweighted=True,
+            limit=np.inf if max_hops is None else max_hops,
+        )
+        return np.where(np.isinf(distances), -1, distances).astype(np.int32)
+
+    def k_hop(self, artist: str, k: int, edge_mask: np.ndarray | None = None) -> list[str]:
+        """Artists within ``k`` hops of the artist (not counting it), nearest first."""
+        distances = self.hop_distances(artist, k, edge_mask)
+        reached = np.flatnonzero(distances > 0)
+        reached = reached[np.argsort(distances[reached], kind="stable")]
+        return [self.artists[i] for i in reached.tolist()]
+
+    def components(self, edge_mask: np.ndarray | None = None) -> np.ndarray:
+        """Connected-component label per artist, numbered in artist order.
+
+        With ``edge_mask`` only the masked edges connect artists, and artists
+        left without any of them are labelled -1.
+        """
+        _, labels = csgraph.connected_components(self.matrix(edge_mask), directed=False)
+        if edge_mask is None:
+            kept = np.ones(len(self), dtype=bool)
+        else:
+            kept = np.zeros(len(self), dtype=bool)
+            kept[self.edge_source[edge_mask]] = True
+            kept[self.edge_target[edge_mask]] = True
+
+        # Renumber by each component's first artist
+        _, first, inverse = np.unique(labels[kept], return_index=True, return_inverse=True)
+        result = np.full(len(self), -1, dtype=np.int32)
+        result[kept] = np.argsort(np.argsort(first))[inverse]
+        return result
+
+    def induced_edges(self, edge_mask: np.ndarray) -> np.ndarray:
+        """Mask of every edge between two artists that the masked edges touch."""
+        touched = np.zeros(len(self), dtype=bool)
+        touched[self.edge_source[edge_mask]] = True
+        touched[self.edge_target[edge_mask]] = True
+        return touched[self.edge_source] & touched[self.edge_target]
+
+    def component(self, artist: str, edge_mask: np.ndarray | None = None) -> list[str]:
+        """Artists in the same connected component as the artist, including it."""
+        labels = self.components(edge_mask)
+        label = labels[self.artist_id(artist)]
+        if label < 0:
+            return []
+        return [self.artists[i] for i in np.flatnonzero(labels == label).tolist()]
+
+    def page_data(self, views: dict[str, np.ndarray]) -> dict:
+        """JSON-ready arrays for the network page, with component labels per view edge mask.
+
+        Labels are computed over ``induced_edges`` of each mask, as the page
+        focuses the artists connected to the clicked one among those shown.
+        """
+        return {
+            "artists": self.artists,
+            "offsets": self.offsets.tolist(),
+            "neighbors": self.neighbor_ids.tolist(),
+            "edgeIds": self.edge_ids.tolist(),
+            "edgeSource": self.edge_source.tolist(),
+            "edgeTarget": self.edge_target.tolist(),
+            "components": {key: self.components(self.induced_edges(mask)).tolist() for key, mask in views.items()},
+        }
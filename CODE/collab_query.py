@@ -0,0 +1,273 @@
+"""Indexed queries over the collaboration predictions.
+
+``CollabIndex`` loads the predictions once and precomputes everything the
+map server, the static map builder and the graph builder ask for:
+
+* integer artist ids, assigned in descending order of total revenue
+* artist -> pair-row postings
+* per-market pair rankings and per-artist market breakdowns
+* per-artist partner rankings
+
+After that, a query is an array lookup or slice::
+
+    index = CollabIndex.from_csv()
+    index.top_partners("Farruko", k=5)
+    index.top_pairs("us", k=10)
+    index.market_breakdown("Farruko")
+"""
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_CSV_PATH = Path(__file__).resolve().parent / "assets" / "artist_collaboration_predictions_by_market.csv"
+
+# Market order matches the column order the map pages melt, so sums are
+# accumulated in the same order as they were before the index existed
+MARKET_CODES = ("us", "jp", "fr", "gb", "ca", "br", "de", "au")
+OVERALL = "overall"
+STREAMS = "streams"
+
+
+class MarketRevenue(NamedTuple):
+    market: str
+    revenue: float
+    collaborations: int
+
+
+class PairRevenue(NamedTuple):
+    artist_1: str
+    artist_2: str
+    revenue: float
+
+
+def descending_order(values: np.ndarray) -> np.ndarray:
+    # Same permutation as DataFrame.sort_values(ascending=False), including the
+    # order it leaves tied values in, so rankings match the pandas ones.
+    reverse_order = np.argsort(values[::-1], kind="quicksort")
+    return (len(values) - 1 - reverse_order)[::-1]
+
+
+def revenue_column(market: str) -> str:
+    return f"predicted_revenue_{market}"
+
+
+def check_revenue_ranking(market: str) -> str:
+    # Pairs are returned with their revenue, which a ranking by streams doesn't give
+    if market == STREAMS:
+        raise ValueError("Pairs carry revenue, not streams; use top_pair_frame('streams') for the top pairs by streams")
+    return market
+
+
+def drop_unnamed_pairs(df: pd.DataFrame) -> pd.DataFrame:
+    """The prediction rows whose artists both have a name, renumbered from 0."""
+    named = pd.Series(True, index=df.index)
+    for column in ("artist_1_name", "artist_2_name"):
+        named &= df[column].notna() & df[column].astype(str).str.strip().ne("")
+    if named.all():
+        return df
+    return df[named].reset_index(drop=True)
+
+
+def rank_artists(df: pd.DataFrame, markets: tuple[str, ...] = MARKET_CODES) -> list[str]:
+    """Artists by total revenue, highest first; the order ``CollabIndex`` numbers them in.
+
+    Revenue is summed per artist in the same order as grouping the predictions
+    melted by market would, but grouped by integer codes (in name order, as
+    the groupby sorts names) rather than by the names themselves.
+    """
+    codes, names = pd.factorize(pd.concat([df["artist_1_name"], df["artist_2_name"]], ignore_index=True), sort=True)
+    # Market by market, pairs in row order
+    revenue = pd.Series(df[[revenue_column(market) for market in markets]].to_numpy().T.ravel())
+    totals = []
+    for artist_codes in (codes[:len(df)], codes[len(df):]):
+        melted_codes = np.tile(artist_codes, len(markets))
+        named = melted_codes >= 0
+        totals.append(revenue[named].groupby(melted_codes[named]).sum())
+    total_revenue = totals[0].add(totals[1], fill_value=0)
+    return names[total_revenue.sort_values(ascending=False).index].tolist()
+
+
+class CollabIndex:
+    """Predictions indexed by artist and market.
+
+    Rows with a blank or missing artist name are dropped, so ``predictions``
+    and the pair rows refer to the remaining rows.
+    """
+
+    def __init__(self, df: pd.DataFrame, markets: tuple[str, ...] = MARKET_CODES) -> None:
+        df = drop_unnamed_pairs(df)
+        self.predictions = df
+        self.markets = tuple(markets)
+        self.market_ids = {market: i for i, market in enumerate(self.markets)}
+
+        market_cols = [revenue_column(market) for market in self.markets]
+        melted_df = df.melt(
+            id_vars=["artist_1_name", "artist_2_name"],
+            value_vars=market_cols,
+            var_name="market",
+            value_name="revenue",
+        )
+
+        # Artist ids follow total revenue, highest first
+        self.artists = rank_artists(df, self.markets)
+        self.artist_ids = {artist: i for i, artist in enumerate(self.artists)}
+        n_artists = len(self.artists)
+
+        # Pair rows, with both artists as integer ids
+        n_pairs = len(df)
+        self.pair_artist_1 = df["artist_1_name"].map(self.artist_ids).to_numpy(dtype=np.int32)
+        self.pair_artist_2 = df["artist_2_name"].map(self.artist_ids).to_numpy(dtype=np.int32)
+        self.pair_revenue = df[market_cols].to_numpy(dtype=np.float64)
+        self.pair_revenue_overall = df[revenue_column(OVERALL)].to_numpy(dtype=np.float64)
+        self.pair_streams = df["predicted_streams"].to_numpy(dtype=np.float64)
+
+        # Artist -> ascending pair rows; a pair of an artist with itself is listed once
+        rows = np.arange(n_pairs)
+        distinct = self.pair_artist_2 != self.pair_artist_1
+        posting_artists = np.concatenate([self.pair_artist_1, self.pair_artist_2[distinct]])
+        posting_rows = np.concatenate([rows, rows[distinct]])
+        order = np.lexsort((posting_rows, posting_artists))
+        counts = np.bincount(posting_artists, minlength=n_artists)
+        self.artist_pair_rows = np.split(posting_rows[order], np.cumsum(counts)[:-1])
+
+        # Pair rows ranked within each market, overall and by streams
+        self.rankings = {market: descending_order(self.pair_revenue[:, i]) for i, market in enumerate(self.markets)}
+        self.rankings[OVERALL] = descending_order(self.pair_revenue_overall)
+        self.rankings[STREAMS] = descending_order(self.pair_streams)
+        self.market_totals = dict(zip(self.markets, self.pair_revenue.sum(axis=0).tolist()))
+        self.market_totals[OVERALL] = float(self.pair_revenue_overall.sum())
+
+        # Long-form (artist, pair, market) rows in melted order, so the grouped
+        # sums add values in the same order as filtering each artist would
+        as_artist_1 = melted_df.assign(artist=melted_df["artist_1_name"])
+        as_artist_2 = melted_df[melted_df["artist_2_name"] != melted_df["artist_1_name"]].assign(
+            artist=melted_df["artist_2_name"]
+        )
+        long_df = pd.concat([as_artist_1, as_artist_2]).sort_index(kind="stable")
+        long_df["artist_id"] = long_df["artist"].map(self.artist_ids)
+        long_df["market_id"] = long_df["market"].map({column: i for i, column in enumerate(market_cols)})
+
+        artist_totals = long_df.groupby("artist_id")["revenue"].sum()
+        self.artist_totals = artist_totals.reindex(range(n_artists), fill_value=0.0).to_numpy()
+
+        market_totals = long_df.groupby(["artist_id", "market_id"])["revenue"].agg(revenue="sum", pairs="size")
+        self.artist_market_revenue = np.zeros((n_artists, len(self.markets)))
+        self.artist_market_pairs = np.zeros((n_artists, len(self.markets)), dtype=np.int32)
+        artist_index = market_totals.index.get_level_values("artist_id")
+        market_index = market_totals.index.get_level_values("market_id")
+        self.artist_market_revenue[artist_index, market_index] = market_totals["revenue"].to_numpy()
+        self.artist_market_pairs[artist_index, market_index] = market_totals["pairs"].to_numpy()
+
+        # Partners ranked by revenue summed over markets. Pairs are grouped by
+        # name, so a pair listed twice in the predictions counts once.
+        pair_totals = (
+            long_df.groupby(["artist_id", "artist_1_name", "artist_2_name"])["revenue"]
+            .sum()
+            .reset_index()
+        )
+        self.partner_artist_1 = pair_totals["artist_1_name"].to_numpy()
+        self.partner_artist_2 = pair_totals["artist_2_name"].to_numpy()
+        self.partner_revenue = pair_totals["revenue"].to_numpy()
+        partner_rows = pair_totals.groupby("artist_id").indices
+        self.artist_partner_rows = [
+            partner_rows[i][descending_order(self.partner_revenue[partner_rows[i]])]
+            for i in range(n_artists)
+        ]
+
+    @classmethod
+    def from_csv(cls, file_path: Path = DEFAULT_CSV_PATH, markets: tuple[str, ...] = MARKET_CODES) -> "CollabIndex":
+        return cls(pd.read_csv(file_path), markets=markets)
+
+    def __contains__(self, artist: object) -> bool:
+        return artist in self.artist_ids
+
+    def __len__(self) -> int:
+        return len(self.artists)
+
+    def artist_id(self, artist: str) -> int:
+        try:
+            return self.artist_ids[artist]
+        except KeyError:
+            raise KeyError(f"Unknown artist: {artist!r}") from None
+
+    def market_id(self, market: str) -> int:
+        try:
+            return self.market_ids[market]
+        except KeyError:
+            raise KeyError(f"Unknown market: {market!r}") from None
+
+    def total_revenue(self, artist: str) -> np.float64:
+        """Revenue summed over every market and pair the artist is in."""
+        return self.artist_totals[self.artist_id(artist)]
+
+    def collaboration_count(self, artist: str) -> int:
+        return len(self.artist_partner_rows[self.artist_id(artist)])
+
+    def pair_rows(self, artist: str) -> np.ndarray:
+        """Positions in ``predictions`` of every pair the artist is in, ascending."""
+        return self.artist_pair_rows[self.artist_id(artist)]
+
+    def market_breakdown(self, artist: str) -> list[MarketRevenue]:
+        """Revenue and number of pairs per market, in ``markets`` order."""
+        artist_id = self.artist_id(artist)
+        return [
+            MarketRevenue(market, revenue, pairs)
+            for market, revenue, pairs in zip(
+                self.markets,
+                self.artist_market_revenue[artist_id].tolist(),
+                self.artist_market_pairs[artist_id].tolist(),
+            )
+        ]
+
+    def top_partners(self, artist: str, k: int = 10, market: str | None = None) -> list[PairRevenue]:
+        """The artist's ``k`` highest-revenue pairs, in total or in one market."""
+        if market is None:
+            rows = self.artist_partner_rows[self.artist_id(artist)][:k]
+            return [
+                PairRevenue(*pair)
+                for pair in zip(
+                    self.partner_artist_1[rows].tolist(),
+                    self.partner_artist_2[rows].tolist(),
+                    self.partner_revenue[rows].tolist(),
+                )
+            ]
+
+        rows = self.pair_rows(artist)
+        revenue = self.pair_revenue[rows, self.market_id(market)]
+        return self.pairs(rows[descending_order(revenue)[:k]], market)
+
+    def top_pair_rows(self, ranking: str = OVERALL, k: int = 10) -> np.ndarray:
+        """Positions in ``predictions`` of the top ``k`` pairs by a market, ``overall`` or ``streams``."""
+        try:
+            return self.rankings[ranking][:k]
+        except KeyError:
+            raise KeyError(f"Unknown ranking: {ranking!r}") from None
+
+    def top_pair_frame(self, ranking: str = OVERALL, k: int = 10) -> pd.DataFrame:
+        """The prediction rows of the top ``k`` pairs by a market, ``overall`` or ``streams``."""
+        return self.predictions.iloc[self.top_pair_rows(ranking, k)]
+
+    def top_pairs(self, market: str = OVERALL, k: int = 10) -> list[PairRevenue]:
+        """The ``k`` highest-revenue pairs in a market or ``overall``."""
+        return self.pairs(self.top_pair_rows(market, k), market)
+
+    def pairs(self, rows: np.ndarray, market: str = OVERALL) -> list[PairRevenue]:
+        check_revenue_ranking(market)
+        revenue = self.pair_revenue_overall if market == OVERALL else self.pair_revenue[:, self.market_id(market)]
+        return [
+            PairRevenue(self.artists[artist_1], self.artists[artist_2], pair_revenue)
+            for artist_1, artist_2, pair_revenue in zip(
+                self.pair_artist_1[rows].tolist(),
+                self.pair_artist_2[rows].tolist(),
+                revenue[rows].tolist(),
+            )
+        ]
+
+    def market_total(self, market: str = OVERALL) -> float:
+        try:
+            return self.market_totals[market]
+        except KeyError:
+            raise KeyError(f"Unknown market: {market!r}") from None
@@ -0,0 +1,437 @@
+"""SQLite-backed prediction store with the query interface of ``CollabIndex``.
+
+The flat CSV has to be read in full before the first query. The store keeps
+the predictions in indexed tables instead, so an artist view reads only that
+artist's rows::
+
+    python collab_store.py                      # load the predictions CSV
+    python choropleth_map_artist_collaboration.py --db assets/artist_collaboration_predictions.sqlite
+
+Schema:
+
+* ``artists``: integer ids in descending order of total revenue, as ``CollabIndex`` assigns them
+* ``markets``: one row per market, with its total revenue and CSV column position
+* ``pairs``: both artists as ids, streams, overall revenue, and revenue summed over markets
+* ``artist_pairs``: artist -> pair postings, clustered by artist
+* ``pair_market_revenue``: long-form revenue per pair and market, indexed on (market, revenue)
+
+As in ``CollabIndex``, a pair listed twice in the predictions counts once
+among an artist's collaborations and partners, with its revenue summed.
+``python collab_store.py --check`` compares the loaded store with
+``CollabIndex``, also on a copy of the predictions with a pair duplicated.
+"""
+import argparse
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from collab_query import (
+    DEFAULT_CSV_PATH,
+    MARKET_CODES,
+    OVERALL,
+    STREAMS,
+    CollabIndex,
+    MarketRevenue,
+    PairRevenue,
+    check_revenue_ranking,
+    drop_unnamed_pairs,
+    rank_artists,
+    revenue_column,
+)
+
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / "assets" / "artist_collaboration_predictions.sqlite"
+# Rows inserted per transaction during a bulk load
+BATCH_SIZE = 50_000
+
+SCHEMA = """
+CREATE TABLE artists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    total_revenue REAL NOT NULL
+);
+CREATE TABLE markets (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    column_position INTEGER NOT NULL,
+    total_revenue REAL NOT NULL
+);
+CREATE TABLE pairs (
+    id INTEGER PRIMARY KEY,
+    artist_1_id INTEGER NOT NULL REFERENCES artists (id),
+    artist_2_id INTEGER NOT NULL REFERENCES artists (id),
+    predicted_streams REAL NOT NULL,
+    revenue_overall REAL NOT NULL,
+    revenue_markets REAL NOT NULL
+);
+CREATE TABLE artist_pairs (
+    artist_id INTEGER NOT NULL,
+    pair_id INTEGER NOT NULL,
+    PRIMARY KEY (artist_id, pair_id)
+) WITHOUT ROWID;
+CREATE TABLE pair_market_revenue (
+    pair_id INTEGER NOT NULL,
+    market_id INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (pair_id, market_id)
+) WITHOUT ROWID;
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value
+) WITHOUT ROWID;
+"""
+
+# Built after the bulk insert, which is much faster than maintaining them per row
+INDEXES = """
+CREATE INDEX pair_market_revenue_rank ON pair_market_revenue (market_id, revenue DESC);
+CREATE INDEX pairs_revenue_overall ON pairs (revenue_overall DESC);
+CREATE INDEX pairs_predicted_streams ON pairs (predicted_streams DESC);
+"""
+
+RANKING_COLUMNS = {OVERALL: "revenue_overall", STREAMS: "predicted_streams"}
+
+
+def revenue_markets(df: pd.DataFrame) -> list[str]:
+    """Market codes of the per-market revenue columns, known markets in ``MARKET_CODES`` order first."""
+    prefix = revenue_column("")
+    markets = [col[len(prefix):] for col in df.columns if col.startswith(prefix) and col != revenue_column(OVERALL)]
+    return sorted(markets, key=lambda market: MARKET_CODES.index(market) if market in MARKET_CODES else len(MARKET_CODES))
+
+
+def bulk_load(df: pd.DataFrame, db_path: Path = DEFAULT_DB_PATH, batch_size: int = BATCH_SIZE) -> Path:
+    """Write the predictions into a fresh store, replacing ``db_path`` atomically.
+
+    Rows with a blank or missing artist name are left out, as in ``CollabIndex``.
+    """
+    df = drop_unnamed_pairs(df)
+    markets = revenue_markets(df)
+    column_positions = [df.columns.get_loc(revenue_column(market)) for market in markets]
+    n_pairs = len(df)
+
+    # Integer artist ids, highest total revenue first, numbered as CollabIndex numbers them
+    ranked = rank_artists(df, tuple(markets))
+    artist_ids = {artist: i for i, artist in enumerate(ranked)}
+    names = np.array(ranked, dtype=object)
+    revenue = df[[revenue_column(market) for market in markets]].to_numpy(dtype=np.float64)
+    pair_revenue = revenue.sum(axis=1)
+    artist_1 = df["artist_1_name"].map(artist_ids).to_numpy(dtype=np.int64)
+    artist_2 = df["artist_2_name"].map(artist_ids).to_numpy(dtype=np.int64)
+    distinct = artist_2 != artist_1
+    totals = (
+        np.bincount(artist_1, pair_revenue, minlength=len(names))
+        + np.bincount(artist_2[distinct], pair_revenue[distinct], minlength=len(names))
+    )
+
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        with connection:
+            connection.executemany(
+                "INSERT INTO artists VALUES (?, ?, ?)",
+                zip(range(len(names)), names.tolist(), totals.tolist()),
+            )
+            connection.executemany(
+                "INSERT INTO markets VALUES (?, ?, ?, ?)",
+                zip(range(len(markets)), markets, column_positions, revenue.sum(axis=0).tolist()),
+            )
+            connection.execute(
+                "INSERT INTO metadata VALUES ('overall_revenue', ?)",
+                (float(df[revenue_column(OVERALL)].sum()),),
+            )
+
+        streams = df["predicted_streams"].to_numpy(dtype=np.float64)
+        overall = df[revenue_column(OVERALL)].to_numpy(dtype=np.float64)
+        market_ids = np.arange(len(markets))
+        for start in range(0, n_pairs, batch_size):
+            stop = min(start + batch_size, n_pairs)
+            pair_ids = np.arange(start, stop)
+            with connection:
+                connection.executemany(
+                    "INSERT INTO pairs VALUES (?, ?, ?, ?, ?, ?)",
+                    zip(
+                        pair_ids.tolist(),
+                        artist_1[start:stop].tolist(),
+                        artist_2[start:stop].tolist(),
+                        streams[start:stop].tolist(),
+                        overall[start:stop].tolist(),
+                        pair_revenue[start:stop].tolist(),
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO pair_market_revenue VALUES (?, ?, ?)",
+                    zip(
+                        np.repeat(pair_ids, len(markets)).tolist(),
+                        np.tile(market_ids, stop - start).tolist(),
+                        revenue[start:stop].ravel().tolist(),
+                    ),
+                )
+
+        with connection:
+            # A pair of an artist with itself is listed once
+            connection.execute("""
+                INSERT INTO artist_pairs
+                SELECT artist_1_id, id FROM pairs
+                UNION
+                SELECT artist_2_id, id FROM pairs
+                ORDER BY 1, 2
+            """)
+        connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, db_path)
+    return db_path
+
+
+class SqliteCollabStore:
+    """Query a store written by ``bulk_load`` with the same methods as ``CollabIndex``.
+
+    Each thread (and each process after a fork) opens its own read-only
+    connection. Only artist names and market codes are held in memory.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH) -> None:
+        self.db_path = Path(db_path).resolve()
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"No prediction store at {self.db_path}")
+        self._local = threading.local()
+
+        connection = self.connection()
+        self.artists = [name for (name,) in connection.execute("SELECT name FROM artists ORDER BY id")]
+        self.artist_ids = {artist: i for i, artist in enumerate(self.artists)}
+        market_rows = connection.execute("SELECT code, total_revenue FROM markets ORDER BY id").fetchall()
+        self.markets = tuple(code for code, _ in market_rows)
+        self.market_ids = {market: i for i, market in enumerate(self.markets)}
+        self.market_totals = dict(market_rows)
+        # Market revenue columns in the order the predictions CSV had them
+        self.market_columns = [
+            revenue_column(code)
+            for (code,) in connection.execute("SELECT code FROM markets ORDER BY column_position")
+        ]
+        (self.market_totals[OVERALL],) = connection.execute(
+            "SELECT value FROM metadata WHERE key = 'overall_revenue'"
+        ).fetchone()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def __contains__(self, artist: object) -> bool:
+        return artist in self.artist_ids
+
+    def __len__(self) -> int:
+        return len(self.artists)
+
+    def artist_id(self, artist: str) -> int:
+        try:
+            return self.artist_ids[artist]
+        except KeyError:
+            raise KeyError(f"Unknown artist: {artist!r}") from None
+
+    def market_id(self, market: str) -> int:
+        try:
+            return self.market_ids[market]
+        except KeyError:
+            raise KeyError(f"Unknown market: {market!r}") from None
+
+    def total_revenue(self, artist: str) -> float:
+        (total,) = self.connection().execute(
+            "SELECT total_revenue FROM artists WHERE id = ?", (self.artist_id(artist),)
+        ).fetchone()
+        return total
+
+    def collaboration_count(self, artist: str) -> int:
+        # A pair listed more than once counts once
+        (count,) = self.connection().execute("""
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT p.artist_1_id, p.artist_2_id
+                FROM artist_pairs AS ap
+                JOIN pairs AS p ON p.id = ap.pair_id
+                WHERE ap.artist_id = ?
+            )
+        """, (self.artist_id(artist),)).fetchone()
+        return count
+
+    def market_breakdown(self, artist: str) -> list[MarketRevenue]:
+        rows = self.connection().execute("""
+            SELECT r.market_id, SUM(r.revenue), COUNT(*)
+            FROM artist_pairs AS ap
+            JOIN pair_market_revenue AS r ON r.pair_id = ap.pair_id
+            WHERE ap.artist_id = ?
+            GROUP BY r.market_id
+        """, (self.artist_id(artist),))
+        totals = {market_id: (revenue, pairs) for market_id, revenue, pairs in rows}
+        return [
+            MarketRevenue(market, *totals.get(market_id, (0.0, 0)))
+            for market_id, market in enumerate(self.markets)
+        ]
+
+    def top_partners(self, artist: str, k: int = 10, market: str | None = None) -> list[PairRevenue]:
+        if market is None:
+            # Rows of the same pair are merged and their revenue summed
+            rows = self.connection().execute("""
+                SELECT p.artist_1_id, p.artist_2_id, SUM(p.revenue_markets)
+                FROM artist_pairs AS ap
+                JOIN pairs AS p ON p.id = ap.pair_id
+                WHERE ap.artist_id = ?
+                GROUP BY p.artist_1_id, p.artist_2_id
+                ORDER BY SUM(p.revenue_markets) DESC, MIN(p.id)
+                LIMIT ?
+            """, (self.artist_id(artist), k))
+        else:
+            rows = self.connection().execute("""
+                SELECT p.artist_1_id, p.artist_2_id, r.revenue
+                FROM artist_pairs AS ap
+                JOIN pairs AS p ON p.id = ap.pair_id
+                JOIN pair_market_revenue AS r ON r.pair_id = ap.pair_id AND r.market_id = ?
+                WHERE ap.artist_id = ?
+                ORDER BY r.revenue DESC, p.id
+                LIMIT ?
+            """, (self.market_id(market), self.artist_id(artist), k))
+        return self.named_pairs(rows)
+
+    def top_pairs(self, market: str = OVERALL, k: int = 10) -> list[PairRevenue]:
+        if check_revenue_ranking(market) == OVERALL:
+            rows = self.connection().execute("""
+                SELECT artist_1_id, artist_2_id, revenue_overall
+                FROM pairs
+                ORDER BY revenue_overall DESC, id
+                LIMIT ?
+            """, (k,))
+        else:
+            rows = self.connection().execute("""
+                SELECT p.artist_1_id, p.artist_2_id, r.revenue
+                FROM pair_market_revenue AS r
+                JOIN pairs AS p ON p.id = r.pair_id
+                WHERE r.market_id = ?
+                ORDER BY r.revenue DESC, r.pair_id
+                LIMIT ?
+            """, (self.market_id(market), k))
+        return self.named_pairs(rows)
+
+    def top_pair_frame(self, ranking: str = OVERALL, k: int = 10) -> pd.DataFrame:
+        """The top ``k`` pairs by a market, ``overall`` or ``streams`` as prediction columns."""
+        connection = self.connection()
+        if ranking in RANKING_COLUMNS:
+            pair_ids = [pair_id for (pair_id,) in connection.execute(
+                f"SELECT id FROM pairs ORDER BY {RANKING_COLUMNS[ranking]} DESC, id LIMIT ?", (k,)
+            )]
+        else:
+            pair_ids = [pair_id for (pair_id,) in connection.execute(
+                "SELECT pair_id FROM pair_market_revenue WHERE market_id = ? ORDER BY revenue DESC, pair_id LIMIT ?",
+                (self.market_id(ranking), k),
+            )]
+
+        if not pair_ids:
+            return pd.DataFrame(columns=["artist_1_name", "artist_2_name", "predicted_streams", revenue_column(OVERALL)])
+
+        placeholders = ", ".join("?" * len(pair_ids))
+        pairs = pd.DataFrame(
+            connection.execute(
+                f"SELECT id, artist_1_id, artist_2_id, predicted_streams, revenue_overall FROM pairs WHERE id IN ({placeholders})",
+                pair_ids,
+            ).fetchall(),
+            columns=["id", "artist_1_id", "artist_2_id", "predicted_streams", revenue_column(OVERALL)],
+        ).set_index("id")
+        market_revenue = pd.DataFrame(
+            connection.execute(
+                f"SELECT pair_id, market_id, revenue FROM pair_market_revenue WHERE pair_id IN ({placeholders})",
+                pair_ids,
+            ).fetchall(),
+            columns=["pair_id", "market_id", "revenue"],
+        ).pivot(index="pair_id", columns="market_id", values="revenue")
+        market_revenue.columns = [revenue_column(self.markets[market_id]) for market_id in market_revenue.columns]
+
+        frame = pairs.join(market_revenue[self.market_columns]).loc[pair_ids]
+        artists = np.array(self.artists, dtype=object)
+        frame.insert(0, "artist_1_name", artists[frame.pop("artist_1_id").to_numpy()])
+        frame.insert(1, "artist_2_name", artists[frame.pop("artist_2_id").to_numpy()])
+        return frame.reset_index(drop=True)
+
+    def market_total(self, market: str = OVERALL) -> float:
+        try:
+            return self.market_totals[market]
+        except KeyError:
+            raise KeyError(f"Unknown market: {market!r}") from None
+
+    def named_pairs(self, rows) -> list[PairRevenue]:
+        return [PairRevenue(self.artists[artist_1], self.artists[artist_2], revenue) for artist_1, artist_2, revenue in rows]
+
+
+def same_pairs(store_pairs: list[PairRevenue], index_pairs: list[PairRevenue]) -> bool:
+    # Tied pairs may come out in a different order, so pairs are compared as sorted lists
+    store_pairs, index_pairs = sorted(store_pairs), sorted(index_pairs)
+    return len(store_pairs) == len(index_pairs) and all(
+        (a.artist_1, a.artist_2) == (b.artist_1, b.artist_2) and math.isclose(a.revenue, b.revenue, rel_tol=1e-9)
+        for a, b in zip(store_pairs, index_pairs)
+    )
+
+
+def compare_with_index(store: SqliteCollabStore, index: CollabIndex) -> list[str]:
+    """Every artist query on which the store and the index disagree, as messages."""
+    differences = []
+    if store.artists != index.artists:
+        differences.append("artist order")
+    for artist in index.artists:
+        k = len(index.pair_rows(artist))
+        if store.collaboration_count(artist) != index.collaboration_count(artist):
+            differences.append(f"{artist}: collaboration count")
+        if not math.isclose(store.total_revenue(artist), index.total_revenue(artist), rel_tol=1e-9):
+            differences.append(f"{artist}: total revenue")
+        for market in (None, *index.markets):
+            if not same_pairs(store.top_partners(artist, k, market), index.top_partners(artist, k, market)):
+                differences.append(f"{artist}: top partners in {market or OVERALL}")
+        for stored, indexed in zip(store.market_breakdown(artist), index.market_breakdown(artist)):
+            if stored.collaborations != indexed.collaborations or not math.isclose(stored.revenue, indexed.revenue, rel_tol=1e-9):
+                differences.append(f"{artist}: {indexed.market} breakdown")
+    return differences
+
+
+def check_store(df: pd.DataFrame, db_path: Path) -> bool:
+    """Compare the store with ``CollabIndex``, then again with the first pair listed twice."""
+    duplicated = pd.concat([df, df.iloc[:1]], ignore_index=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        duplicated_db = bulk_load(duplicated, Path(tmp_dir) / "duplicated.sqlite")
+        results = {
+            "predictions": compare_with_index(SqliteCollabStore(db_path), CollabIndex(df)),
+            "with a duplicated pair": compare_with_index(SqliteCollabStore(duplicated_db), CollabIndex(duplicated)),
+        }
+    for label, differences in results.items():
+        print(f"Store vs CollabIndex, {label}: {len(differences)} differences")
+        for difference in differences[:10]:
+            print(f"  {difference}")
+    return not any(results.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load the predictions CSV into the SQLite store.")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV_PATH)
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows inserted per transaction")
+    parser.add_argument("--check", action="store_true", help="Compare the loaded store's answers with CollabIndex")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df = pd.read_csv(args.csv)
+    bulk_load(df, args.db, args.batch_size)
+    print(f"Loaded {len(df):,} pairs into {args.db} in {time.perf_counter() - started:.2f}s")
+    if args.check and not check_store(df, args.db):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,24 @@
-import pandas as pd
-import networkx as nx
-from pyvis.network import Network
+import argparse
+import json
+import sys
 from pathlib import Path
 
-# Load data
-file_path = "assets/artist_collaboration_predictions_by_market.csv"
-df = pd.read_csv(file_path)
+# collab_query (and with it pandas), collab_adjacency, networkx and pyvis are imported where
+# they are used so the build can import this module without paying for them
+# on cached runs.
 
-# Identify market columns
-market_cols = [col for col in df.columns if col.startswith("predicted_revenue_")]
+CODE_DIR = Path(__file__).resolve().parent
+DEFAULT_CSV_PATH = CODE_DIR / "assets" / "artist_collaboration_predictions_by_market.csv"
+DEFAULT_OUTPUT_PATH = CODE_DIR / "artist_collaborations.html"
+TEMPLATE_PATH = CODE_DIR / "assets" / "network_shell_template.html"
 
-# Sort data by predicted streams descending
-df_sorted = df.sort_values('predicted_streams', ascending=False)
-
-# Use top 150 rows
-top_150 = df_sorted.head(150)
-
-# Create artist scores (total revenue across all collaborations)
-artist_score = {}
-for _, row in top_150.iterrows():
-    rev = row['predicted_revenue_overall']
-    for artist in [row["artist_1_name"], row["artist_2_name"]]:
-        artist_score[artist] = artist_score.get(artist, 0) + rev
-
-# Calculate min and max revenue for scaling node sizes
-min_rev = min(artist_score.values())
-max_rev = max(artist_score.values())
-
-
-# Define a helper function for scaling node sizes
-def scale_size(revenue, min_rev, max_rev, min_size=10, max_size=30):
-    if max_rev == min_rev:
-        return (min_size + max_size) / 2
-    return min_size + (revenue - min_rev) / (max_rev - min_rev) * (max_size - min_size)
-
-
-# Create the graph
-G = nx.Graph()
-
-
-# Function to extract market codes
-def get_markets(row):
-    """Extract market codes where the artist is present."""
-    return [col.split("_")[2] for col in market_cols if row[col] > 2000]
-
-
-# Add nodes and edges with dynamic node sizes based on revenue
-for _, row in top_150.iterrows():
-    a1, a2 = row["artist_1_name"], row["artist_2_name"]
-    m1 = ",".join(get_markets(row))
-    m2 = ",".join(get_markets(row))
-
-    # Add artist 1 node with dynamic size
-    if a1 not in G:
-        G.add_node(a1,
-                   title=f"Artist: {a1}\nEstimated Revenue: ${artist_score[a1]:,.0f}\nMarkets: {m1}",
-                   color="#B3A369",
-                   font="black",
-                   size=scale_size(artist_score[a1], min_rev, max_rev),
-                   revenue=artist_score[a1],
-                   markets=m1)
-    # Add artist 2 node with dynamic size
-    if a2 not in G:
-        G.add_node(a2,
-                   title=f"Artist: {a2}\nEstimated Revenue: ${artist_score[a2]:,.0f}\nMarkets: {m2}",
-                   color="#B3A369",
-                   font="black",
-                   size=scale_size(artist_score[a2], min_rev, max_rev),
-                   revenue=artist_score[a2],
-                   markets=m2)
-    # Add edge with revenue attribute
-    G.add_edge(a1, a2,
-               value=row['predicted_streams'],
-               color="#001f3f",
-               title=f"Collaboration: {a1} & {a2}\nEstimated Revenue: ${row['predicted_revenue_overall']:,.0f}",
-               edge_revenue=row['predicted_revenue_overall'])
-
-# Update node titles with edge count
-for node in G.nodes():
-    G.nodes[node]['title'] += f"\nEdges: {G.degree(node)}"
-    G.nodes[node]['edge_count'] = G.degree(node)
-
-# Convert to Pyvis Network
-net = Network(height="100%", width="100%", notebook=True, bgcolor="white", font_color="black")
-net.from_nx(G)
+# Market and edge-count options of the page's filters (network_shell_template.html);
+# cluster membership is precomputed for each combination
+PAGE_MARKETS = ("all", "au", "br", "ca", "de", "fr", "gb", "jp", "us")
+PAGE_EDGE_COUNTS = (50, 75, 100, 125, 150)
 
 # Set physics options
-net.set_options("""
+PHYSICS_OPTIONS = """
 {
   "physics": {
     "enabled": true,
@@ -105,24 +37,244 @@ net.set_options("""
     "minVelocity": 0.1
   }
 }
-""")
+"""
+
+
+# Define a helper function for scaling node sizes
+def scale_size(revenue, min_rev, max_rev, min_size=10, max_size=30):
+    if max_rev == min_rev:
+        return (min_size + max_size) / 2
+    return min_size + (revenue - min_rev) / (max_rev - min_rev) * (max_size - min_size)
+
+
+# Function to extract market codes
+def get_markets(row, market_cols):
+    """Extract market codes where the artist is present."""
+    return [col.split("_")[2] for col in market_cols if row[col] > 2000]
+
+
+def build_graph(index, top_n=150):
+    """Build the collaboration graph from the top predicted pairs.
+
+    ``index`` is a CollabIndex or a SqliteCollabStore. Returns the graph with
+    the min and max artist revenue used to scale node sizes.
+    """
+    import networkx as nx
+
+    # Use the top 150 rows by predicted streams
+    top_150 = index.top_pair_frame("streams", top_n)
+
+    # Identify market columns
+    market_cols = [col for col in top_150.columns if col.startswith("predicted_revenue_")]
+
+    # Create artist scores (total revenue across all collaborations)
+    artist_score = {}
+    for _, row in top_150.iterrows():
+        rev = row['predicted_revenue_overall']
+        for artist in [row["artist_1_name"], row["artist_2_name"]]:
+            artist_score[artist] = artist_score.get(artist, 0) + rev
+
+    # Calculate min and max revenue for scaling node sizes
+    min_rev = min(artist_score.values())
+    max_rev = max(artist_score.values())
+
+    # Create the graph
+    G = nx.Graph()
+
+    # Add nodes and edges with dynamic node sizes based on revenue
+    for _, row in top_150.iterrows():
+        a1, a2 = row["artist_1_name"], row["artist_2_name"]
+        m1 = ",".join(get_markets(row, market_cols))
+        m2 = ",".join(get_markets(row, market_cols))
+
+        # Add artist 1 node with dynamic size
+        if a1 not in G:
+            G.add_node(a1,
+                       title=f"Artist: {a1}\nEstimated Revenue: ${artist_score[a1]:,.0f}\nMarkets: {m1}",
+                       color="#B3A369",
+                       font="black",
+                       size=scale_size(artist_score[a1], min_rev, max_rev),
+                       revenue=artist_score[a1],
+                       markets=m1)
+        # Add artist 2 node with dynamic size
+        if a2 not in G:
+            G.add_node(a2,
+                       title=f"Artist: {a2}\nEstimated Revenue: ${artist_score[a2]:,.0f}\nMarkets: {m2}",
+                       color="#B3A369",
+                       font="black",
+                       size=scale_size(artist_score[a2], min_rev, max_rev),
+                       revenue=artist_score[a2],
+                       markets=m2)
+        # Add edge with revenue attribute
+        G.add_edge(a1, a2,
+                   value=row['predicted_streams'],
+                   color="#001f3f",
+                   title=f"Collaboration: {a1} & {a2}\nEstimated Revenue: ${row['predicted_revenue_overall']:,.0f}",
+                   edge_revenue=row['predicted_revenue_overall'])
+
+    # Update node titles with edge count
+    for node in G.nodes():
+        G.nodes[node]['title'] += f"\nEdges: {G.degree(node)}"
+        G.nodes[node]['edge_count'] = G.degree(node)
+
+    return G, min_rev, max_rev
+
+
+def market_edges(G, adjacency):
+    """Ascending edge positions per market: the edges where either artist is tagged with it."""
+    node_markets = [{market.strip() for market in G.nodes[artist]["markets"].split(",")} for artist in adjacency.artists]
+    edges = list(zip(adjacency.edge_source.tolist(), adjacency.edge_target.tolist()))
+    return {
+        market: [
+            edge for edge, (source, target) in enumerate(edges)
+            if market in node_markets[source] or market in node_markets[target]
+        ]
+        for market in PAGE_MARKETS
+        if market != "all"
+    }
+
+
+def filter_views(adjacency, edges_by_market):
+    """Visible edge positions of each market / edge-count view, keyed ``"<market>:<count>"`` as the page looks them up.
+
+    Mirrors the page's filter: edges in graph order, kept when either artist
+    is tagged with the market, then cut to the first ``count``.
+    """
+    views = {}
+    for market in PAGE_MARKETS:
+        edges = list(range(adjacency.edge_count)) if market == "all" else edges_by_market[market]
+        for count in PAGE_EDGE_COUNTS:
+            views[f"{market}:{count}"] = edges[:count]
+    return views
+
+
+def page_node_order(adjacency):
+    """Artist positions in the order pyvis adds them to the page: by first edge, then artists without one."""
+    order = {}
+    for source, target in zip(adjacency.edge_source.tolist(), adjacency.edge_target.tolist()):
+        order.setdefault(source, None)
+        order.setdefault(target, None)
+    for artist in range(len(adjacency)):
+        order.setdefault(artist, None)
+    return list(order)
+
+
+def view_summary(edges, endpoints, node_order, edge_revenue, artist_revenue, top_k=3):
+    """Revenue totals and top collaborations and artists of one view, as the page would aggregate them.
+
+    Sums run in the page's order and rankings are stable sorts, so the
+    figures are the ones the page computed from the DataSets.
+    """
+    visible = set()
+    for edge in edges:
+        visible.update(endpoints[edge])
+    visible_nodes = [artist for artist in node_order if artist in visible]
+
+    # Plain float additions in page order, like the page's reduce
+    revenue = 0.0
+    for edge in edges:
+        revenue += edge_revenue[edge]
+    visible_artist_revenue = 0.0
+    for artist in visible_nodes:
+        visible_artist_revenue += artist_revenue[artist]
+
+    return {
+        "revenue": revenue,
+        "artistRevenue": visible_artist_revenue,
+        "topEdges": sorted(edges, key=lambda edge: edge_revenue[edge], reverse=True)[:top_k],
+        "topArtists": sorted(visible_nodes, key=lambda artist: artist_revenue[artist], reverse=True)[:top_k],
+    }
+
+
+def graph_page_data(G):
+    """CSR adjacency, market edge lists and per-view clusters, totals and rankings embedded in the page."""
+    import numpy as np
+
+    from collab_adjacency import CollabAdjacency
+
+    adjacency = CollabAdjacency.from_graph(G)
+    edges_by_market = market_edges(G, adjacency)
+    views = filter_views(adjacency, edges_by_market)
+
+    masks = {}
+    for key, edges in views.items():
+        masks[key] = np.zeros(adjacency.edge_count, dtype=bool)
+        masks[key][edges] = True
+    data = adjacency.page_data(masks)
+
+    endpoints = list(zip(adjacency.edge_source.tolist(), adjacency.edge_target.tolist()))
+    edge_revenue = [G.edges[adjacency.artists[source], adjacency.artists[target]]["edge_revenue"] for source, target in endpoints]
+    artist_revenue = [G.nodes[artist]["revenue"] for artist in adjacency.artists]
+    node_order = page_node_order(adjacency)
+    data["marketEdges"] = edges_by_market
+    data["views"] = {
+        key: view_summary(edges, endpoints, node_order, edge_revenue, artist_revenue)
+        for key, edges in views.items()
+    }
+    return data
+
+
+def render_network_html(G, min_rev, max_rev):
+    """Render the graph with pyvis and inject the custom filter shell."""
+    from pyvis.network import Network
+
+    graph_data = graph_page_data(G)
+
+    # Convert to Pyvis Network
+    net = Network(height="100%", width="100%", notebook=True, bgcolor="white", font_color="black")
+    net.from_nx(G)
+    net.set_options(PHYSICS_OPTIONS)
+
+    # Unescape the template's braces before filling in values that contain braces themselves
+    custom_filter = TEMPLATE_PATH.read_text(encoding="utf-8")
+    custom_filter = custom_filter.replace("{{", "{").replace("}}", "}")
+    custom_filter = custom_filter.replace("__MIN_REV__", str(min_rev)).replace("__MAX_REV__", str(max_rev))
+    custom_filter = custom_filter.replace(
+        "__GRAPH_DATA__", json.dumps(graph_data, separators=(",", ":")).replace("</", "<\\/")
+    )
+
+    # Inject custom filter into the generated page
+    html_content = net.generate_html()
+    return html_content.replace("<head>", "<head>" + custom_filter)
+
+
+def generate_network_graph(index, output_file=DEFAULT_OUTPUT_PATH):
+    """Write the interactive network page for already indexed predictions."""
+    G, min_rev, max_rev = build_graph(index)
+    output_file = Path(output_file)
+    output_file.write_text(render_network_html(G, min_rev, max_rev), encoding="utf-8")
+    return output_file
+
+
+def add_assets_path():
+    # profile_hooks lives with the other build scripts in assets/; only the
+    # command line needs it, so importing this module leaves sys.path alone
+    if str(CODE_DIR / "assets") not in sys.path:
+        sys.path.append(str(CODE_DIR / "assets"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the interactive collaboration network page.")
+    parser.add_argument("--db", type=Path, help="Read the predictions from this SQLite store instead of the CSV")
+    args = parser.parse_args()
+
+    add_assets_path()
+    from profile_hooks import install as install_profiling
 
-# Save the initial graph to HTML
-output_file = "artist_collaborations.html"
-net.save_graph(output_file)
+    install_profiling("graph_network_artist_collaboration")
 
-template_path = Path(__file__).resolve().parent / "assets" / "network_shell_template.html"
-custom_filter = template_path.read_text(encoding="utf-8")
-custom_filter = custom_filter.replace("__MIN_REV__", str(min_rev)).replace("__MAX_REV__", str(max_rev))
-custom_filter = custom_filter.replace("{{", "{").replace("}}", "}")
+    # Load data
+    if args.db:
+        from collab_store import SqliteCollabStore
 
-# Inject custom filter into HTML file
-with open(output_file, "r", encoding="utf-8") as file:
-    html_content = file.read()
+        index = SqliteCollabStore(args.db)
+    else:
+        from collab_query import CollabIndex
 
-html_content = html_content.replace("<head>", "<head>" + custom_filter)
+        index = CollabIndex.from_csv(DEFAULT_CSV_PATH)
+    output_file = generate_network_graph(index)
+    print(f"Interactive graph saved as {output_file.name}")
 
-with open(output_file, "w", encoding="utf-8") as file:
-    file.write(html_content)
 
-print(f"Interactive graph saved as {output_file}")
+if __name__ == "__main__":
+    main()